@@ -0,0 +1,63 @@
+import argparse
+import random
+import string
+import time
+
+
+from src.utils.blacklist_matcher import BlacklistMatcher
+
+
+WORDS: list[str] = [
+    "Derecho", "de", "Colombia", "por", "país", "Códigos", "jurídicos", "Casos", "judiciales", "Historia",
+    "Música", "Deportes", "Géneros", "Ciencia", "y", "tecnología", "siglo", "XX", "Anexos", "Personas"
+]
+
+
+def random_title(rng: random.Random) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(2, 7)))
+
+
+def random_pattern(rng: random.Random) -> str:
+    return "".join(rng.choice(string.ascii_letters + "áéíóúñ ") for _ in range(rng.randint(4, 16)))
+
+
+def linear_is_blacklisted(title: str, full_match_items: list[str], partial_match_items: list[str]) -> bool:
+    if title in full_match_items:
+        return True
+    return any(blacklist_item in title for blacklist_item in partial_match_items)
+
+
+def time_lookups(is_blacklisted, titles: list[str]) -> tuple[float, int]:
+    start = time.perf_counter()
+    matches = sum(1 for title in titles if is_blacklisted(title))
+    return time.perf_counter() - start, matches
+
+
+def run(pattern_counts: list[int], num_titles: int, seed: int) -> None:
+    rng = random.Random(seed)
+    titles: list[str] = [random_title(rng) for _ in range(num_titles)]
+    print(f"{'patterns':>9} {'linear (s)':>11} {'matcher (s)':>12} {'build (s)':>10} {'speedup':>8} {'matches':>8}")
+    for pattern_count in pattern_counts:
+        full_match_items: list[str] = [random_title(rng) for _ in range(pattern_count)]
+        partial_match_items: list[str] = [random_pattern(rng) for _ in range(pattern_count - 2)] + ["por país", "Anexos"]
+
+        build_start = time.perf_counter()
+        matcher = BlacklistMatcher(full_match_items, partial_match_items)
+        build_time = time.perf_counter() - build_start
+
+        linear_time, linear_matches = time_lookups(
+            lambda title: linear_is_blacklisted(title, full_match_items, partial_match_items), titles
+        )
+        matcher_time, matcher_matches = time_lookups(matcher.is_blacklisted, titles)
+        if linear_matches != matcher_matches:
+            raise AssertionError(f"Matcher disagrees with linear scan: {matcher_matches} != {linear_matches} matches")
+        print(f"{pattern_count:>9} {linear_time:>11.3f} {matcher_time:>12.3f} {build_time:>10.3f} {linear_time / matcher_time:>7.1f}x {matcher_matches:>8}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the compiled blacklist matcher with the linear any() scan.")
+    parser.add_argument("--patterns", type=int, nargs="+", default=[22, 100, 1000, 5000, 20000])
+    parser.add_argument("--titles", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.patterns, args.titles, args.seed)
@@ -0,0 +1,74 @@
+import argparse
+import random
+import time
+import tracemalloc
+
+
+from src.corpus_store import CorpusStore
+from src.utils.custom_types import corpus, page_text
+
+
+WORDS: list[str] = [
+    "el", "la", "de", "que", "derecho", "ley", "código", "civil", "artículo", "tribunal", "sentencia", "Colombia",
+    "constitución", "principio", "jurídico", "penal", "proceso", "corte", "república", "años", "según", "también"
+]
+# Extracted articles are mostly short list items and headings around fewer, longer paragraphs.
+TAGS: list[str] = ["p", "p", "li", "li", "li", "li", "li", "li", "h2", "h3", "dt"]
+
+
+def random_page(rng: random.Random) -> page_text:
+    lines: page_text = []
+    for _ in range(rng.randint(5, 60)):
+        tag = rng.choice(TAGS)
+        word_count = rng.randint(15, 90) if tag == "p" else rng.randint(1, 8)
+        lines.append(f"{tag}: {' '.join(rng.choice(WORDS) for _ in range(word_count))}")
+    return lines
+
+
+def measure(build) -> tuple[float, int, object]:
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, size, result
+
+
+def run(num_pages: int, seed: int) -> None:
+    rng = random.Random(seed)
+    # Pages are built per run, as they would arrive from the extractors, and measured while kept.
+    def build_lists() -> corpus:
+        page_rng = random.Random(seed)
+        return {f"Página {index}": random_page(page_rng) for index in range(num_pages)}
+
+    def build_store() -> CorpusStore:
+        page_rng = random.Random(seed)
+        store = CorpusStore()
+        for index in range(num_pages):
+            store[f"Página {index}"] = random_page(page_rng)
+        return store
+
+    lists_time, lists_size, lists = measure(build_lists)
+    store_time, store_size, store = measure(build_store)
+    sample: list[str] = rng.sample(list(lists), min(1000, num_pages))
+    assert all(store[page] == lists[page] for page in sample)
+
+    start = time.perf_counter()
+    for page in sample:
+        store[page]
+    read_time = (time.perf_counter() - start) / len(sample)
+
+    print(f"{num_pages} pages")
+    print(f"{'representation':>15} {'memory (MB)':>12} {'build (s)':>10}")
+    print(f"{'lists':>15} {lists_size / 1e6:>12.1f} {lists_time:>10.2f}")
+    print(f"{'CorpusStore':>15} {store_size / 1e6:>12.1f} {store_time:>10.2f}")
+    print(f"memory reduction {lists_size / store_size:.1f}x, {read_time * 1e6:.0f} µs to materialize one page")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the memory of a dict of page_text lists with a CorpusStore.")
+    parser.add_argument("--pages", type=int, default=100_000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    run(args.pages, args.seed)
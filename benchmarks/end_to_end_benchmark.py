@@ -0,0 +1,192 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import resource
+import tempfile
+import time
+
+
+from typing import Any
+
+
+from benchmarks.fake_mediawiki import FakeMediaWikiServer, SyntheticWiki
+from benchmarks.multistream_fixture import synthetic_pages, write_multistream_dump
+from src.api_client import WikipediaClient
+from src.category_manager import CategoryManager
+from src.content_manager import ContentManager
+from src.page_manager import PageManager
+from src.response_cache import ResponseCache
+from src.utils.custom_types import category_pages, taxonomy
+from src.utils.metrics import get_default_registry
+from src.xml_dump import MultistreamDump
+
+
+def peak_memory_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux. Each run gets its own process, so this is the peak of that run.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def serve(server_config: dict[str, Any], url_queue: multiprocessing.Queue) -> None:
+    wiki_config: dict[str, Any] | None = server_config.pop("wiki")
+    fixtures: str | None = server_config.pop("fixtures")
+    server = FakeMediaWikiServer(
+        SyntheticWiki(**wiki_config) if wiki_config is not None else None,
+        ResponseCache(fixtures, offline=True) if fixtures else None,
+        **server_config
+    )
+    url_queue.put(server.url)
+    server.serve_forever()
+
+
+def limit_content_pages(pages: category_pages, max_pages: int) -> category_pages:
+    limited_pages: category_pages = {}
+    remaining: int = max_pages
+    for category, category_pages_ in pages.items():
+        limited_pages[category] = category_pages_[:max(remaining, 0)]
+        remaining -= len(limited_pages[category])
+    return limited_pages
+
+
+class StageTimer:
+
+
+    def __init__(self, client: WikipediaClient) -> None:
+        self.client: WikipediaClient = client
+        self.stages: list[dict[str, Any]] = []
+
+
+    def run(self, stage: str, function, count_items) -> Any:
+        requests_before: int = self.client.stats.requests
+        start = time.perf_counter()
+        result = function()
+        elapsed = time.perf_counter() - start
+        requests: int = self.client.stats.requests - requests_before
+        items: int = count_items(result)
+        self.stages.append({
+            "stage": stage,
+            "seconds": round(elapsed, 3),
+            "requests": requests,
+            "requests_per_sec": round(requests / elapsed, 1) if elapsed else 0.0,
+            "items": items,
+            "items_per_sec": round(items / elapsed, 1) if elapsed else 0.0,
+            "peak_memory_mb": round(peak_memory_mb(), 1)
+        })
+        return result
+
+
+def run_benchmark(config: dict[str, Any], result_queue: multiprocessing.Queue) -> None:
+    url_queue: multiprocessing.Queue = multiprocessing.Queue()
+    server_process = multiprocessing.Process(target=serve, args=(config["server"], url_queue), daemon=True)
+    server_process.start()
+    try:
+        client = WikipediaClient(url=url_queue.get(timeout=30), max_retries=10, backoff_factor=0.05, max_backoff=2.0)
+        timer = StageTimer(client)
+        domains: list[str] = config["domains"]
+        degree: int = config["degree"]
+
+        def retrieve_categories() -> taxonomy:
+            category_manager = CategoryManager(domains, [], [], degree, client=client)
+            category_manager.retrieve_taxonomies(save=False, concurrent=config["concurrent"])
+            return category_manager.get_taxonomies()
+
+        taxonomies: taxonomy = timer.run("categories", retrieve_categories, lambda taxonomies_: len({
+            category for domain_taxonomy in taxonomies_.values() for category in domain_taxonomy
+        }))
+
+        def retrieve_pages() -> category_pages:
+            page_manager = PageManager(taxonomies, degree, client=client)
+            page_manager.retrieve_taxonomy_pages(save=False)
+            return page_manager.get_pages()
+
+        pages: category_pages = timer.run("pages", retrieve_pages, lambda pages_: len({page for titles in pages_.values() for page in titles}))
+
+        def retrieve_content() -> ContentManager:
+            with tempfile.TemporaryDirectory() as output_path:
+                xml_dump: MultistreamDump | None = None
+                if config["content_mode"] == "dump":
+                    # Writing the dump is set-up, not part of the measured retrieval, but small next to it.
+                    xml_dump = MultistreamDump(f"{output_path}/pages-articles-multistream.xml.bz2", f"{output_path}/pages-articles-multistream-index.txt.bz2")
+                    write_multistream_dump(xml_dump.dump_path, xml_dump.index_path, synthetic_pages(SyntheticWiki(**config["server"]["wiki"])))
+                content_manager = ContentManager(
+                    limit_content_pages(pages, config["content_pages"]), taxonomies, ["Referencias"], [], degree,
+                    output_path=f"{output_path}/", client=client, extraction_backend=config["extraction_backend"], xml_dump=xml_dump
+                )
+                content_manager.retrieve_taxonomy_content(save=False, batched=config["content_mode"] == "batched", pipelined=config["content_mode"] == "pipelined")
+            return content_manager
+
+        timer.run("content", retrieve_content, lambda content_manager: len(content_manager.page_contents))
+        result_queue.put({
+            "categories": config["server"]["wiki"]["num_categories"] if config["server"]["wiki"] else None,
+            "stages": timer.stages,
+            "metrics": get_default_registry().summary()
+        })
+    finally:
+        server_process.terminate()
+
+
+def report(results: list[dict[str, Any]]) -> None:
+    print(f"{'categories':>10} {'stage':>10} {'seconds':>9} {'requests':>9} {'req/sec':>9} {'items':>9} {'items/sec':>10} {'peak MB':>8}")
+    for result in results:
+        for stage in result["stages"]:
+            print(
+                f"{result['categories'] or '-':>10} {stage['stage']:>10} {stage['seconds']:>9.2f} {stage['requests']:>9} "
+                f"{stage['requests_per_sec']:>9.1f} {stage['items']:>9} {stage['items_per_sec']:>10.1f} {stage['peak_memory_mb']:>8.1f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the category, page and content stages against a local fake MediaWiki API.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000], help="number of synthetic categories, up to 1,000,000")
+    parser.add_argument("--branching", type=int, default=10)
+    parser.add_argument("--cross-links", type=float, default=0.1)
+    parser.add_argument("--pages-per-category", type=int, default=3)
+    parser.add_argument("--content-pages", type=int, default=1_000, help="cap on the pages whose content is retrieved")
+    parser.add_argument("--content-mode", choices=["sequential", "batched", "pipelined", "dump"], default="sequential")
+    parser.add_argument("--extraction-backend", default="beautifulsoup")
+    parser.add_argument("--concurrent", action="store_true", help="crawl categories concurrently")
+    parser.add_argument("--fixtures", help="replay a recorded response cache instead of synthetic graphs, with --domains and --degree")
+    parser.add_argument("--domains", nargs="+")
+    parser.add_argument("--degree", type=int)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--retry-after", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="also write the results as JSON to this file")
+    args = parser.parse_args()
+    if args.fixtures and args.content_mode == "dump":
+        # The dump is written from the synthetic wiki, which recorded fixtures do not have.
+        parser.error("--content-mode dump needs a synthetic wiki and cannot be used with --fixtures")
+    logging.basicConfig(level=logging.WARNING)
+
+    server_config: dict[str, Any] = {
+        "latency": args.latency, "latency_jitter": args.latency_jitter, "page_size": args.page_size,
+        "error_rate": args.error_rate, "retry_after": args.retry_after, "seed": args.seed, "fixtures": args.fixtures
+    }
+    configs: list[dict[str, Any]] = []
+    if args.fixtures:
+        configs.append({"server": {**server_config, "wiki": None}, "domains": args.domains, "degree": args.degree})
+    for size in [] if args.fixtures else args.sizes:
+        wiki_config: dict[str, Any] = {
+            "num_categories": size, "branching": args.branching, "cross_links": args.cross_links,
+            "pages_per_category": args.pages_per_category, "seed": args.seed
+        }
+        # Deep enough for the traversal to reach every category of the tree.
+        degree: int = SyntheticWiki(**wiki_config).depth(size - 1) + 1
+        configs.append({"server": {**server_config, "wiki": wiki_config}, "domains": ["Sintética 0"], "degree": degree})
+
+    results: list[dict[str, Any]] = []
+    for config in configs:
+        config.update(content_pages=args.content_pages, content_mode=args.content_mode, extraction_backend=args.extraction_backend, concurrent=args.concurrent)
+        result_queue: multiprocessing.Queue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_benchmark, args=(config, result_queue))
+        process.start()
+        results.append(result_queue.get())
+        process.join()
+        report(results[-1:])
+
+    if args.output:
+        with open(args.output, "w") as out_file:
+            json.dump(results, out_file, indent=4)
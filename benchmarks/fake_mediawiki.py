@@ -0,0 +1,366 @@
+import argparse
+import json
+import random
+import threading
+import time
+
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+from urllib.parse import parse_qsl, urlparse
+
+
+from src.api_client import API_URL, CATEGORY_PREFIX
+from src.response_cache import ResponseCache
+
+
+CATEGORY_LABEL = "Sintética"
+PAGE_LABEL = "Artículo sintético"
+WORDS: list[str] = [
+    "el", "la", "de", "que", "derecho", "ley", "código", "civil", "artículo", "tribunal", "sentencia", "Colombia",
+    "constitución", "principio", "jurídico", "penal", "proceso", "corte", "república", "años", "según", "también"
+]
+
+
+# A procedurally generated wiki: nothing is stored, every category and article is derived from its
+# index and the seed, so graphs of millions of categories cost no memory. Categories form a tree with
+# `branching` subcategories each, plus random cross links (which create cycles), and each category
+# lists `pages_per_category` articles drawn from a pool smaller than the number of memberships, so
+# articles are shared between categories. A fraction `empty_categories` of the categories lists no
+# articles at all.
+class SyntheticWiki:
+
+
+    def __init__(self,
+                 num_categories: int = 1000,
+                 branching: int = 4,
+                 cross_links: float = 0.1,
+                 pages_per_category: int = 5,
+                 page_overlap: float = 0.2,
+                 empty_categories: float = 0.0,
+                 seed: int = 0
+                 ) -> None:
+        self.num_categories: int = num_categories
+        self.branching: int = branching
+        self.cross_links: float = cross_links
+        self.pages_per_category: int = pages_per_category
+        self.num_pages: int = max(1, int(num_categories * pages_per_category * (1 - page_overlap)))
+        self.empty_categories: float = empty_categories
+        self.seed: int = seed
+
+
+    def category_label(self, category: int) -> str:
+        return f"{CATEGORY_LABEL} {category}"
+
+
+    def category_index(self, label: str) -> int | None:
+        return self._parse_index(label.removeprefix(CATEGORY_PREFIX), CATEGORY_LABEL, self.num_categories)
+
+
+    def page_title(self, page: int) -> str:
+        return f"{PAGE_LABEL} {page}"
+
+
+    def page_index(self, title: str) -> int | None:
+        return self._parse_index(title, PAGE_LABEL, self.num_pages)
+
+
+    def category_page_id(self, category: int) -> int:
+        return self.num_pages + category + 1
+
+
+    def page_id(self, page: int) -> int:
+        return page + 1
+
+
+    def revision_id(self, page: int) -> int:
+        return 1000 * (page + 1) + 1
+
+
+    def page_for_revision(self, revision_id: int) -> int | None:
+        page, remainder = divmod(revision_id - 1, 1000)
+        page -= 1
+        return page if remainder == 0 and 0 <= page < self.num_pages else None
+
+
+    def subcategories(self, category: int) -> list[int]:
+        first_child: int = category * self.branching + 1
+        children: list[int] = list(range(first_child, min(first_child + self.branching, self.num_categories)))
+        rng = random.Random(f"{self.seed}:subcategories:{category}")
+        if rng.random() < self.cross_links:
+            children.append(rng.randrange(self.num_categories))
+        return children
+
+
+    def category_pages(self, category: int) -> list[int]:
+        if self.empty_categories and random.Random(f"{self.seed}:empty:{category}").random() < self.empty_categories:
+            return []
+        first_page: int = category * self.pages_per_category
+        return sorted({(first_page + offset) % self.num_pages for offset in range(self.pages_per_category)})
+
+
+    def depth(self, category: int) -> int:
+        depth: int = 0
+        while category > 0:
+            category = (category - 1) // self.branching
+            depth += 1
+        return depth
+
+
+    def sections(self, page: int) -> list[tuple[str, list[str], list[str]]]:
+        rng = random.Random(f"{self.seed}:article:{page}")
+        sections: list[tuple[str, list[str], list[str]]] = []
+        for section in range(rng.randint(2, 5)):
+            heading: str = f"Sección {section} de {self.page_title(page)}"
+            paragraphs: list[str] = [self._sentence(rng, 15, 80) for _ in range(rng.randint(1, 4))]
+            items: list[str] = [self._sentence(rng, 1, 8) for _ in range(rng.randint(0, 6))]
+            sections.append((heading, paragraphs, items))
+        return sections
+
+
+    def html(self, page: int) -> str:
+        parts: list[str] = ['<div class="mw-content-ltr mw-parser-output" lang="es" dir="ltr">']
+        for heading, paragraphs, items in self.sections(page):
+            anchor: str = heading.replace(" ", "_")
+            parts.append(f'<h2><span class="mw-headline" id="{anchor}">{heading}</span><span class="mw-editsection">[<a href="#">editar</a>]</span></h2>')
+            parts.extend(f"<p>{paragraph}\n</p>" for paragraph in paragraphs)
+            if items:
+                parts.append("<ul>" + "".join(f"<li>{item}</li>" for item in items) + "</ul>")
+        parts.append('<h2><span class="mw-headline" id="Referencias">Referencias</span></h2><ul><li>Referencia</li></ul></div>')
+        return "\n".join(parts)
+
+
+    def wikitext(self, page: int) -> str:
+        parts: list[str] = []
+        for heading, paragraphs, items in self.sections(page):
+            parts.append(f"== {heading} ==")
+            parts.extend(paragraphs)
+            parts.extend(f"* {item}" for item in items)
+        parts.append("== Referencias ==\n* Referencia")
+        return "\n\n".join(parts)
+
+
+    @staticmethod
+    def _sentence(rng: random.Random, min_words: int, max_words: int) -> str:
+        return " ".join(rng.choice(WORDS) for _ in range(rng.randint(min_words, max_words)))
+
+
+    @staticmethod
+    def _parse_index(title: str, label: str, limit: int) -> int | None:
+        prefix, _, index = title.rpartition(" ")
+        if prefix != label or not index.isdigit() or int(index) >= limit:
+            return None
+        return int(index)
+
+
+class FakeMediaWikiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    server: "FakeMediaWikiServer"
+
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+
+    def do_GET(self) -> None:
+        params: dict[str, str] = dict(parse_qsl(urlparse(self.path).query, keep_blank_values=True))
+        server = self.server
+        if server.latency or server.latency_jitter:
+            time.sleep(server.latency + random.uniform(0, server.latency_jitter))
+        error: str | None = server.draw_error()
+        if error == "429" or error == "503":
+            self._send(int(error), {"error": "injected"}, {"Retry-After": str(server.retry_after)})
+        elif error == "maxlag":
+            self._send(200, self._api_error("maxlag", "Waiting for a database server: 3 seconds lagged."), {"Retry-After": str(server.retry_after)})
+        else:
+            self._send(200, server.respond(params))
+
+
+    def _send(self, status: int, data: dict[str, Any], headers: dict[str, str] | None = None) -> None:
+        body: bytes = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    @staticmethod
+    def _api_error(code: str, info: str) -> dict[str, Any]:
+        return {"error": {"code": code, "info": info}}
+
+
+# Serves the subset of the MediaWiki action API the managers use, either from a `SyntheticWiki` or by
+# replaying a `ResponseCache` recorded against the live API (looked up with `fixture_url`, the URL the
+# responses were recorded from). `page_size` caps every listing to force `continue` pagination, and a
+# fraction `error_rate` of the requests fails with one of `error_kinds` (429, 503 or a maxlag error).
+class FakeMediaWikiServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+    def __init__(self,
+                 wiki: SyntheticWiki | None = None,
+                 fixtures: ResponseCache | None = None,
+                 fixture_url: str = API_URL,
+                 host: str = "127.0.0.1",
+                 port: int = 0,
+                 latency: float = 0.0,
+                 latency_jitter: float = 0.0,
+                 page_size: int = 500,
+                 error_rate: float = 0.0,
+                 error_kinds: tuple[str, ...] = ("429", "503", "maxlag"),
+                 retry_after: float = 1.0,
+                 seed: int = 0
+                 ) -> None:
+        if (wiki is None) == (fixtures is None):
+            raise ValueError("Exactly one of a synthetic wiki or recorded fixtures is required.")
+        super().__init__((host, port), FakeMediaWikiHandler)
+        self.wiki: SyntheticWiki | None = wiki
+        self.fixtures: ResponseCache | None = fixtures
+        self.fixture_url: str = fixture_url
+        self.latency: float = latency
+        self.latency_jitter: float = latency_jitter
+        self.page_size: int = page_size
+        self.error_rate: float = error_rate
+        self.error_kinds: tuple[str, ...] = error_kinds
+        self.retry_after: float = retry_after
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/w/api.php"
+
+
+    def __enter__(self) -> "FakeMediaWikiServer":
+        self.start()
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.stop()
+
+
+    def start(self) -> None:
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+
+    def draw_error(self) -> str | None:
+        if not self.error_rate:
+            return None
+        with self._lock:
+            if self._rng.random() >= self.error_rate:
+                return None
+            return self._rng.choice(self.error_kinds)
+
+
+    def respond(self, params: dict[str, str]) -> dict[str, Any]:
+        if self.fixtures is not None:
+            data = self.fixtures.get(self.fixture_url, {name: value for name, value in params.items()})
+            return data if data is not None else FakeMediaWikiHandler._api_error("nofixture", f"No recorded response for {params}")
+        action: str = params.get("action", "")
+        if action == "parse":
+            return self.parse(params)
+        if action == "query" and params.get("list") == "categorymembers":
+            return self.category_members(params)
+        if action == "query" and "prop" in params:
+            return self.query_pages(params)
+        return FakeMediaWikiHandler._api_error("badvalue", f"Unsupported request {params}")
+
+
+    def category_members(self, params: dict[str, str]) -> dict[str, Any]:
+        wiki: SyntheticWiki = self.wiki
+        category: int | None = wiki.category_index(params.get("cmtitle", ""))
+        if category is None:
+            return {"batchcomplete": "", "query": {"categorymembers": []}}
+        members: list[dict[str, Any]] = []
+        member_types: list[str] = params.get("cmtype", "page|subcat|file").split("|")
+        if "subcat" in member_types:
+            members += [
+                {"pageid": wiki.category_page_id(subcategory), "ns": 14, "title": CATEGORY_PREFIX + wiki.category_label(subcategory)}
+                for subcategory in wiki.subcategories(category)
+            ]
+        if "page" in member_types:
+            members += [{"pageid": wiki.page_id(page), "ns": 0, "title": wiki.page_title(page)} for page in wiki.category_pages(category)]
+        limit: int = min(int(params.get("cmlimit", 10)), self.page_size)
+        offset: int = int(params["cmcontinue"].rpartition("|")[2]) if "cmcontinue" in params else 0
+        data: dict[str, Any] = {"batchcomplete": "", "query": {"categorymembers": members[offset:offset + limit]}}
+        if offset + limit < len(members):
+            data["continue"] = {"cmcontinue": f"page|{offset + limit}", "continue": "-||"}
+        return data
+
+
+    def parse(self, params: dict[str, str]) -> dict[str, Any]:
+        wiki: SyntheticWiki = self.wiki
+        page: int | None = wiki.page_for_revision(int(params["oldid"])) if "oldid" in params else wiki.page_index(params.get("page", ""))
+        if page is None:
+            return FakeMediaWikiHandler._api_error("missingtitle", "The page you specified doesn't exist.")
+        return {"parse": {"title": wiki.page_title(page), "pageid": wiki.page_id(page), "revid": wiki.revision_id(page), "text": {"*": wiki.html(page)}}}
+
+
+    def query_pages(self, params: dict[str, str]) -> dict[str, Any]:
+        wiki: SyntheticWiki = self.wiki
+        if "revids" in params:
+            requested: list[tuple[str, int | None]] = [
+                (revision_id, wiki.page_for_revision(int(revision_id))) for revision_id in params["revids"].split("|")
+            ]
+        else:
+            requested = [(title, wiki.page_index(title)) for title in params.get("titles", "").split("|")]
+        properties: list[str] = params["prop"].split("|")
+        pages: list[dict[str, Any]] = []
+        for title, page in requested:
+            category: int | None = wiki.category_index(title) if title.startswith(CATEGORY_PREFIX) else None
+            if category is not None:
+                entry = {"pageid": wiki.category_page_id(category), "ns": 14, "title": title}
+                num_subcategories: int = len(wiki.subcategories(category))
+                num_pages: int = len(wiki.category_pages(category))
+                if "categoryinfo" in properties and num_subcategories + num_pages:
+                    entry["categoryinfo"] = {"size": num_subcategories + num_pages, "pages": num_pages, "files": 0, "subcats": num_subcategories}
+                pages.append(entry)
+                continue
+            if page is None:
+                pages.append({"title": title, "missing": True})
+                continue
+            entry: dict[str, Any] = {"pageid": wiki.page_id(page), "ns": 0, "title": wiki.page_title(page)}
+            if "info" in properties:
+                entry["lastrevid"] = wiki.revision_id(page)
+            if "revisions" in properties:
+                entry["revisions"] = [{"revid": wiki.revision_id(page), "slots": {"main": {"content": wiki.wikitext(page)}}}]
+            pages.append(entry)
+        return {"batchcomplete": True, "query": {"pages": pages}}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve a synthetic (or recorded) MediaWiki API locally.")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--categories", type=int, default=1000)
+    parser.add_argument("--branching", type=int, default=4)
+    parser.add_argument("--cross-links", type=float, default=0.1)
+    parser.add_argument("--pages-per-category", type=int, default=5)
+    parser.add_argument("--empty-categories", type=float, default=0.0)
+    parser.add_argument("--fixtures", help="replay a response cache recorded against the live API instead")
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--latency-jitter", type=float, default=0.0)
+    parser.add_argument("--page-size", type=int, default=500)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    wiki = None if args.fixtures else SyntheticWiki(args.categories, args.branching, args.cross_links, args.pages_per_category, empty_categories=args.empty_categories, seed=args.seed)
+    fixtures = ResponseCache(args.fixtures, offline=True) if args.fixtures else None
+    server = FakeMediaWikiServer(wiki, fixtures, port=args.port, latency=args.latency, latency_jitter=args.latency_jitter,
+                                 page_size=args.page_size, error_rate=args.error_rate, seed=args.seed)
+    print(f"Serving on {server.url} (root category: {CATEGORY_LABEL} 0)")
+    server.serve_forever()
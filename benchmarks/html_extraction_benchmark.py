@@ -0,0 +1,103 @@
+import argparse
+import glob
+import json
+import os
+import re
+import sys
+import time
+
+
+from src.api_client import WikipediaClient
+from src.html_extractors import EXTRACTION_BACKENDS, get_extractor
+from src.utils.custom_types import page_text
+
+
+HEADER_ID_BLACKLIST: list[str] = ["Notas", "Referencias", "Citas_y_referencias", "Bibliografía", "Enlaces_externos", "Véase_también"]
+LI_TRUNCATORS: list[str] = ["Proyectos Wikimedia", "Identificadores", "Diccionarios y enciclopedias"]
+REFERENCE_BACKEND = "beautifulsoup"
+
+
+def page_filename(title: str) -> str:
+    return re.sub(r'[^\w-]', '_', title)
+
+
+def download_pages(titles: list[str], html_dir: str) -> None:
+    client = WikipediaClient()
+    os.makedirs(html_dir, exist_ok=True)
+    for title in titles:
+        data = client.get({"action": "parse", "page": title, "prop": "text"})
+        with open(os.path.join(html_dir, f"{page_filename(title)}.html"), "w") as out_file:
+            out_file.write(data["parse"]["text"]["*"])
+        print(f"Saved {title}")
+
+
+def load_pages(html_dir: str) -> dict[str, str]:
+    pages: dict[str, str] = {}
+    for filename in sorted(glob.glob(os.path.join(html_dir, "*.html"))):
+        with open(filename) as in_file:
+            pages[os.path.splitext(os.path.basename(filename))[0]] = in_file.read()
+    return pages
+
+
+def load_golden_outputs(golden_dir: str, pages: dict[str, str]) -> dict[str, page_text]:
+    golden_outputs: dict[str, page_text] = {}
+    for name in pages:
+        filename = os.path.join(golden_dir, f"{name}.json")
+        if os.path.exists(filename):
+            with open(filename) as in_file:
+                golden_outputs[name] = json.load(in_file)
+    return golden_outputs
+
+
+def update_golden_outputs(golden_dir: str, pages: dict[str, str]) -> None:
+    os.makedirs(golden_dir, exist_ok=True)
+    extractor = get_extractor(REFERENCE_BACKEND, HEADER_ID_BLACKLIST, LI_TRUNCATORS)
+    for name, html_content in pages.items():
+        with open(os.path.join(golden_dir, f"{name}.json"), "w") as out_file:
+            json.dump(extractor.extract(html_content), out_file, indent=4, ensure_ascii=False)
+    print(f"Wrote {len(pages)} golden outputs with the {REFERENCE_BACKEND} backend to {golden_dir}")
+
+
+def run(pages: dict[str, str], golden_outputs: dict[str, page_text], backends: list[str], repeat: int) -> int:
+    # Pages without a golden output fail too, so the check cannot pass by having nothing to compare.
+    total_bytes: int = sum(len(html_content.encode("utf-8")) for html_content in pages.values())
+    print(f"{len(pages)} pages, {total_bytes / 1e6:.1f} MB of HTML, {len(golden_outputs)} golden outputs")
+    missing: list[str] = [name for name in pages if name not in golden_outputs]
+    for name in missing:
+        print(f"{'':>14} no golden output: {name}, write it with --update-golden")
+    print(f"{'backend':>14} {'pages/sec':>10} {'MB/sec':>8} {'mismatches':>11}")
+    failures: int = len(missing)
+    for backend in backends:
+        extractor = get_extractor(backend, HEADER_ID_BLACKLIST, LI_TRUNCATORS)
+        outputs: dict[str, page_text] = {}
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for name, html_content in pages.items():
+                outputs[name] = extractor.extract(html_content)
+        elapsed = time.perf_counter() - start
+        mismatches: list[str] = [name for name, expected in golden_outputs.items() if outputs[name] != expected]
+        failures += len(mismatches)
+        print(f"{backend:>14} {len(pages) * repeat / elapsed:>10.1f} {total_bytes * repeat / elapsed / 1e6:>8.2f} {len(mismatches):>11}")
+        for name in mismatches[:5]:
+            print(f"{'':>14} mismatch: {name}")
+    return failures
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the HTML extraction backends and check them against golden outputs.")
+    parser.add_argument("--html-dir", default="benchmarks/fixtures/html")
+    parser.add_argument("--download", nargs="+", metavar="TITLE", help="save the parsed HTML of these articles into --html-dir first")
+    parser.add_argument("--update-golden", action="store_true", help=f"regenerate the golden outputs with the {REFERENCE_BACKEND} backend")
+    parser.add_argument("--backends", nargs="+", default=list(EXTRACTION_BACKENDS), choices=list(EXTRACTION_BACKENDS))
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    golden_dir = os.path.join(args.html_dir, "golden")
+    if args.download:
+        download_pages(args.download, args.html_dir)
+    pages = load_pages(args.html_dir)
+    if not pages:
+        sys.exit(f"No *.html files found in {args.html_dir}, save some with --download first.")
+    if args.update_golden:
+        update_golden_outputs(golden_dir, pages)
+    sys.exit(1 if run(pages, load_golden_outputs(golden_dir, pages), args.backends, args.repeat) else 0)
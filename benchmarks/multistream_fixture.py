@@ -0,0 +1,84 @@
+import argparse
+import bz2
+import os
+
+
+from typing import Iterable, Iterator
+from xml.sax.saxutils import escape
+
+
+from benchmarks.fake_mediawiki import SyntheticWiki
+
+
+PAGES_PER_STREAM = 100
+DUMP_HEADER = (
+    '<mediawiki xmlns="http://www.mediawiki.org/xml/export-0.11/" version="0.11" xml:lang="es">\n'
+    "  <siteinfo>\n    <sitename>Wikipedia</sitename>\n    <dbname>eswiki</dbname>\n  </siteinfo>\n"
+)
+DUMP_FOOTER = "</mediawiki>\n"
+
+
+def page_xml(title: str, page_id: int, revision_id: int, wikitext: str) -> str:
+    return (
+        f"  <page>\n    <title>{escape(title)}</title>\n    <ns>0</ns>\n    <id>{page_id}</id>\n"
+        f"    <revision>\n      <id>{revision_id}</id>\n      <model>wikitext</model>\n      <format>text/x-wiki</format>\n"
+        f"      <text bytes=\"{len(wikitext.encode('utf-8'))}\" xml:space=\"preserve\">{escape(wikitext)}</text>\n"
+        f"    </revision>\n  </page>\n"
+    )
+
+
+def write_multistream_dump(
+        dump_path: str,
+        index_path: str,
+        pages: Iterable[tuple[str, int, int, str]],
+        pages_per_stream: int = PAGES_PER_STREAM
+        ) -> int:
+    # Writes `(title, pageid, revision_id, wikitext)` pages in the layout of the Wikimedia
+    # `pages-articles-multistream.xml.bz2` dumps: a header stream, independent bz2 streams of
+    # `pages_per_stream` pages and a footer stream, plus the bz2 `offset:pageid:title` index.
+    directory = os.path.dirname(dump_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    written_pages: int = 0
+    with open(dump_path, "wb") as dump_file, bz2.open(index_path, "wt", encoding="utf-8") as index_file:
+        dump_file.write(bz2.compress(DUMP_HEADER.encode("utf-8")))
+        stream: list[tuple[str, int, int, str]] = []
+
+        def flush_stream() -> None:
+            offset: int = dump_file.tell()
+            dump_file.write(bz2.compress("".join(page_xml(*page) for page in stream).encode("utf-8")))
+            for title, page_id, _, _ in stream:
+                index_file.write(f"{offset}:{page_id}:{title}\n")
+            stream.clear()
+
+        for page in pages:
+            stream.append(page)
+            written_pages += 1
+            if len(stream) >= pages_per_stream:
+                flush_stream()
+        if stream:
+            flush_stream()
+        dump_file.write(bz2.compress(DUMP_FOOTER.encode("utf-8")))
+    return written_pages
+
+
+def synthetic_pages(wiki: SyntheticWiki) -> Iterator[tuple[str, int, int, str]]:
+    for page in range(wiki.num_pages):
+        yield wiki.page_title(page), wiki.page_id(page), wiki.revision_id(page), wiki.wikitext(page)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a multistream pages-articles dump of a synthetic wiki, with its index.")
+    parser.add_argument("--output-dir", default="benchmarks/fixtures/dumps")
+    parser.add_argument("--categories", type=int, default=1000)
+    parser.add_argument("--branching", type=int, default=4)
+    parser.add_argument("--pages-per-category", type=int, default=5)
+    parser.add_argument("--pages-per-stream", type=int, default=PAGES_PER_STREAM)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    wiki = SyntheticWiki(args.categories, args.branching, pages_per_category=args.pages_per_category, seed=args.seed)
+    dump_path = os.path.join(args.output_dir, "synthwiki-pages-articles-multistream.xml.bz2")
+    index_path = os.path.join(args.output_dir, "synthwiki-pages-articles-multistream-index.txt.bz2")
+    written_pages = write_multistream_dump(dump_path, index_path, synthetic_pages(wiki), args.pages_per_stream)
+    print(f"Wrote {written_pages} pages to {dump_path} and {index_path}")
@@ -0,0 +1,97 @@
+import argparse
+import difflib
+import glob
+import os
+import sys
+
+
+from benchmarks.html_extraction_benchmark import HEADER_ID_BLACKLIST, LI_TRUNCATORS, REFERENCE_BACKEND, page_filename
+from src.api_client import WikipediaClient
+from src.html_extractors import get_extractor
+from src.wikitext_extractor import extract_wikitext_content
+from src.utils.custom_types import page_text
+
+
+# Real es.wiki articles with inline templates, interwiki links, nested lists and multi-line paragraphs.
+DEFAULT_TITLES: list[str] = [
+    "Derecho civil",
+    "Derecho romano",
+    "Código civil",
+    "Aberratio ictus",
+    "Constitución Política de Colombia de 1991",
+    "Corte Constitucional de Colombia"
+]
+
+
+def download_pages(titles: list[str], fixtures_dir: str) -> None:
+    # The parsed HTML and the wikitext of the same revision, so both extractions see the same text.
+    client = WikipediaClient()
+    os.makedirs(fixtures_dir, exist_ok=True)
+    for title in titles:
+        data = client.get({"action": "parse", "page": title, "prop": "text"})
+        revision_id: int = data["parse"]["revid"]
+        revisions = client.query_titles([revision_id], {"prop": "revisions", "rvprop": "content|ids", "rvslots": "main"}, id_param="revids")
+        wikitext: str = next(iter(revisions.values()))["revisions"][0]["slots"]["main"]["content"]
+        name: str = page_filename(title)
+        with open(os.path.join(fixtures_dir, f"{name}.html"), "w") as out_file:
+            out_file.write(data["parse"]["text"]["*"])
+        with open(os.path.join(fixtures_dir, f"{name}.wikitext"), "w") as out_file:
+            out_file.write(wikitext)
+        print(f"Saved revision {revision_id} of {title}")
+
+
+def load_pages(fixtures_dir: str) -> dict[str, tuple[str, str]]:
+    pages: dict[str, tuple[str, str]] = {}
+    for html_filename in sorted(glob.glob(os.path.join(fixtures_dir, "*.html"))):
+        wikitext_filename: str = f"{os.path.splitext(html_filename)[0]}.wikitext"
+        if not os.path.exists(wikitext_filename):
+            continue
+        with open(html_filename) as html_file, open(wikitext_filename) as wikitext_file:
+            pages[os.path.splitext(os.path.basename(html_filename))[0]] = (html_file.read(), wikitext_file.read())
+    return pages
+
+
+def normalize_whitespace(content: page_text) -> page_text:
+    return [" ".join(line.split()) for line in content]
+
+
+def run(pages: dict[str, tuple[str, str]], show_diff: bool) -> int:
+    # Parse mode output is the reference. Lines are compared as they are, and with whitespace runs
+    # collapsed on both sides, since batched mode collapses the line breaks parse mode keeps.
+    extractor = get_extractor(REFERENCE_BACKEND, HEADER_ID_BLACKLIST, LI_TRUNCATORS)
+    print(f"{'page':>45} {'parse':>7} {'batched':>8} {'matching':>9} {'ws-matching':>12}")
+    totals: list[int] = [0, 0, 0, 0]
+    mismatches: int = 0
+    for name, (html_content, wikitext) in pages.items():
+        expected: page_text = extractor.extract(html_content)
+        actual: page_text = extract_wikitext_content(wikitext, HEADER_ID_BLACKLIST, LI_TRUNCATORS)
+        matching: int = sum(block.size for block in difflib.SequenceMatcher(None, expected, actual, autojunk=False).get_matching_blocks())
+        normalized_expected, normalized_actual = normalize_whitespace(expected), normalize_whitespace(actual)
+        ws_matching: int = sum(
+            block.size for block in difflib.SequenceMatcher(None, normalized_expected, normalized_actual, autojunk=False).get_matching_blocks()
+        )
+        for total, value in enumerate((len(expected), len(actual), matching, ws_matching)):
+            totals[total] += value
+        mismatches += normalized_expected != normalized_actual
+        print(f"{name[:45]:>45} {len(expected):>7} {len(actual):>8} {matching:>9} {ws_matching:>12}")
+        if show_diff and normalized_expected != normalized_actual:
+            for line in difflib.unified_diff(normalized_expected, normalized_actual, "parse", "batched", lineterm="", n=0):
+                print(f"{'':>8}{line}")
+    print(f"{'total':>45} {totals[0]:>7} {totals[1]:>8} {totals[2]:>9} {totals[3]:>12}")
+    return mismatches
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare the batched mode's wikitext extraction with the parse mode's HTML extraction on real articles.")
+    parser.add_argument("--fixtures-dir", default="benchmarks/fixtures/wikitext")
+    parser.add_argument("--download", nargs="*", metavar="TITLE", help=f"save the HTML and wikitext of these articles first, by default {DEFAULT_TITLES}")
+    parser.add_argument("--show-diff", action="store_true", help="print the differing lines of each page")
+    args = parser.parse_args()
+
+    if args.download is not None:
+        download_pages(args.download or DEFAULT_TITLES, args.fixtures_dir)
+    pages = load_pages(args.fixtures_dir)
+    if not pages:
+        sys.exit(f"No *.html and *.wikitext pairs found in {args.fixtures_dir}, save some with --download first.")
+    mismatches: int = run(pages, args.show_diff)
+    print(f"{len(pages) - mismatches} of {len(pages)} pages identical up to whitespace")
@@ -1,7 +1,18 @@
 from src.utils.custom_types import category_label, taxonomy, category_pages
 from src.category_manager import CategoryManager
+from src.category_info import CategoryInfo
 from src.page_manager import PageManager
 from src.content_manager import ContentManager
+from src.api_client import WikipediaClient, get_default_client, set_default_client
+from src.response_cache import ResponseCache
+from src.rate_limiter import AdaptiveRateLimiter
+from src.checkpoint_journal import CheckpointJournal
+from src.page_index import PageIndex
+from src.pipeline import StagePipeline
+from src.sharding import ShardManifest, merge_shards, run_local_shards
+from src.sql_dump import CategoryLinksDump
+from src.xml_dump import MultistreamDump
+from src.utils.metrics import get_default_registry
 from src.loggers.log_utils import setup_logger
 
 
@@ -121,13 +132,40 @@ def main():
         "Diccionarios y enciclopedias"
     ]
     degree = 2
+    offline = False
+    # Cached responses older than this are fetched again, so category listings, page lists and
+    # revisions are at most a few days old and the weekly refresh sees the current ones.
+    cache_ttl: float = 3 * 24 * 3600
+    metrics_port: int | None = None
+    # Run the category, page and content stages concurrently instead of one after the other.
+    pipelined = False
+    # Harvest page contents in this many worker processes (see src/sharding.py for other hosts).
+    num_shards: int | None = None
+    # For deep crawls, build the taxonomies and page lists offline from the SQL dumps instead:
+    # sql_dump = CategoryLinksDump("dumps/eswiki-latest-page.sql.gz", "dumps/eswiki-latest-categorylinks.sql.gz")
+    sql_dump: CategoryLinksDump | None = None
+    # And extract page contents from the multistream articles dump instead of one parse call per page:
+    # xml_dump = MultistreamDump("dumps/eswiki-latest-pages-articles-multistream.xml.bz2", "dumps/eswiki-latest-pages-articles-multistream-index.txt.bz2")
+    xml_dump: MultistreamDump | None = None
+
+    # Per-endpoint limits from src/rate_limiter.py, which `query:<prop>` endpoints fall back to.
+    rate_limiter = AdaptiveRateLimiter()
+    metrics = get_default_registry()
+    if metrics_port is not None:
+        metrics.serve(metrics_port)
+    set_default_client(WikipediaClient(cache=ResponseCache("cache/responses.sqlite", ttl=cache_ttl, offline=offline), rate_limiter=rate_limiter))
+    # Shared by both corpora, so pages in both are fetched once and their overlap can be reported.
+    page_index = PageIndex("cache/page_index.jsonl.gz")
+    # Member counts of every category reached, to order the listings and plan the page stage.
+    category_info = CategoryInfo()
 
     # Positive Corpus
-    # category_manager_pos = CategoryManager(positive_domains, full_match_blacklist, partial_match_blacklist, degree)
+    # page_manager_pos = PageManager({}, degree, page_index=page_index, corpus_name="positive", dump=sql_dump, category_info=category_info)
+    # category_manager_pos = CategoryManager(positive_domains, full_match_blacklist, partial_match_blacklist, degree, dump=sql_dump, category_info=category_info, page_manager=page_manager_pos)
     # category_manager_pos.retrieve_taxonomies(prefix="a_positive_")
     # taxonomies_pos: taxonomy = category_manager_pos.get_taxonomies()
     
-    # page_manager_pos = PageManager(taxonomies_pos, degree)
+    # page_manager_pos.taxonomies = taxonomies_pos
     # page_manager_pos.retrieve_taxonomy_pages(prefix="a_positive_")
     # pages_pos: category_pages = page_manager_pos.get_pages()
     
@@ -137,28 +175,56 @@ def main():
     #     header_id_blacklist, 
     #     li_truncators, 
     #     degree, 
-    #     prefix="a_positive_"
+    #     prefix="a_positive_",
+    #     page_index=page_index,
+    #     xml_dump=xml_dump
     #     )
     # content_manager_pos.retrieve_taxonomy_content()
     
     # Negative Corpus
-    category_manager_neg = CategoryManager(negative_domains, full_match_blacklist, partial_match_blacklist, degree)
-    category_manager_neg.retrieve_taxonomies(prefix="b_negative_")
+    journal_neg = CheckpointJournal("checkpoints/b_negative_journal.jsonl")
+    page_manager_neg = PageManager({}, degree, journal=journal_neg, page_index=page_index, corpus_name="negative", dump=sql_dump, category_info=category_info)
+    # The category search lists each category's pages along with its subcategories, for the page manager.
+    category_manager_neg = CategoryManager(negative_domains, full_match_blacklist, partial_match_blacklist, degree, journal=journal_neg, dump=sql_dump, category_info=category_info, page_manager=page_manager_neg)
+    if pipelined:
+        # Add the positive corpus' managers too, so both corpora share the pipeline's workers.
+        pipeline = StagePipeline(page_index, header_id_blacklist, li_truncators)
+        pipeline.add_corpus("negative", category_manager_neg, page_manager_neg, prefix="b_negative_")
+        pipeline.run()
+    else:
+        category_manager_neg.retrieve_taxonomies(prefix="b_negative_")
+        page_manager_neg.taxonomies = category_manager_neg.get_taxonomies()
+        page_manager_neg.retrieve_taxonomy_pages(prefix="b_negative_")
     taxonomies_neg: taxonomy = category_manager_neg.get_taxonomies()
-    
-    page_manager_neg = PageManager(taxonomies_neg, degree)
-    page_manager_neg.retrieve_taxonomy_pages(prefix="b_negative_")
     pages_neg: category_pages = page_manager_neg.get_pages()
     
-    content_manager_neg = ContentManager(
-        pages_neg, 
-        taxonomies_neg, 
-        header_id_blacklist, 
-        li_truncators, 
-        degree, 
-        prefix="b_negative_"
-        )
-    content_manager_neg.retrieve_taxonomy_content()
+    if num_shards is not None:
+        manifest_neg = ShardManifest(pages_neg, taxonomies_neg, degree, num_shards, header_id_blacklist, li_truncators, max_rate=25.0)
+        manifest_neg.save("shards/b_negative_manifest.json")
+        run_local_shards("shards/b_negative_manifest.json", "shards/b_negative/")
+        merge_shards(manifest_neg, "shards/b_negative/", prefix="b_negative_")
+    else:
+        content_manager_neg = ContentManager(
+            pages_neg, 
+            taxonomies_neg, 
+            header_id_blacklist, 
+            li_truncators, 
+            degree, 
+            prefix="b_negative_",
+            journal=journal_neg,
+            page_index=page_index,
+            xml_dump=xml_dump
+            )
+        content_manager_neg.retrieve_taxonomy_content()
+    # The outputs are complete, so the next run crawls again instead of replaying this one.
+    journal_neg.clear()
+    journal_neg.close()
+
+    page_index.save()
+    page_index.save_overlap_report("outputs/corpus_overlap.json", "positive", "negative")
+
+    get_default_client().log_stats()
+    metrics.save_summary("outputs/metrics.json")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,312 @@
+import requests
+import logging
+import random
+import threading
+import time
+
+
+from dataclasses import dataclass, field
+from email.utils import parsedate_to_datetime
+from typing import Any, Iterator
+from requests.adapters import HTTPAdapter
+
+
+from src.rate_limiter import AdaptiveRateLimiter, get_endpoint, OK, THROTTLED, FAILED
+from src.response_cache import ResponseCache, CacheMissError
+from src.utils.metrics import MetricsRegistry, get_default_registry
+
+
+logger = logging.getLogger(__name__)
+
+
+API_URL = "https://es.wikipedia.org/w/api.php"
+CATEGORY_PREFIX = "Categoría:"
+MAX_TITLES_PER_QUERY = 50
+USER_AGENT = "wikipedia-corpus-generator/0.1.0 (https://github.com/leobeeson/wikipedia-corpus-generator)"
+RETRYABLE_STATUS_CODES: set[int] = {429, 500, 502, 503, 504}
+RETRYABLE_API_ERRORS: set[str] = {"maxlag", "ratelimited", "readonly", "internal_api_error_DBQueryTimeoutError"}
+THROTTLING_API_ERRORS: set[str] = {"maxlag", "ratelimited"}
+
+
+class WikipediaAPIError(requests.exceptions.RequestException):
+
+
+    def __init__(self, code: str, info: str, response: requests.Response | None = None) -> None:
+        super().__init__(f"{code}: {info}", response=response)
+        self.code: str = code
+        self.info: str = info
+
+
+@dataclass
+class ClientStats:
+    requests: int = 0
+    bytes_received: int = 0
+    retries: int = 0
+    failures: int = 0
+    cache_hits: int = 0
+    cache_misses: int = 0
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+
+    def record_response(self, num_bytes: int) -> None:
+        with self._lock:
+            self.requests += 1
+            self.bytes_received += num_bytes
+
+
+    def record_retry(self) -> None:
+        with self._lock:
+            self.retries += 1
+
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+
+
+    def record_cache_lookup(self, hit: bool) -> None:
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+
+    def as_dict(self) -> dict[str, int]:
+        return {
+            "requests": self.requests,
+            "bytes_received": self.bytes_received,
+            "retries": self.retries,
+            "failures": self.failures,
+            "cache_hits": self.cache_hits,
+            "cache_misses": self.cache_misses
+        }
+
+
+class WikipediaClient:
+
+
+    def __init__(
+            self,
+            url: str = API_URL,
+            pool_size: int = 16,
+            max_retries: int = 5,
+            backoff_factor: float = 0.5,
+            max_backoff: float = 60.0,
+            maxlag: int | None = 5,
+            timeout: float = 30.0,
+            user_agent: str = USER_AGENT,
+            cache: ResponseCache | None = None,
+            rate_limiter: AdaptiveRateLimiter | None = None,
+            metrics: MetricsRegistry | None = None
+            ) -> None:
+        self.url: str = url
+        self.cache: ResponseCache | None = cache
+        self.rate_limiter: AdaptiveRateLimiter | None = rate_limiter
+        self.max_retries: int = max_retries
+        self.backoff_factor: float = backoff_factor
+        self.max_backoff: float = max_backoff
+        self.maxlag: int | None = maxlag
+        self.timeout: float = timeout
+        self.stats: ClientStats = ClientStats()
+        self.metrics: MetricsRegistry = metrics or get_default_registry()
+        self.session: requests.Session = requests.Session()
+        self.session.headers["User-Agent"] = user_agent
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+
+    def get(self, params: dict[str, Any], use_cache: bool = True) -> dict[str, Any]:
+        request_params: dict[str, Any] = {"format": "json", **params}
+        if self.maxlag is not None:
+            request_params.setdefault("maxlag", self.maxlag)
+
+        if self.cache is not None and (use_cache or self.cache.offline):
+            cached_data: dict[str, Any] | None = self.cache.get(self.url, request_params)
+            self.stats.record_cache_lookup(cached_data is not None)
+            self.metrics.counter(
+                "api_cache_lookups_total", "Response cache lookups, by endpoint and result.",
+                endpoint=get_endpoint(request_params), result="hit" if cached_data is not None else "miss"
+            ).inc()
+            if cached_data is not None:
+                return cached_data
+            if self.cache.offline:
+                raise CacheMissError(f"Offline mode: no cached response for {request_params}")
+
+        attempt: int = 0
+        while True:
+            try:
+                data: dict[str, Any] = self._send(request_params)
+                if self.cache is not None:
+                    self.cache.put(self.url, request_params, data)
+                return data
+
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout, requests.exceptions.HTTPError, WikipediaAPIError) as err:
+                if not self._is_retryable(err) or attempt >= self.max_retries:
+                    self.stats.record_failure()
+                    logger.warning(f"Request failed after {attempt + 1} attempts ({request_params}): {err}")
+                    raise
+                delay: float = self._retry_delay(err, attempt)
+                attempt += 1
+                self.stats.record_retry()
+                self.metrics.counter("api_retries_total", "Retried API requests, by endpoint.", endpoint=get_endpoint(request_params)).inc()
+                logger.warning(f"Retrying request in {delay:.2f} secs (attempt {attempt}/{self.max_retries}): {err}")
+                time.sleep(delay)
+
+
+    def _send(self, request_params: dict[str, Any]) -> dict[str, Any]:
+        # Every request goes through the rate limiter, which is told how the server responded:
+        # throttling (429, maxlag, ratelimited) and failures shrink the endpoint's budget.
+        endpoint: str = get_endpoint(request_params)
+        requested_at: float = time.perf_counter()
+        started_at: float = self.rate_limiter.acquire(endpoint) if self.rate_limiter is not None else 0.0
+        sent_at: float = time.perf_counter()
+        if self.rate_limiter is not None:
+            self.metrics.histogram("api_rate_limit_wait_seconds", "Time requests waited for the rate limiter, by endpoint.", endpoint=endpoint).observe(sent_at - requested_at)
+        outcome: str = FAILED
+        retry_after: float | None = None
+        response_bytes: int | None = None
+        try:
+            response = self.session.get(url=self.url, params=request_params, timeout=self.timeout)
+            response_bytes = len(response.content)
+            self.stats.record_response(response_bytes)
+            self.metrics.histogram("api_request_seconds", "API request latency, by endpoint.", endpoint=endpoint).observe(time.perf_counter() - sent_at)
+            self.metrics.counter("api_response_bytes_total", "Bytes received from the API, by endpoint.", endpoint=endpoint).inc(len(response.content))
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                raise requests.exceptions.HTTPError(f"{response.status_code} Server Error for url: {response.url}", response=response)
+            response.raise_for_status()
+            data: dict[str, Any] = response.json()
+            if "error" in data:
+                raise WikipediaAPIError(data["error"].get("code", "unknown"), data["error"].get("info", ""), response=response)
+            outcome = OK
+            return data
+        except (requests.exceptions.HTTPError, WikipediaAPIError) as err:
+            if self._is_throttled(err):
+                outcome = THROTTLED
+                retry_after = self._parse_retry_after(err.response.headers.get("Retry-After"))
+            elif isinstance(err, WikipediaAPIError) and err.code not in RETRYABLE_API_ERRORS:
+                outcome = OK
+            raise
+        finally:
+            self.metrics.counter("api_requests_total", "API requests sent, by endpoint and outcome.", endpoint=endpoint, outcome=outcome).inc()
+            if self.rate_limiter is not None:
+                self.rate_limiter.release(endpoint, started_at, outcome, retry_after, response_bytes)
+
+
+    def query(self, params: dict[str, Any], use_cache: bool = True) -> Iterator[dict[str, Any]]:
+        request_params: dict[str, Any] = dict(params)
+        while True:
+            data: dict[str, Any] = self.get(request_params, use_cache)
+            yield data
+            if "continue" not in data:
+                break
+            request_params = {**params, **data["continue"]}
+
+
+    def list_category_members(self, category: str, cmtype: str) -> list[dict[str, Any]]:
+        params: dict[str, Any] = {
+            "action": "query",
+            "list": "categorymembers",
+            "cmtitle": CATEGORY_PREFIX + category,
+            "cmtype": cmtype,
+            "cmlimit": 500
+        }
+        members: list[dict[str, Any]] = []
+        for data in self.query(params):
+            if "query" in data:
+                members += data["query"]["categorymembers"]
+        return members
+
+
+    def query_titles(
+            self, 
+            titles: list[str | int], 
+            params: dict[str, Any], 
+            id_param: str = "titles", 
+            use_cache: bool = True
+            ) -> dict[str, dict[str, Any]]:
+        pages: dict[str, dict[str, Any]] = {}
+        for batch_start in range(0, len(titles), MAX_TITLES_PER_QUERY):
+            batch: list[str | int] = titles[batch_start:batch_start + MAX_TITLES_PER_QUERY]
+            batch_params: dict[str, Any] = {"action": "query", "formatversion": 2, **params, id_param: "|".join(map(str, batch))}
+            for data in self.query(batch_params, use_cache):
+                query: dict[str, Any] = data.get("query", {})
+                aliases: dict[str, str] = {alias["to"]: alias["from"] for alias in query.get("normalized", [])}
+                for page in query.get("pages", []):
+                    title: str = aliases.get(page["title"], page["title"])
+                    merged_page: dict[str, Any] = pages.setdefault(title, {})
+                    for key, value in page.items():
+                        if isinstance(value, list) and key in merged_page:
+                            merged_page[key] += value
+                        else:
+                            merged_page[key] = value
+        return pages
+
+
+    def log_stats(self) -> None:
+        stats: dict[str, int] = self.stats.as_dict()
+        logger.info(f"API usage: {stats['requests']} requests, {stats['bytes_received'] / 1e6:.2f} MB received, {stats['retries']} retries, {stats['failures']} failures, {stats['cache_hits']} cache hits, {stats['cache_misses']} cache misses")
+        if self.rate_limiter is not None:
+            for endpoint, endpoint_stats in self.rate_limiter.snapshot().items():
+                logger.info(f"Rate limiter {endpoint}: {endpoint_stats}")
+
+
+    @staticmethod
+    def _is_throttled(err: requests.exceptions.RequestException) -> bool:
+        if err.response is None:
+            return False
+        if isinstance(err, WikipediaAPIError):
+            return err.code in THROTTLING_API_ERRORS
+        return err.response.status_code == 429
+
+
+    @staticmethod
+    def _is_retryable(err: requests.exceptions.RequestException) -> bool:
+        if isinstance(err, WikipediaAPIError):
+            return err.code in RETRYABLE_API_ERRORS
+        if isinstance(err, requests.exceptions.HTTPError):
+            return err.response is not None and err.response.status_code in RETRYABLE_STATUS_CODES
+        return True
+
+
+    def _retry_delay(self, err: requests.exceptions.RequestException, attempt: int) -> float:
+        retry_after: float | None = None
+        if err.response is not None:
+            retry_after = self._parse_retry_after(err.response.headers.get("Retry-After"))
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        backoff: float = min(self.max_backoff, self.backoff_factor * 2 ** attempt)
+        return backoff * random.uniform(0.5, 1.0)
+
+
+    @staticmethod
+    def _parse_retry_after(value: str | None) -> float | None:
+        if value is None:
+            return None
+        try:
+            return max(0.0, float(value))
+        except ValueError:
+            pass
+        try:
+            return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+        except (TypeError, ValueError):
+            return None
+
+
+_default_client: WikipediaClient | None = None
+_default_client_lock = threading.Lock()
+
+
+def set_default_client(client: WikipediaClient) -> None:
+    global _default_client
+    with _default_client_lock:
+        _default_client = client
+
+
+def get_default_client() -> WikipediaClient:
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = WikipediaClient()
+        return _default_client
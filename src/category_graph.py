@@ -0,0 +1,145 @@
+from array import array
+
+
+from src.utils.custom_types import category_label, category_tree
+
+
+# Categories are interned to integer ids and their subcategories are kept in compact `array('i')`
+# adjacency lists, together with a parent index. Removing an edge only records a tombstone for it,
+# so it is O(1) and leaves the adjacency arrays untouched. A category is "present" while it would be
+# a key of the equivalent `category_tree`; `_present` keeps the insertion order of those keys.
+class CategoryGraph:
+
+
+    def __init__(self) -> None:
+        self._ids: dict[category_label, int] = {}
+        self._labels: list[category_label] = []
+        self._children: list[array | None] = []
+        self._parents: list[array] = []
+        self._removed_edges: dict[int, set[int]] = {}
+        self._present: dict[int, None] = {}
+
+
+    def __contains__(self, category: category_label) -> bool:
+        node = self._ids.get(category)
+        return node is not None and node in self._present
+
+
+    def __len__(self) -> int:
+        return len(self._present)
+
+
+    def intern(self, category: category_label) -> int:
+        node = self._ids.get(category)
+        if node is None:
+            node = len(self._labels)
+            self._ids[category] = node
+            self._labels.append(category)
+            self._children.append(None)
+            self._parents.append(array('i'))
+        return node
+
+
+    def set_subcategories(self, category: category_label, subcategories: list[category_label]) -> None:
+        node: int = self.intern(category)
+        children = array('i', (self.intern(subcategory) for subcategory in subcategories))
+        previous_children = self._children[node]
+        if previous_children != children:
+            if previous_children is not None:
+                for child in previous_children:
+                    self._parents[child].remove(node)
+            for child in children:
+                self._parents[child].append(node)
+            self._children[node] = children
+        self._removed_edges.pop(node, None)
+        self._present.setdefault(node, None)
+
+
+    def categories(self) -> list[category_label]:
+        return [self._labels[node] for node in self._present]
+
+
+    def subcategories(self, category: category_label) -> list[category_label]:
+        node = self._ids.get(category)
+        if node is None:
+            return []
+        return [self._labels[child] for child in self._live_children(node)]
+
+
+    def parents(self, category: category_label) -> list[category_label]:
+        node = self._ids.get(category)
+        if node is None:
+            return []
+        return [
+            self._labels[parent] for parent in self._parents[node]
+            if parent in self._present and node not in self._removed_edges.get(parent, ())
+        ]
+
+
+    def remove_edge(self, category: category_label, subcategory: category_label) -> bool:
+        node = self._ids.get(category)
+        child = self._ids.get(subcategory)
+        if node is None or child is None or node not in self._present:
+            return False
+        self._removed_edges.setdefault(node, set()).add(child)
+        return True
+
+
+    def remove_subtree(self, category: category_label) -> list[category_label]:
+        removed: list[category_label] = []
+        node = self._ids.get(category)
+        if node is None:
+            return removed
+        stack: list[int] = [node]
+        while stack:
+            current = stack.pop()
+            if current not in self._present:
+                continue
+            del self._present[current]
+            removed.append(self._labels[current])
+            stack.extend(self._live_children(current))
+        return removed
+
+
+    def subtree(self, category: category_label, degree: int) -> category_tree:
+        # Iterative preorder walk bounded by `degree`. A category whose expansion already completed at
+        # the same or a shallower depth is skipped: expanding it again could not reach anything new,
+        # so neither the keys nor their order change, but shared subtrees are walked only once.
+        subcategory_tree: category_tree = {}
+        completed_depths: dict[int, int] = {}
+        root = self._ids.get(category)
+        stack: list[tuple[int, int, bool]] = [] if root is None else [(root, 0, False)]
+        while stack:
+            node, depth, completed = stack.pop()
+            if completed:
+                completed_depths[node] = min(depth, completed_depths.get(node, depth))
+                continue
+            if depth > degree or node not in self._present or completed_depths.get(node, degree + 1) <= depth:
+                continue
+            children: list[int] = self._live_children(node)
+            subcategory_tree.setdefault(self._labels[node], [self._labels[child] for child in children])
+            stack.append((node, depth, True))
+            stack.extend((child, depth + 1, False) for child in reversed(children))
+        return subcategory_tree
+
+
+    def to_category_tree(self) -> category_tree:
+        return {self._labels[node]: [self._labels[child] for child in self._live_children(node)] for node in self._present}
+
+
+    @classmethod
+    def from_category_tree(cls, category_tree_: category_tree) -> "CategoryGraph":
+        graph = cls()
+        for category, subcategories in category_tree_.items():
+            graph.set_subcategories(category, subcategories)
+        return graph
+
+
+    def _live_children(self, node: int) -> list[int]:
+        children = self._children[node]
+        if children is None:
+            return []
+        removed_edges = self._removed_edges.get(node)
+        if not removed_edges:
+            return children.tolist()
+        return [child for child in children if child not in removed_edges]
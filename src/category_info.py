@@ -0,0 +1,65 @@
+import logging
+
+
+from typing import Iterable
+
+
+from src.api_client import WikipediaClient, get_default_client, CATEGORY_PREFIX
+from src.utils.custom_types import category_label, category_pages, taxonomy
+
+
+logger = logging.getLogger(__name__)
+
+
+# Member counts of a category: "pages", "subcats" and "files".
+category_counts = dict[str, int]
+EMPTY_COUNTS: category_counts = {"pages": 0, "subcats": 0, "files": 0}
+
+
+# Member counts of categories from `prop=categoryinfo`, fetched for 50 categories per request and
+# shared by the managers as a planning pass: `CategoryManager` lists the largest categories of each
+# level first, and the number of pages a taxonomy lists is known before they are listed. MediaWiki
+# does not always keep these counts up to date, so they are estimates and never a reason to skip a
+# listing. Counts of a category nobody asked about are unknown.
+class CategoryInfo:
+
+
+    def __init__(self, client: WikipediaClient | None = None) -> None:
+        self.client: WikipediaClient = client or get_default_client()
+        self.counts: dict[category_label, category_counts] = {}
+        self.requested_categories: int = 0
+
+
+    def prefetch(self, categories: Iterable[category_label]) -> None:
+        pending: list[category_label] = list(dict.fromkeys(category for category in categories if category not in self.counts))
+        if not pending:
+            return
+        DATA = self.client.query_titles([CATEGORY_PREFIX + category for category in pending], {"prop": "categoryinfo"})
+        for category in pending:
+            # Categories without members have no `categoryinfo`, whether their page exists or not.
+            info: dict = DATA.get(CATEGORY_PREFIX + category, {}).get("categoryinfo", {})
+            self.counts[category] = {member_type: info.get(member_type, 0) for member_type in EMPTY_COUNTS}
+        self.requested_categories += len(pending)
+        empty: int = sum(1 for category in pending if self.counts[category]["pages"] == 0)
+        leaves: int = sum(1 for category in pending if self.counts[category]["subcats"] == 0)
+        logger.info(f"Retrieved member counts of {len(pending)} categories: {empty} without pages, {leaves} without subcategories")
+
+
+    def count(self, category: category_label, member_type: str) -> int | None:
+        # `member_type` is "pages", "subcats" or "files".
+        counts: category_counts | None = self.counts.get(category)
+        return None if counts is None else counts[member_type]
+
+
+    def count_taxonomy_pages(self, taxonomies: taxonomy, pages: category_pages | None = None) -> int:
+        # Page memberships of the taxonomies' categories, counted as `ContentManager` walks them. The
+        # lengths of the page lists in `pages` are used where known, counts for the other categories.
+        pages = pages or {}
+        categories: list[category_label] = [
+            listed_category
+            for domain_taxonomy in taxonomies.values()
+            for category, subcategories in domain_taxonomy.items()
+            for listed_category in (category, *subcategories)
+        ]
+        self.prefetch(category for category in categories if category not in pages)
+        return sum(len(pages[category]) if category in pages else self.counts[category]["pages"] for category in categories)
@@ -1,8 +1,19 @@
-import requests
 import logging
 import json
+import asyncio
 
 
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable
+
+
+from src.api_client import WikipediaClient, get_default_client, CATEGORY_PREFIX
+from src.category_graph import CategoryGraph
+from src.category_info import CategoryInfo
+from src.checkpoint_journal import CheckpointJournal, SUBCATEGORIES
+from src.page_manager import PageManager
+from src.sql_dump import CategoryLinksDump, CATEGORY_NAMESPACE
+from src.utils.blacklist_matcher import BlacklistMatcher
 from src.utils.custom_types import category_label, category_tree, taxonomy
 from src.utils.telemetry import time_category_iteration
 
@@ -18,14 +29,40 @@ class CategoryManager:
             domains: list[category_label],
             full_match_blacklist: list[category_label], 
             partial_blacklist_items: list[str],
-            degree: int = 1
+            degree: int = 1,
+            max_concurrent_requests: int = 8,
+            client: WikipediaClient | None = None,
+            normalize_blacklist: bool = False,
+            journal: CheckpointJournal | None = None,
+            dump: CategoryLinksDump | None = None,
+            category_info: CategoryInfo | None = None,
+            page_manager: PageManager | None = None
             ) -> None:
         self.domains: list[category_label] = domains
         self.full_match_blacklist: list[category_label] = full_match_blacklist
         self.partial_blacklist_items: list[str] = partial_blacklist_items
+        self.blacklist_matcher: BlacklistMatcher = BlacklistMatcher(full_match_blacklist, partial_blacklist_items, normalize_blacklist)
         self.degree: int = degree
-        self.categories: category_tree = {}
+        self.max_concurrent_requests: int = max_concurrent_requests
+        self.client: WikipediaClient = client or get_default_client()
+        self.graph: CategoryGraph = CategoryGraph()
         self.taxonomies: taxonomy = {}
+        self.subcategory_cache: category_tree = {}
+        self.category_depths: dict[category_label, dict[category_label, int]] = {}
+        self.journal: CheckpointJournal | None = journal
+        self.dump: CategoryLinksDump | None = dump
+        self.category_info: CategoryInfo | None = category_info
+        # With a page manager, categories are listed with `cmtype=subcat|page` and their pages are
+        # handed to it, so the page stage only lists the categories the search did not.
+        self.page_manager: PageManager | None = page_manager
+        if journal is not None:
+            self.subcategory_cache.update(journal.replay(SUBCATEGORIES))
+            logger.info(f"Restored subcategories of {len(self.subcategory_cache)} categories from checkpoint journal {journal.path}")
+
+
+    @property
+    def categories(self) -> category_tree:
+        return self.graph.to_category_tree()
 
 
     def retrieve_taxonomies(
@@ -33,9 +70,11 @@ class CategoryManager:
             filter_in_place: bool = True,
             save: bool = True,
             output_path: str = "outputs/",
-            prefix: str = ""
+            prefix: str = "",
+            concurrent: bool = False,
+            on_category: Callable[[category_label, category_label], None] | None = None
             ) -> None:
-        self.retrieve_categories(filter_in_place)
+        self.retrieve_categories(filter_in_place, concurrent, on_category)
         if not filter_in_place:
             self.filter_subcategories()
         self.generate_taxonomies()
@@ -43,110 +82,130 @@ class CategoryManager:
             self.save_taxonomies(output_path, prefix)
 
     
-    def retrieve_categories(self, filter_in_place: bool) -> None:
+    def retrieve_categories(
+            self,
+            filter_in_place: bool,
+            concurrent: bool = False,
+            on_category: Callable[[category_label, category_label], None] | None = None
+            ) -> None:
         for domain in self.domains:
+            self.category_search(domain, self.degree, filter_in_place, concurrent, on_category)
             if filter_in_place:
-                self.filtered_recursive_category_search(domain, self.degree)
                 self.filter_subcategories()
-            else:
-                self.recursive_category_search(domain, self.degree)
 
-    
-    @time_category_iteration
-    def recursive_category_search(self, domain: category_label, degree: int, current_degree: int = 0) -> None:
-        if current_degree > degree:
-            return
-
-        subcategories: list[category_label] = self.retrieve_subcategories(domain)
-        self.categories[domain] = subcategories
-        current_degree += 1
 
-        for subcategory in subcategories:
-            self.recursive_category_search(subcategory, degree, current_degree)
-
-    
     @time_category_iteration
-    def filtered_recursive_category_search(self, domain: category_label, degree: int, current_degree: int = 0) -> None:
-        if current_degree >= degree:
+    def category_search(
+            self,
+            domain: category_label,
+            degree: int,
+            filtered: bool = True,
+            concurrent: bool = False,
+            on_category: Callable[[category_label, category_label], None] | None = None
+            ) -> None:
+        # The filtered search expands categories strictly below `degree`, the unfiltered one
+        # expands up to and including it. Levels are expanded breadth-first, so the first time a
+        # category is reached is also the shortest depth at which it can be reached.
+        # `on_category(domain, category)` is called as soon as a category is reached, so later
+        # stages can start on it before the search completes. When pages are listed along with the
+        # subcategories, a category is only handed over once listed, or once reached at the last
+        # depth, where it is not listed, so the page stage never lists it a second time.
+        max_depth: int = degree - 1 if filtered else degree
+        depths: dict[category_label, int] = {domain: 0}
+        level: list[category_label] = [domain]
+        on_reached = on_category if self.page_manager is None else None
+        on_listed = on_category if self.page_manager is not None else None
+        if on_reached is not None:
+            on_reached(domain, domain)
+
+        for depth in range(max_depth + 1):
+            if not level:
+                break
+            self.fetch_subcategories(level, concurrent)
+            next_level: list[category_label] = []
+            for category in level:
+                if on_listed is not None:
+                    on_listed(domain, category)
+                subcategories: list[category_label] = self.subcategory_cache[category]
+                self.graph.set_subcategories(category, subcategories)
+                for subcategory in subcategories:
+                    if subcategory in depths or (filtered and self._is_blacklisted(subcategory)):
+                        continue
+                    depths[subcategory] = depth + 1
+                    next_level.append(subcategory)
+                    if on_reached is not None:
+                        on_reached(domain, subcategory)
+            level = next_level
+        if on_listed is not None:
+            for category in level:
+                on_listed(domain, category)
+
+        self.category_depths[domain] = depths
+
+
+    def fetch_subcategories(self, categories: list[category_label], concurrent: bool = False) -> None:
+        pending: list[category_label] = [category for category in categories if category not in self.subcategory_cache]
+        if not pending:
             return
-
-        subcategories: list[category_label] = self.retrieve_subcategories(domain)
-        self.categories[domain] = subcategories
-        current_degree += 1
-
-        for subcategory in subcategories:
-            if subcategory not in self.full_match_blacklist:
-                if not any(blacklist_item in subcategory for blacklist_item in self.partial_blacklist_items):
-                    self.filtered_recursive_category_search(subcategory, degree, current_degree)
+        if self.dump is None and self.category_info is not None:
+            # MediaWiki does not always keep `categoryinfo` counts up to date, so a count of 0 is no
+            # reason to skip a listing. The counts, one request per 50 categories of the level, only
+            # order the listings largest first, so those needing continuation requests start early.
+            self.category_info.prefetch(pending)
+            member_types: list[str] = ["subcats"] if self.page_manager is None else ["subcats", "pages"]
+            pending.sort(key=lambda category: -sum(self.category_info.count(category, member_type) or 0 for member_type in member_types))
+        if self.dump is not None:
+            # Dump lookups are in memory, so there is nothing to run concurrently or to journal.
+            results: list[list[category_label]] = [self.dump.subcategories(category) for category in pending]
+        elif concurrent:
+            results = asyncio.run(self._fetch_subcategories_concurrently(pending))
+        else:
+            results = [self.checkpoint_subcategories(category) for category in pending]
+        self.subcategory_cache.update(zip(pending, results))
+        logger.info(f"Retrieved subcategories of {len(pending)} categories ({len(categories) - len(pending)} already retrieved)")
+
+
+    async def _fetch_subcategories_concurrently(self, categories: list[category_label]) -> list[list[category_label]]:
+        loop = asyncio.get_running_loop()
+        with ThreadPoolExecutor(max_workers=self.max_concurrent_requests) as executor:
+            return await asyncio.gather(
+                *(loop.run_in_executor(executor, self.checkpoint_subcategories, category) for category in categories)
+            )
+
+
+    def checkpoint_subcategories(self, category: category_label) -> list[category_label]:
+        subcategories: list[category_label] = self.retrieve_subcategories(category)
+        if self.journal is not None:
+            self.journal.record(SUBCATEGORIES, category, subcategories)
+        return subcategories
 
 
     def retrieve_subcategories(self, category: category_label) -> list[category_label]:
-        S = requests.Session()
-        URL = "https://es.wikipedia.org/w/api.php"
-        PARAMS = {
-            "action": "query",
-            "format": "json",
-            "list": "categorymembers",
-            "cmtitle": "Categoría:" + category,
-            "cmtype": "subcat",
-            "cmlimit": 500
-        }
-
-        subcategories: list[category_label] = []
-        while True:
-            try:
-                R = S.get(url=URL, params=PARAMS)
-                R.raise_for_status()
-                DATA = R.json()
-
-                if 'query' in DATA:
-                    subcategories += [subcategory['title'].replace('Categoría:', '') for subcategory in DATA['query']['categorymembers']]
-
-                if 'continue' in DATA:
-                    PARAMS['cmcontinue'] = DATA['continue']['cmcontinue']
-                else:
-                    break
-
-            except requests.exceptions.HTTPError as http_err:
-                logger.warning(f'HTTP error occurred: {http_err}')
-                break
-            except requests.exceptions.ConnectionError as conn_err:
-                logger.warning(f'Error connecting: {conn_err}')
-                break
-            except requests.exceptions.Timeout as timeout_err:
-                logger.warning(f'Timeout error: {timeout_err}')
-                break
-            except requests.exceptions.RequestException as err:
-                logger.warning(f'An unexpected error occurred: {err}')
-                break
-
-        return subcategories
+        if self.page_manager is None:
+            members = self.client.list_category_members(category, "subcat")
+            return [subcategory['title'].replace(CATEGORY_PREFIX, '') for subcategory in members]
+        # `cmtype=page` lists every namespace but categories and files, so whatever is not a
+        # category is a page. Each type keeps its own order in the combined listing.
+        members = self.client.list_category_members(category, "subcat|page")
+        self.page_manager.add_category_members(category, [member for member in members if member['ns'] != CATEGORY_NAMESPACE])
+        return [member['title'].replace(CATEGORY_PREFIX, '') for member in members if member['ns'] == CATEGORY_NAMESPACE]
 
 
     def filter_subcategories(self) -> None:
-        categories_copy: category_tree = self.categories.copy()
-
-        for category, subcategories in categories_copy.items():
-            for subcategory in list(subcategories):
-                if subcategory in self.full_match_blacklist:
-                    try:
-                        self.categories[category].remove(subcategory)
+        for category in self.graph.categories():
+            for subcategory in self.graph.subcategories(category):
+                if self._is_blacklisted(subcategory):
+                    if self.graph.remove_edge(category, subcategory):
                         logger.info(f"Remove subcategory {subcategory.upper()} - from category {category.upper()}")
-                    except KeyError:
+                    else:
                         logger.info(f"Remove subcategory {subcategory.upper()} - from category {category.upper()} ### Category {category.upper()} had been previously removed.")
-                    self._remove_subcategories(self.categories, subcategory)
-                elif any(blacklist_item in subcategory for blacklist_item in self.partial_blacklist_items):
-                    try:
-                        self.categories[category].remove(subcategory)
-                        logger.info(f"Remove subcategory {subcategory.upper()} - from category {category.upper()}")
-                    except KeyError:
-                        logger.info(f"Remove subcategory {subcategory.upper()} - from category {category.upper()} ### Category {category.upper()} had been previously removed.")
-                    self._remove_subcategories(self.categories, subcategory)
+                    for removed_category in self.graph.remove_subtree(subcategory):
+                        logger.info(f"Remove category {removed_category.upper()}")
 
 
     def generate_taxonomies(self) -> None:
         for domain in self.domains:
-            domain_taxonomy = self._get_subcategories_dfs(self.categories, domain, self.degree)
+            domain_taxonomy = self.graph.subtree(domain, self.degree)
             self.taxonomies[domain] = domain_taxonomy
 
 
@@ -164,27 +223,8 @@ class CategoryManager:
         return self.taxonomies
 
 
-    @staticmethod
-    def _remove_subcategories(categories: category_tree, category: category_label) -> None:
-        if category in categories:
-            for subcategory in categories[category]:
-                CategoryManager._remove_subcategories(categories, subcategory)
-            del categories[category]
-            logger.info(f"Remove category {category.upper()}")
-
-
-    @staticmethod
-    def _get_subcategories_dfs(category_tree_: category_tree, domain: category_label, degree: int, current_degree: int = 0) -> category_tree:
-        if current_degree > degree:
-            return {}
-        
-        subcategory_tree: category_tree = {}
-        if domain in category_tree_:
-            subcategory_tree[domain] = category_tree_[domain]
-            current_degree += 1
-            for subcategory in category_tree_[domain]:
-                subcategory_tree.update(CategoryManager._get_subcategories_dfs(category_tree_, subcategory, degree, current_degree))
-        return subcategory_tree
+    def _is_blacklisted(self, category: category_label) -> bool:
+        return self.blacklist_matcher.is_blacklisted(category)
 
 
 if __name__ == "__main__":
@@ -225,16 +265,16 @@ if __name__ == "__main__":
     cm.retrieve_categories(filter_in_place=False)
     pprint.pprint(cm.categories)
 
-    output_cats = cm._get_subcategories_dfs(cm.categories, "Códigos jurídicos")
+    output_cats = cm.graph.subtree("Códigos jurídicos", degree)
     output_cats == cm.categories
-    output_cats = cm._get_subcategories_dfs(cm.categories, "Códigos por país")
+    output_cats = cm.graph.subtree("Códigos por país", degree)
     pprint.pprint(output_cats)
     
     cm.filter_subcategories()
     pprint.pprint(cm.categories)
     cm_in_place.categories == cm.categories
 
-    output_cats = cm._get_subcategories_dfs(cm.categories, "Códigos jurídicos")
+    output_cats = cm.graph.subtree("Códigos jurídicos", degree)
     output_cats == cm.categories
 
     cm_pipeline = CategoryManager(domains, full_match_blacklist, partial_match_blacklist, degree)
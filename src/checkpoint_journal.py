@@ -0,0 +1,142 @@
+import json
+import logging
+import os
+import threading
+import time
+
+
+from typing import Any, Iterator
+
+
+logger = logging.getLogger(__name__)
+
+
+SUBCATEGORIES = "subcategories"
+CATEGORY_PAGES = "category_pages"
+PAGE_CONTENT = "page_content"
+
+
+# Append-only log of completed work units, one JSON line per unit: {"kind", "key", "value"}. Entries
+# are buffered and written with an fsync every `sync_every` entries or `sync_interval` seconds, so a
+# crash loses at most one batch. A restarted run replays the journal to skip the work it records.
+#
+# Large payloads, e.g. page contents not yet in any output file, go to a sidecar data file
+# (`<journal>.data`) with `record_data`, and their entry only holds the byte range of the payload.
+# The data file is synced before the entries referring to it, and both are emptied by `clear`.
+class CheckpointJournal:
+
+
+    def __init__(self, path: str, sync_every: int = 64, sync_interval: float = 5.0) -> None:
+        self.path: str = path
+        self.sync_every: int = sync_every
+        self.sync_interval: float = sync_interval
+        self._pending: list[str] = []
+        self._last_sync: float = time.monotonic()
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._terminate_partial_line(path)
+        self._file = open(path, "a+", encoding="utf-8")
+        self.data_path: str = f"{path}.data"
+        self._data_size: int = self._terminate_partial_line(self.data_path)
+        self._data_file = open(self.data_path, "ab")
+
+
+    def __enter__(self) -> "CheckpointJournal":
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def record(self, kind: str, key: str, value: Any = None) -> None:
+        line = json.dumps({"kind": kind, "key": key, "value": value}, ensure_ascii=False)
+        with self._lock:
+            self._pending.append(line)
+            if len(self._pending) >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+
+    def record_data(self, kind: str, key: str, value: dict, data: Any) -> None:
+        data_line: bytes = json.dumps(data, ensure_ascii=False).encode("utf-8") + b"\n"
+        with self._lock:
+            self._data_file.write(data_line)
+            value = {**value, "data_offset": self._data_size, "data_length": len(data_line)}
+            self._data_size += len(data_line)
+        self.record(kind, key, value)
+
+
+    def read_data(self, value: dict) -> Any:
+        # The payload of an entry written by `record_data`.
+        with open(self.data_path, "rb") as in_file:
+            in_file.seek(value["data_offset"])
+            return json.loads(in_file.read(value["data_length"]))
+
+
+    def replay(self, kind: str) -> Iterator[tuple[str, Any]]:
+        # Later entries for the same key win, callers replay into dictionaries.
+        self.flush()
+        with open(self.path, "r", encoding="utf-8") as in_file:
+            for line in in_file:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping a truncated entry in checkpoint journal {self.path}")
+                    continue
+                if entry["kind"] == kind:
+                    yield entry["key"], entry["value"]
+
+
+    def flush(self) -> None:
+        with self._lock:
+            self._sync()
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._pending = []
+            self._file.truncate(0)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._data_file.truncate(0)
+            self._data_file.flush()
+            os.fsync(self._data_file.fileno())
+            self._data_size = 0
+
+
+    def close(self) -> None:
+        if self._file.closed:
+            return
+        self.flush()
+        self._file.close()
+        self._data_file.close()
+
+
+    def _sync(self) -> None:
+        if self._pending:
+            # Entries never refer to payloads that are not on disk yet.
+            self._data_file.flush()
+            os.fsync(self._data_file.fileno())
+            self._file.write("".join(f"{line}\n" for line in self._pending))
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._pending = []
+        self._last_sync = time.monotonic()
+
+
+    def _terminate_partial_line(self, path: str) -> int:
+        # A crash in the middle of a write can leave a partial last line. Starting a new line keeps
+        # it separate from the next entry, and replay skips it. Returns the size of the file.
+        with open(path, "ab+") as file:
+            size = file.seek(0, os.SEEK_END)
+            if size == 0:
+                return 0
+            file.seek(size - 1)
+            if file.read(1) != b"\n":
+                file.write(b"\n")
+                size += 1
+        return size
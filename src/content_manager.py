@@ -1,22 +1,56 @@
-import requests
-import re
 import json
 import os
 import logging
 
 
-from bs4 import BeautifulSoup
-from collections import defaultdict
+from collections import ChainMap, deque
+from collections.abc import Mapping
+from typing import Iterable, Iterator
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
 from tqdm import tqdm
 
 
+from src.api_client import WikipediaClient, get_default_client, MAX_TITLES_PER_QUERY
+from src.checkpoint_journal import CheckpointJournal, PAGE_CONTENT
+from src.corpus_columnar import COLUMNAR_EXTENSIONS, ColumnarCorpus, ColumnarCorpusWriter, read_columnar_records
+from src.corpus_store import CorpusStore, CorpusView, dump_corpus_json, load_corpus_json_index
+from src.corpus_writer import COMPRESSION_EXTENSIONS, CorpusIndex, CorpusWriter, IndexedCorpus, read_corpus_records, replace_corpus_file
+from src.page_index import PageIndex
+from src.html_extractors import HtmlExtractor, get_extractor
+from src.wikitext_extractor import extract_wikitext_content
+from src.xml_dump import MultistreamDump
+from src.utils.metrics import get_default_registry
 from src.utils.telemetry import timeit, time_category_iteration
-from src.utils.custom_types import category_label, page_label, page_text, category_pages, taxonomy, category_tree, corpus
+from src.utils.custom_types import category_label, page_label, page_text, category_pages, taxonomy, category_tree, corpus, page_revision, page_revisions
 
 
 logger = logging.getLogger(__name__)
 
 
+OUTPUT_FORMATS: list[str] = ["json", "jsonl", "parquet", "arrow"]
+# Formats written page by page while a domain is retrieved, instead of dumped at the end of it.
+STREAMING_FORMATS: list[str] = ["jsonl", "parquet", "arrow"]
+BATCHED_MODE_WARNING: str = (
+    "Batched mode extracts page contents from wikitext, which only approximates the parse mode output "
+    "for templates, infoboxes and tables. Use the default parse mode for corpora compared with parse mode ones."
+)
+
+
+def fetch_page_html(client: WikipediaClient, page_title: page_label, revision_id: int | None = None) -> tuple[str, page_revision]:
+    PARAMS = {
+        "action": "parse",
+        "prop": "text"
+    }
+    if revision_id is None:
+        PARAMS["page"] = page_title
+    else:
+        PARAMS["oldid"] = revision_id
+
+    DATA = client.get(PARAMS)
+
+    return DATA["parse"]["text"]["*"], {"pageid": DATA["parse"]["pageid"], "lastrevid": DATA["parse"]["revid"]}
+
+
 class ContentManager:
 
 
@@ -27,144 +61,590 @@ class ContentManager:
                  li_truncators: list[str], 
                  degree: int,
                  output_path: str = "outputs/",
-                 prefix: str = ""
+                 prefix: str = "",
+                 client: WikipediaClient | None = None,
+                 batch_size: int = MAX_TITLES_PER_QUERY,
+                 fetch_workers: int = 8,
+                 extraction_workers: int | None = None,
+                 queue_depth: int = 64,
+                 extraction_backend: str = "beautifulsoup",
+                 output_format: str = "json",
+                 compression: str | None = None,
+                 journal: CheckpointJournal | None = None,
+                 page_index: PageIndex | None = None,
+                 xml_dump: MultistreamDump | None = None
                  ) -> None:
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r}, expected one of {OUTPUT_FORMATS}")
+        if compression not in COMPRESSION_EXTENSIONS:
+            raise ValueError(f"Unknown compression {compression!r}, expected one of {list(COMPRESSION_EXTENSIONS)}")
+        if compression is not None and output_format != "jsonl":
+            raise ValueError("Compression is only supported with the jsonl output format.")
         self.pages: category_pages = pages
         self.taxonomies: taxonomy = taxonomies
         self.header_id_blacklist: list[str] = header_id_blacklist
         self.li_truncators: list[str] = li_truncators
+        self.extractor: HtmlExtractor = get_extractor(extraction_backend, header_id_blacklist, li_truncators)
         self.degree: int = degree
         self.output_path: str = output_path
         self.prefix: str = prefix
-        self.page_contents: corpus = defaultdict(list)
-        self.domain_contents: corpus = defaultdict(list)
+        self.client: WikipediaClient = client or get_default_client()
+        self.batch_size: int = min(batch_size, MAX_TITLES_PER_QUERY)
+        self.fetch_workers: int = fetch_workers
+        self.extraction_workers: int | None = extraction_workers
+        self.queue_depth: int = queue_depth
+        self.output_format: str = output_format
+        self.compression: str | None = compression
+        self.corpus_writer: CorpusWriter | ColumnarCorpusWriter | None = None
+        self.journal: CheckpointJournal | None = journal
+        self.current_domain: category_label | None = None
+        self.page_index: PageIndex | None = page_index
+        self.xml_dump: MultistreamDump | None = xml_dump
+        # Contents extracted from the dump for every domain at once, until stored in their domain.
+        self.dump_contents: CorpusStore | None = None
+        self.page_contents: CorpusStore = CorpusStore()
+        self.domain_contents: CorpusView = CorpusView(self.page_contents)
+        self.retrieved_pages: set[page_label] = set()
+        self.page_revisions: page_revisions = {}
+        self.stored_domain_pages: dict[category_label, set[page_label]] = {}
+        # Contents of the stored json domain files, read from disk when a page is needed.
+        self.stored_corpora: dict[category_label, Mapping[page_label, page_text]] = {}
+        # Journal entries of the pages fetched before a crash, by domain, replayed once at start-up.
+        self.journaled_pages: dict[category_label, dict[page_label, dict]] = {}
         self.update_page_contents_from_disk()
+        self.update_page_contents_from_journal()
         self.total_pages: int = self.calculate_total_pages_to_process()
 
 
     def retrieve_taxonomy_content(self, 
-                                  save: bool = True
+                                  save: bool = True,
+                                  batched: bool = False,
+                                  pipelined: bool = False
                                   ) -> None:
+        if batched and pipelined:
+            raise ValueError("The batched and pipelined content retrieval modes are mutually exclusive.")
+        if batched:
+            logger.warning(BATCHED_MODE_WARNING)
         progress_bar = tqdm(total=self.total_pages, desc='Retrieving content', dynamic_ncols=True)
         
         for domain in self.taxonomies:
-            domain_taxonomy: category_tree = self.taxonomies[domain]
-            for category in domain_taxonomy:
-                self.retrieve_pages_content(category, progress_bar)
-                for subcategory in domain_taxonomy[category]:
-                    self.retrieve_pages_content(subcategory, progress_bar)        
+            # In the streaming formats every page is appended to the domain file as soon as it is
+            # extracted, instead of being held in `domain_contents` until the whole domain is done.
+            streaming: bool = save and self.output_format in STREAMING_FORMATS
+            if streaming:
+                self.corpus_writer = self.open_corpus_writer(domain, self.get_content_filename(domain), append=True)
+            self.current_domain = domain
+            try:
+                self.restore_journaled_pages(domain)
+                self.reuse_indexed_pages(domain)
+                self.retrieve_domain_content(domain, progress_bar, batched, pipelined)
+            finally:
+                self.current_domain = None
+                if streaming:
+                    self.close_corpus_writer(domain)
             if save:
-                self.save_content(domain)
-                self.domain_contents = defaultdict(list)
+                if not streaming:
+                    self.save_content(domain)
+                self.domain_contents = CorpusView(self.page_contents)
         
         progress_bar.close()
+        if self.journal is not None:
+            self.journal.flush()
+        if self.page_index is not None:
+            logger.info(f"Reused {self.page_index.reused_pages} pages from the page index instead of fetching them")
+
+
+    def retrieve_domain_content(self, domain: category_label, progress_bar: tqdm, batched: bool = False, pipelined: bool = False) -> None:
+        if self.xml_dump is not None:
+            self.retrieve_domain_content_from_dump(domain, progress_bar)
+            return
+        if pipelined:
+            self.retrieve_domain_content_pipelined(domain, progress_bar)
+            return
+        if batched:
+            self.retrieve_domain_content_batched(domain, progress_bar)
+            return
+        domain_taxonomy: category_tree = self.taxonomies[domain]
+        for category in domain_taxonomy:
+            self.retrieve_pages_content(category, progress_bar)
+            for subcategory in domain_taxonomy[category]:
+                self.retrieve_pages_content(subcategory, progress_bar)
+
+
+    def close_corpus_writer(self, domain: category_label) -> None:
+        if self.corpus_writer is None:
+            return
+        self.corpus_writer.close()
+        logger.info(f"Wrote {self.corpus_writer.records_written} pages of domain {domain.upper()} to {self.corpus_writer.filename}")
+        self.corpus_writer = None
+
+
+    def refresh_taxonomy_content(self, 
+                                 save: bool = True,
+                                 batched: bool = False
+                                 ) -> None:
+        if self.output_format in STREAMING_FORMATS and not save:
+            raise ValueError(f"Refreshing a {self.output_format} corpus rewrites its domain files and requires save=True.")
+        if batched:
+            logger.warning(BATCHED_MODE_WARNING)
+        claimed_pages: set[page_label] = set()
+        for domain in self.taxonomies:
+            domain_pages: list[page_label] = [page for page in self.get_domain_pages(domain) if page not in claimed_pages]
+            claimed_pages.update(domain_pages)
+            current_revisions: page_revisions = self.retrieve_revision_ids(domain_pages)
+            stale_pages: list[page_label] = [
+                page for page in domain_pages 
+                if page in current_revisions and (
+                    page not in self.retrieved_pages 
+                    or self.page_revisions.get(page, {}).get("lastrevid") != current_revisions[page]["lastrevid"]
+                )
+            ]
+
+            if self.output_format in STREAMING_FORMATS:
+                kept_pages: list[page_label] = [page for page in domain_pages if page in current_revisions]
+                self.refresh_domain_file(domain, kept_pages, stale_pages, current_revisions, batched)
+                removed_pages: int = len(self.stored_domain_pages.get(domain, set()) - set(kept_pages))
+                logger.info(f"Refreshed domain {domain.upper()}: {len(stale_pages)} pages changed or added, {removed_pages} removed, {len(kept_pages) - len(stale_pages)} unchanged")
+                continue
+
+            self.retrieve_stale_content(domain, stale_pages, current_revisions, batched)
+            self.load_stored_pages(page for page in domain_pages if page in current_revisions)
+            self.domain_contents = CorpusView(self.page_contents, (page for page in domain_pages if page in current_revisions))
+            stored_pages: set[page_label] = self.stored_domain_pages.get(domain, set())
+            removed_pages: int = len(stored_pages - self.domain_contents.keys())
+            logger.info(f"Refreshed domain {domain.upper()}: {len(stale_pages)} pages changed or added, {removed_pages} removed, {len(self.domain_contents) - len(stale_pages)} unchanged")
+            if save:
+                self.save_content(domain, overwrite=True)
+            self.domain_contents = CorpusView(self.page_contents)
+
+
+    def retrieve_stale_content(self, domain: category_label, stale_pages: list[page_label], current_revisions: page_revisions, batched: bool = False) -> None:
+        if batched:
+            for batch_start in range(0, len(stale_pages), self.batch_size):
+                batch: list[page_label] = stale_pages[batch_start:batch_start + self.batch_size]
+                revision_ids: list[int] = [current_revisions[page]["lastrevid"] for page in batch]
+                for page, content in self.retrieve_batch_content(batch, revision_ids).items():
+                    self.store_page_content(page, content)
+        else:
+            for page in tqdm(stale_pages, desc=f'Refreshing {domain}', dynamic_ncols=True):
+                self.store_page_content(page, self.retrieve_page_content(page, current_revisions[page]["lastrevid"]))
+
+
+    def refresh_domain_file(self, 
+                            domain: category_label, 
+                            kept_pages: list[page_label], 
+                            stale_pages: list[page_label], 
+                            current_revisions: page_revisions, 
+                            batched: bool = False
+                            ) -> None:
+        # The refreshed domain is written to a temporary file: stale pages are fetched again, unchanged
+        # ones are copied over from the stored files, and the result replaces the old file at the end.
+        filename: str = self.get_content_filename(domain)
+        temp_filename: str = f"{filename}.tmp"
+        unchanged_pages: set[page_label] = set(kept_pages).difference(stale_pages)
+        with self.open_corpus_writer(domain, temp_filename) as writer:
+            self.corpus_writer = writer
+            try:
+                self.retrieve_stale_content(domain, stale_pages, current_revisions, batched)
+            finally:
+                self.corpus_writer = None
+            for record in self.iter_stored_records(domain, unchanged_pages):
+                writer.write_record(record)
+        replace_corpus_file(temp_filename, filename)
+        self.stored_domain_pages[domain] = set(kept_pages)
+
+
+    def iter_stored_records(self, domain: category_label, pages: set[page_label]) -> Iterator[dict]:
+        # Pages are usually stored in the domain's own file, other domain files are only read for the
+        # ones that are still missing after it.
+        pending_pages: set[page_label] = set(pages)
+        domains: list[category_label] = [domain] + [other for other in self.taxonomies if other != domain]
+        for stored_domain in domains:
+            filename: str = self.get_content_filename(stored_domain)
+            if not pending_pages:
+                return
+            if not os.path.exists(filename):
+                continue
+            for record in self.read_stored_records(filename):
+                if record["title"] in pending_pages:
+                    pending_pages.discard(record["title"])
+                    yield record
+        if pending_pages:
+            logger.warning(f"{len(pending_pages)} unchanged pages of domain {domain.upper()} were not found in the stored content")
+
+
+    @time_category_iteration
+    def retrieve_domain_content_pipelined(self, domain: category_label, progress_bar: tqdm) -> None:
+        # Fetcher threads download raw HTML and hand it straight to a process pool for extraction.
+        # The window of in-flight pages is bounded by `queue_depth` and drained in submission order,
+        # so results reach `domain_contents` in the same order as the sequential mode.
+        domain_page_count: int = self.count_domain_pages(domain)
+        pending_pages: list[page_label] = [page for page in self.get_domain_pages(domain) if page not in self.retrieved_pages]
+        progress_bar.update(domain_page_count - len(pending_pages))
+
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as fetchers, \
+                ProcessPoolExecutor(max_workers=self.extraction_workers) as extractors:
+
+            def fetch_and_extract(page_title: page_label) -> tuple[Future, page_revision]:
+                html_content, revision = self.fetch_page_html(page_title)
+                return extractors.submit(self.extractor.extract, html_content), revision
+
+            in_flight: deque[tuple[page_label, Future]] = deque()
+            queue_depth = get_default_registry().gauge("pipeline_queue_depth", "Items queued or in flight in a pipelined stage.", stage="content")
+            pages_iterator = iter(pending_pages)
+            for page in pages_iterator:
+                in_flight.append((page, fetchers.submit(fetch_and_extract, page)))
+                if len(in_flight) >= self.queue_depth:
+                    break
+            while in_flight:
+                page, fetch_future = in_flight.popleft()
+                extraction_future, revision = fetch_future.result()
+                self.page_revisions[page] = revision
+                self.store_page_content(page, extraction_future.result())
+                progress_bar.update()
+                next_page = next(pages_iterator, None)
+                if next_page is not None:
+                    in_flight.append((next_page, fetchers.submit(fetch_and_extract, next_page)))
+                queue_depth.set(len(in_flight))
+
+
+    @time_category_iteration
+    def retrieve_domain_content_from_dump(self, domain: category_label, progress_bar: tqdm) -> None:
+        # The domain's pages are stored in taxonomy order from the contents extracted for all
+        # domains in one pass over the dump.
+        if self.dump_contents is None:
+            self.extract_dump_contents()
+        pending_pages: list[page_label] = [page for page in self.get_domain_pages(domain) if page not in self.retrieved_pages]
+        progress_bar.update(self.count_domain_pages(domain) - len(pending_pages))
+        for page in pending_pages:
+            if page in self.dump_contents:
+                self.store_page_content(page, self.dump_contents[page])
+                del self.dump_contents[page]
+            else:
+                logger.warning(f"Page {page.upper()} was not found in dump {self.xml_dump.dump_path}")
+                self.store_page_content(page, [])
+            progress_bar.update()
+
+
+    def extract_dump_contents(self) -> None:
+        # The pending pages of every domain are located with one scan of the dump index, and every
+        # stream holding some of them is decompressed and extracted once in one process pool,
+        # whichever domains list its pages. Pages with current content in the page index are skipped.
+        pending_pages: dict[page_label, None] = dict.fromkeys(
+            page
+            for domain in self.taxonomies
+            for page in self.get_domain_pages(domain)
+            if page not in self.retrieved_pages and not (self.page_index is not None and self.page_index.has_current_content(page))
+        )
+        self.dump_contents = CorpusStore()
+        for page, content, revision in self.xml_dump.iter_pages(pending_pages, self.header_id_blacklist, self.li_truncators):
+            self.page_revisions[page] = revision
+            self.dump_contents[page] = content
+        logger.info(f"Extracted {len(self.dump_contents)} of {len(pending_pages)} pending pages of {len(self.taxonomies)} domains from dump {self.xml_dump.dump_path}")
 
 
     @time_category_iteration
     def retrieve_pages_content(self, category: category_label, progress_bar: tqdm) -> None:
         for page in self.pages[category]:
-            if page in self.page_contents:
+            if page in self.retrieved_pages:
                 progress_bar.update()
                 continue
-            content = self.retrieve_page_content(page)
-            self.page_contents[page] = content
-            self.domain_contents[page] = content
+            self.store_page_content(page, self.retrieve_page_content(page))
             progress_bar.update()
-        
 
-    
-    def retrieve_page_content(self, page_title: page_label) -> page_text:
-        S = requests.Session()
-        URL = "https://es.wikipedia.org/w/api.php"
 
+    @time_category_iteration
+    def retrieve_domain_content_batched(self, domain: category_label, progress_bar: tqdm) -> None:
+        # Batches are filled across the domain's categories, most of which hold far fewer pages than
+        # a batch. Contents are stored by page, so every category listing a page finds it there, and
+        # pages are stored in taxonomy order as in the sequential mode.
+        pending_pages: list[page_label] = [page for page in self.get_domain_pages(domain) if page not in self.retrieved_pages]
+        progress_bar.update(self.count_domain_pages(domain) - len(pending_pages))
+        for batch_start in range(0, len(pending_pages), self.batch_size):
+            batch: list[page_label] = pending_pages[batch_start:batch_start + self.batch_size]
+            for page, content in self.retrieve_batch_content(batch).items():
+                self.store_page_content(page, content)
+            progress_bar.update(len(batch))
+
+
+    def store_page_content(self, page: page_label, content: page_text, checkpoint: bool = True) -> None:
+        self.retrieved_pages.add(page)
+        if self.page_index is not None:
+            self.page_index.add_content(page, content, self.page_revisions.get(page))
+        if checkpoint and self.journal is not None and self.current_domain is not None and self.output_format != "jsonl":
+            # jsonl outputs are written and indexed page by page, so they are their own checkpoint.
+            # Other outputs are only written once the domain is done, so until then the content is
+            # kept in the journal's data file.
+            self.journal.record_data(PAGE_CONTENT, page, {"domain": self.current_domain, **self.page_revisions.get(page, {})}, content)
+        if self.corpus_writer is not None:
+            self.corpus_writer.write(page, content, self.page_revisions.get(page))
+            return
+        self.page_contents[page] = content
+        self.domain_contents.add(page)
+
+
+    def retrieve_batch_content(self, page_titles: list[page_label], revision_ids: list[int] | None = None) -> corpus:
         PARAMS = {
-            "action": "parse",
-            "page": page_title,
-            "format": "json",
-            "prop": "text"
+            "prop": "revisions",
+            "rvprop": "content|ids",
+            "rvslots": "main"
         }
 
-        R = S.get(url=URL, params=PARAMS)
-        DATA = R.json()
-
-        html_content = DATA["parse"]["text"]["*"]
-        soup = BeautifulSoup(html_content, 'html.parser')
-        
-        content: page_text = []
-        blacklisted_section: bool = False
-        for tag in soup.find('div', {'class': 'mw-parser-output'}).children:
-            
-            if blacklisted_section:
-                if tag.name not in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                    continue
-                else:
-                    blacklisted_section = False
-
-            tag_text = tag.get_text().strip()
-
-            if tag.name in ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']:
-                if any(child.get('id') in self.header_id_blacklist for child in tag.find_all('span')):
-                    blacklisted_section = True
-                    continue
-                tag_text = re.sub(r'\[.*?\]$', '', tag_text)
-                content.append(f"{tag.name}: {tag_text}")           
-
-            if tag.name in ['ul', 'ol']:
-                for li in tag.find_all('li'):
-                    li_text = li.get_text().strip()
-                    if li_text in self.li_truncators:
-                        break
-                    content.append(f"{li.name}: {li_text}")                
+        if revision_ids is None:
+            DATA = self.client.query_titles(page_titles, PARAMS)
+        else:
+            DATA = self.client.query_titles(revision_ids, PARAMS, id_param="revids")
+
+        contents: corpus = {}
+        for page_title in page_titles:
+            revisions = DATA.get(page_title, {}).get("revisions")
+            if not revisions:
+                logger.warning(f"No revision content returned for page {page_title.upper()}")
+                contents[page_title] = []
                 continue
+            self.page_revisions[page_title] = {"pageid": DATA[page_title]["pageid"], "lastrevid": revisions[0]["revid"]}
+            wikitext: str = revisions[0]["slots"]["main"]["content"]
+            contents[page_title] = extract_wikitext_content(wikitext, self.header_id_blacklist, self.li_truncators)
+        return contents
 
-            if tag.name == 'p':
-                content.append(f"{tag.name}: {tag_text}")
+    
+    def retrieve_page_content(self, page_title: page_label, revision_id: int | None = None) -> page_text:
+        html_content, revision = self.fetch_page_html(page_title, revision_id)
+        self.page_revisions[page_title] = revision
+        return self.extract_page_content(html_content)
 
-            if tag.name == 'dl':
-                for dt in tag.find_all('dt'):
-                    dt_text = dt.get_text().strip()
-                    content.append(f"{dt.name}: {dt_text}")
-                continue
 
-        return content
+    def fetch_page_html(self, page_title: page_label, revision_id: int | None = None) -> tuple[str, page_revision]:
+        return fetch_page_html(self.client, page_title, revision_id)
 
 
-    def save_content(self, domain: category_label) -> None:
-        domain_name = domain.replace(" ", "_").lower()
-        filename = f"{self.output_path}{self.prefix}{domain_name}_content_degree_{self.degree}.json"
+    def extract_page_content(self, html_content: str) -> page_text:
+        return self.extractor.extract(html_content)
+
+
+    def save_content(self, domain: category_label, overwrite: bool = False) -> None:
+        filename = self.get_domain_filename(domain, "content")
         
-        if not os.path.exists(filename):
-            with open(filename, "w") as out_file:
-                json.dump({domain: self.domain_contents}, out_file, indent=4, ensure_ascii=False)
+        if overwrite or not os.path.exists(filename):
+            index = CorpusIndex(records=False)
+            with open(filename, "w", encoding="utf-8") as out_file:
+                dump_corpus_json(domain, self.domain_contents, out_file, index)
+            index.save(filename)
+            self.stored_corpora[domain] = IndexedCorpus(filename, index)
+            domain_revisions: page_revisions = {page: self.page_revisions[page] for page in self.domain_contents if page in self.page_revisions}
+            with open(self.get_domain_filename(domain, "revisions"), "w", encoding="utf-8") as out_file:
+                json.dump({domain: domain_revisions}, out_file, indent=4, ensure_ascii=False)
         else:
-            logger.info(f"Content for domain {domain_name.upper()} already exists, skipping the saving operation.")
+            logger.info(f"Content for domain {domain.replace(' ', '_').upper()} already exists, skipping the saving operation.")
 
 
     def update_page_contents_from_disk(self) -> None:
         for domain in self.taxonomies:
-            domain_name = domain.replace(" ", "_").lower()
-            filename = f"{self.output_path}{self.prefix}{domain_name}_content_degree_{self.degree}.json"
+            if self.output_format in STREAMING_FORMATS:
+                self.update_stored_pages_from_records(domain)
+                continue
+            filename = self.get_domain_filename(domain, "content")
             if os.path.exists(filename):
-                with open(filename, 'r') as in_file:
-                    domain_content = json.load(in_file)
-                    for page, content in domain_content[domain].items():
-                        self.page_contents[page] = content
+                # Only the file's index is read, page contents stay on disk until they are needed.
+                index: CorpusIndex | None = load_corpus_json_index(filename)
+                if index is not None:
+                    self.stored_corpora[domain] = IndexedCorpus(filename, index)
+                else:
+                    with open(filename, 'r', encoding='utf-8') as in_file:
+                        self.stored_corpora[domain] = json.load(in_file)[domain]
+                self.stored_domain_pages[domain] = set(self.stored_corpora[domain])
+                self.retrieved_pages.update(self.stored_corpora[domain])
+            revisions_filename = self.get_domain_filename(domain, "revisions")
+            if os.path.exists(revisions_filename):
+                with open(revisions_filename, 'r', encoding='utf-8') as in_file:
+                    self.page_revisions.update(json.load(in_file)[domain])
+
+
+    def update_page_contents_from_journal(self) -> None:
+        # Pages fetched before a crash are known from the journal. Their contents stay in the
+        # journal's data file until `restore_journaled_pages` reads them back into their domain.
+        if self.journal is None:
+            return
+        restored_pages: int = 0
+        for page, entry in self.journal.replay(PAGE_CONTENT):
+            self.journaled_pages.setdefault(entry["domain"], {})[page] = entry
+            if page in self.retrieved_pages:
+                continue
+            self.retrieved_pages.add(page)
+            if "lastrevid" in entry:
+                self.page_revisions[page] = {"pageid": entry["pageid"], "lastrevid": entry["lastrevid"]}
+            restored_pages += 1
+        logger.info(f"Restored {restored_pages} pages from checkpoint journal {self.journal.path}")
+
+
+    def restore_journaled_pages(self, domain: category_label) -> None:
+        # Journaled pages of the domain that are missing from its stored output are written to it
+        # again, so the domain output is complete without fetching them a second time.
+        if self.journal is None:
+            return
+        stored_pages: set[page_label] = self.stored_domain_pages.setdefault(domain, set())
+        for page, entry in self.journaled_pages.pop(domain, {}).items():
+            if page in stored_pages or page in self.domain_contents:
+                continue
+            # Older journals held the contents in the entries themselves.
+            content: page_text = entry["content"] if "content" in entry else self.journal.read_data(entry)
+            self.store_page_content(page, content, checkpoint=False)
+            if self.corpus_writer is not None:
+                stored_pages.add(page)
+
+
+    def reuse_indexed_pages(self, domain: category_label) -> None:
+        # Pages already extracted for another corpus (or an earlier run) are taken from the page index.
+        # Contents from an earlier run are only reused if the page has not been edited since.
+        if self.page_index is None:
+            return
+        pending_pages: list[page_label] = [page for page in self.get_domain_pages(domain) if page not in self.retrieved_pages]
+        unverified_pages: list[page_label] = self.page_index.unverified_pages(pending_pages)
+        if unverified_pages:
+            current_revisions: page_revisions = self.retrieve_revision_ids(unverified_pages)
+            outdated_pages: int = sum(1 for page in unverified_pages if not self.page_index.verify_revision(page, current_revisions.get(page)))
+            logger.info(f"Checked {len(unverified_pages)} pages of the page index against their current revisions, {outdated_pages} changed since")
+        for page in pending_pages:
+            indexed_page = self.page_index.get_content(page)
+            if indexed_page is None:
+                continue
+            content, revision = indexed_page
+            if revision:
+                self.page_revisions[page] = revision
+            self.store_page_content(page, content)
+
+
+    def update_stored_pages_from_records(self, domain: category_label) -> None:
+        # Only titles and revisions are loaded, page contents stay on disk.
+        filename = self.get_content_filename(domain)
+        if not os.path.exists(filename):
+            return
+        if self.output_format == "jsonl":
+            # Read from the file's index, which is only rebuilt when the file has changed without it.
+            stored_corpus = IndexedCorpus(filename)
+            for page in stored_corpus:
+                revision: page_revision | None = stored_corpus.get_revision(page)
+                if revision is not None:
+                    self.page_revisions[page] = revision
+            self.stored_domain_pages[domain] = set(stored_corpus)
+            self.retrieved_pages.update(stored_corpus)
+            return
+        stored_pages: set[page_label] = set()
+        for record in self.read_stored_records(filename, content=False):
+            stored_pages.add(record["title"])
+            if "lastrevid" in record:
+                self.page_revisions[record["title"]] = {"pageid": record["pageid"], "lastrevid": record["lastrevid"]}
+        self.stored_domain_pages[domain] = stored_pages
+        self.retrieved_pages.update(stored_pages)
+
+
+    def retrieve_revision_ids(self, page_titles: list[page_label]) -> page_revisions:
+        DATA = self.client.query_titles(page_titles, {"prop": "info"}, use_cache=False)
+        revisions: page_revisions = {}
+        for page_title in page_titles:
+            page = DATA.get(page_title, {})
+            if "lastrevid" not in page:
+                logger.info(f"Page {page_title.upper()} no longer exists")
+                continue
+            revisions[page_title] = {"pageid": page["pageid"], "lastrevid": page["lastrevid"]}
+        return revisions
+
+
+    def get_domain_pages(self, domain: category_label) -> list[page_label]:
+        domain_pages: dict[page_label, None] = {}
+        domain_taxonomy: category_tree = self.taxonomies[domain]
+        for category in domain_taxonomy:
+            domain_pages.update(dict.fromkeys(self.pages[category]))
+            for subcategory in domain_taxonomy[category]:
+                domain_pages.update(dict.fromkeys(self.pages[subcategory]))
+        return list(domain_pages)
+
+
+    def get_domain_filename(self, domain: category_label, output_type: str, extension: str = "json") -> str:
+        domain_name = domain.replace(" ", "_").lower()
+        return f"{self.output_path}{self.prefix}{domain_name}_{output_type}_degree_{self.degree}.{extension}"
+
+
+    def get_content_filename(self, domain: category_label) -> str:
+        if self.output_format == "jsonl":
+            return self.get_domain_filename(domain, "content", f"jsonl{COMPRESSION_EXTENSIONS[self.compression]}")
+        if self.output_format in COLUMNAR_EXTENSIONS:
+            return self.get_domain_filename(domain, "content", self.output_format)
+        return self.get_domain_filename(domain, "content")
+
+
+    def open_corpus_writer(self, domain: category_label, filename: str, append: bool = False) -> CorpusWriter | ColumnarCorpusWriter:
+        if self.output_format in COLUMNAR_EXTENSIONS:
+            return ColumnarCorpusWriter(filename, self.output_format, domain, self.get_page_categories(domain), append=append)
+        return CorpusWriter(filename, self.compression, append=append, index=True)
+
+
+    def read_stored_records(self, filename: str, content: bool = True) -> Iterator[dict]:
+        if self.output_format in COLUMNAR_EXTENSIONS:
+            return read_columnar_records(filename, content)
+        return read_corpus_records(filename)
+
+
+    def get_page_categories(self, domain: category_label) -> dict[page_label, category_label]:
+        # The category a page is listed under in the columnar formats: the first one of the domain
+        # taxonomy that lists it.
+        page_categories: dict[page_label, category_label] = {}
+        domain_taxonomy: category_tree = self.taxonomies[domain]
+        for category in domain_taxonomy:
+            for listed_category in (category, *domain_taxonomy[category]):
+                for page in self.pages[listed_category]:
+                    page_categories.setdefault(page, listed_category)
+        return page_categories
 
 
     @timeit
     def calculate_total_pages_to_process(self) -> int:
-        total_pages: int = 0
-        for domain in self.taxonomies:
-            domain_taxonomy: category_tree = self.taxonomies[domain]
-            for category in domain_taxonomy:
-                total_pages += len(self.pages[category])
-                for subcategory in domain_taxonomy[category]:
-                    total_pages += len(self.pages[subcategory])
-        return total_pages
+        return sum(self.count_domain_pages(domain) for domain in self.taxonomies)
+
+
+    def count_domain_pages(self, domain: category_label) -> int:
+        domain_page_count: int = 0
+        domain_taxonomy: category_tree = self.taxonomies[domain]
+        for category in domain_taxonomy:
+            domain_page_count += len(self.pages[category])
+            for subcategory in domain_taxonomy[category]:
+                domain_page_count += len(self.pages[subcategory])
+        return domain_page_count
 
 
-    def get_corpus(self) -> corpus:
-        return self.page_contents
+    def load_stored_pages(self, pages: Iterable[page_label]) -> None:
+        # Reads the given pages from the stored json domain files into `page_contents`, where missing.
+        for page in pages:
+            if page in self.page_contents:
+                continue
+            for stored_corpus in self.stored_corpora.values():
+                if page in stored_corpus:
+                    self.page_contents[page] = stored_corpus[page]
+                    break
+
+
+    def get_corpus(self) -> Mapping[page_label, page_text]:
+        # Pages are materialized as `page_text` lists only when they are read from the store.
+        if self.output_format == "json":
+            # Stored pages are read from their domain files when they are looked up.
+            if not self.stored_corpora:
+                return self.page_contents
+            return ChainMap(self.page_contents, *self.stored_corpora.values())
+        if self.output_format in COLUMNAR_EXTENSIONS:
+            # A lazy view over the memory-mapped domain files instead of a copy of their contents.
+            filenames: list[str] = [self.get_content_filename(domain) for domain in self.taxonomies]
+            stored_corpus = ColumnarCorpus(filename for filename in filenames if os.path.exists(filename))
+            return ChainMap(self.page_contents, stored_corpus) if self.page_contents else stored_corpus
+        # Streamed contents only live on disk, so they are read back into a new store here.
+        corpus_ = CorpusStore()
+        for domain in self.taxonomies:
+            filename = self.get_content_filename(domain)
+            if os.path.exists(filename):
+                for record in self.read_stored_records(filename):
+                    if record["title"] not in corpus_:
+                        corpus_[record["title"]] = record["content"]
+        corpus_.update(self.page_contents)
+        return corpus_
 
 
 if __name__ == "__main__":
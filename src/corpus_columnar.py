@@ -0,0 +1,302 @@
+import logging
+import os
+
+
+from bisect import bisect_right
+from collections.abc import Iterable, Iterator, Mapping
+
+
+from src.corpus_store import LINE_TAG_CODES
+from src.utils.custom_types import category_label, category_pages, page_label, page_text, page_revision
+
+
+logger = logging.getLogger(__name__)
+
+
+COLUMNAR_EXTENSIONS: dict[str, str] = {
+    "parquet": ".parquet",
+    "arrow": ".arrow"
+}
+CONTENT_COLUMNS: list[str] = ["page", "category", "domain", "tag", "text", "pageid", "lastrevid"]
+PAGES_COLUMNS: list[str] = ["domain", "category", "page", "pageid"]
+ROW_GROUP_SIZE: int = 1 << 13
+ROW_GROUP_CACHE_SIZE: int = 4
+PARQUET_COMPRESSION: str = "zstd"
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError as err:
+        raise ImportError("The parquet and arrow output formats require the pyarrow package: pip install pyarrow") from err
+    return pyarrow
+
+
+def content_schema():
+    pa = _import_pyarrow()
+    return pa.schema([
+        ("page", pa.string()),
+        ("category", pa.string()),
+        ("domain", pa.string()),
+        ("tag", pa.string()),
+        ("text", pa.string()),
+        ("pageid", pa.int64()),
+        ("lastrevid", pa.int64())
+    ])
+
+
+def pages_schema():
+    pa = _import_pyarrow()
+    return pa.schema([("domain", pa.string()), ("category", pa.string()), ("page", pa.string()), ("pageid", pa.int64())])
+
+
+def split_line(line: str) -> tuple[str, str]:
+    # The reverse of the extractors' "tag: text" lines. Lines without a known tag are kept verbatim
+    # with an empty tag, as `CorpusStore` does.
+    tag, separator, text = line.partition(": ")
+    if separator and tag in LINE_TAG_CODES:
+        return tag, text
+    return "", line
+
+
+def join_line(tag: str, text: str) -> str:
+    return f"{tag}: {text}" if tag else text
+
+
+def iter_columnar_batches(filename: str) -> Iterator:
+    pa = _import_pyarrow()
+    if filename.endswith(COLUMNAR_EXTENSIONS["arrow"]):
+        reader = pa.ipc.open_file(pa.memory_map(filename))
+        for batch in range(reader.num_record_batches):
+            yield reader.get_batch(batch)
+        return
+    yield from pa.parquet.ParquetFile(filename, memory_map=True).iter_batches(batch_size=ROW_GROUP_SIZE)
+
+
+def page_ranges(table) -> tuple[list[page_label], list[int], list[int]]:
+    # The rows of a page are contiguous, so pages start wherever the page column changes. Found with
+    # vectorized compute kernels, without converting the column to Python strings.
+    pa = _import_pyarrow()
+    pages = table.column("page")
+    if len(pages) == 0:
+        return [], [], []
+    changes = pa.compute.not_equal(pages.slice(1), pages.slice(0, len(pages) - 1))
+    starts: list[int] = [0, *(row + 1 for row in pa.compute.indices_nonzero(changes).to_pylist())]
+    ends: list[int] = [*starts[1:], len(pages)]
+    titles: list[page_label] = pages.take(starts).to_pylist()
+    return titles, starts, ends
+
+
+# One memory-mapped columnar corpus file. Arrow IPC files are used in place: their columns point into
+# the mapped file, and nothing is decoded until a page is read. Parquet pages are compressed and
+# encoded, so only the page and revision columns are decoded up front. The tag and text columns are
+# decoded one row group at a time as pages are read, keeping the last few row groups.
+class ColumnarFile:
+
+
+    def __init__(self, filename: str) -> None:
+        pa = _import_pyarrow()
+        self.filename: str = filename
+        self._parquet_file = None
+        self._row_groups: dict[int, object] = {}
+        if filename.endswith(COLUMNAR_EXTENSIONS["arrow"]):
+            self.table = pa.ipc.open_file(pa.memory_map(filename)).read_all()
+            return
+        self._parquet_file = pa.parquet.ParquetFile(filename, memory_map=True)
+        self.table = self._parquet_file.read(columns=["page", "pageid", "lastrevid"])
+        self._row_group_starts: list[int] = [0]
+        for row_group in range(self._parquet_file.metadata.num_row_groups):
+            self._row_group_starts.append(self._row_group_starts[-1] + self._parquet_file.metadata.row_group(row_group).num_rows)
+
+
+    def read_page_content(self, start: int, end: int) -> page_text:
+        rows = self.read_rows(start, end)
+        tags: list[str | None] = rows.column("tag").to_pylist()
+        texts: list[str | None] = rows.column("text").to_pylist()
+        # A page without content is stored as a single row with a null text.
+        return [join_line(tag, text) for tag, text in zip(tags, texts) if text is not None]
+
+
+    def read_rows(self, start: int, end: int):
+        if self._parquet_file is None:
+            return self.table.slice(start, end - start)
+        pa = _import_pyarrow()
+        first_group: int = bisect_right(self._row_group_starts, start) - 1
+        last_group: int = bisect_right(self._row_group_starts, end - 1) - 1
+        groups = [self.read_row_group(row_group) for row_group in range(first_group, last_group + 1)]
+        rows = groups[0] if len(groups) == 1 else pa.concat_tables(groups)
+        return rows.slice(start - self._row_group_starts[first_group], end - start)
+
+
+    def read_row_group(self, row_group: int):
+        if row_group not in self._row_groups:
+            if len(self._row_groups) >= ROW_GROUP_CACHE_SIZE:
+                del self._row_groups[next(iter(self._row_groups))]
+            self._row_groups[row_group] = self._parquet_file.read_row_group(row_group, columns=["tag", "text"])
+        return self._row_groups[row_group]
+
+
+    def read_all(self):
+        if self._parquet_file is None:
+            return self.table
+        return self._parquet_file.read()
+
+
+def read_columnar_records(filename: str, content: bool = True) -> Iterator[dict]:
+    # Yields the same `{"title", "content", "pageid", "lastrevid"}` records as `read_corpus_records`.
+    # Without `content` only the page and revision columns are read.
+    columnar_file = ColumnarFile(filename)
+    # A domain without pages is written as a file without rows.
+    if columnar_file.table.num_rows == 0:
+        return
+    titles, starts, ends = page_ranges(columnar_file.table)
+    page_ids: list[int | None] = columnar_file.table.column("pageid").take(starts).to_pylist()
+    revision_ids: list[int | None] = columnar_file.table.column("lastrevid").take(starts).to_pylist()
+    for title, start, end, page_id, revision_id in zip(titles, starts, ends, page_ids, revision_ids):
+        record: dict = {"title": title}
+        if content:
+            record["content"] = columnar_file.read_page_content(start, end)
+        if revision_id is not None:
+            record.update({"pageid": page_id, "lastrevid": revision_id})
+        yield record
+
+
+# Writes a domain's contents as one row per text block: page, category, domain, tag and text, plus
+# the page's revision ids. Rows are buffered and written as row groups (record batches in the Arrow
+# format) of `row_group_size` rows. Neither format can be appended to in place, so the file is
+# written under a `.partial` name and replaces the final one when closed. Appending copies the rows
+# of the existing file into the new one first. Same interface as `CorpusWriter`.
+class ColumnarCorpusWriter:
+
+
+    def __init__(self,
+                 filename: str,
+                 file_format: str,
+                 domain: category_label,
+                 page_categories: dict[page_label, category_label],
+                 append: bool = False,
+                 row_group_size: int = ROW_GROUP_SIZE
+                 ) -> None:
+        if file_format not in COLUMNAR_EXTENSIONS:
+            raise ValueError(f"Unknown columnar format {file_format!r}, expected one of {list(COLUMNAR_EXTENSIONS)}")
+        pa = _import_pyarrow()
+        self.filename: str = filename
+        self.domain: category_label = domain
+        self.page_categories: dict[page_label, category_label] = page_categories
+        self.row_group_size: int = row_group_size
+        self.records_written: int = 0
+        self._schema = content_schema()
+        self._temp_filename: str = f"{filename}.partial"
+        self._columns: dict[str, list] = {column: [] for column in CONTENT_COLUMNS}
+        if file_format == "parquet":
+            self._writer = pa.parquet.ParquetWriter(self._temp_filename, self._schema, compression=PARQUET_COMPRESSION)
+        else:
+            self._writer = pa.ipc.new_file(self._temp_filename, self._schema)
+        self._closed: bool = False
+        if append and os.path.exists(filename):
+            for batch in iter_columnar_batches(filename):
+                self._writer.write_batch(batch)
+
+
+    def __enter__(self) -> "ColumnarCorpusWriter":
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def write(self, page: page_label, content: page_text, revision: page_revision | None = None) -> None:
+        revision = revision or {}
+        category: category_label | None = self.page_categories.get(page)
+        for tag, text in [split_line(line) for line in content] or [(None, None)]:
+            for column, value in zip(CONTENT_COLUMNS, (page, category, self.domain, tag, text, revision.get("pageid"), revision.get("lastrevid"))):
+                self._columns[column].append(value)
+        self.records_written += 1
+        if len(self._columns["page"]) >= self.row_group_size:
+            self.flush()
+
+
+    def write_record(self, record: dict) -> None:
+        revision: page_revision = {key: record[key] for key in ("pageid", "lastrevid") if key in record}
+        self.write(record["title"], record["content"], revision)
+
+
+    def flush(self) -> None:
+        if not self._columns["page"]:
+            return
+        pa = _import_pyarrow()
+        self._writer.write_batch(pa.RecordBatch.from_pydict(self._columns, schema=self._schema))
+        for values in self._columns.values():
+            values.clear()
+
+
+    def close(self) -> None:
+        if self._closed:
+            return
+        self._closed = True
+        self.flush()
+        self._writer.close()
+        os.replace(self._temp_filename, self.filename)
+
+
+# A read-only mapping from page titles to `page_text` over memory-mapped columnar domain files. Only
+# the page column is scanned when it is opened, to locate each page's rows. Contents are decoded
+# when a page is read. A page stored in several files is read from the first one.
+class ColumnarCorpus(Mapping):
+
+
+    def __init__(self, filenames: Iterable[str]) -> None:
+        self.files: list[ColumnarFile] = [ColumnarFile(filename) for filename in filenames]
+        self._pages: dict[page_label, tuple[int, int, int]] = {}
+        for file_index, columnar_file in enumerate(self.files):
+            for title, start, end in zip(*page_ranges(columnar_file.table)):
+                self._pages.setdefault(title, (file_index, start, end))
+
+
+    def __getitem__(self, page: page_label) -> page_text:
+        file_index, start, end = self._pages[page]
+        return self.files[file_index].read_page_content(start, end)
+
+
+    def __contains__(self, page: object) -> bool:
+        return page in self._pages
+
+
+    def __iter__(self) -> Iterator[page_label]:
+        return iter(self._pages)
+
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} pages in {len(self.files)} files)"
+
+
+    def to_table(self):
+        # Every row of every file as one Arrow table, e.g. for `to_pandas()` or a dataset loader.
+        # Pages stored in several files repeat. Arrow files are concatenated without copying.
+        return _import_pyarrow().concat_tables(columnar_file.read_all() for columnar_file in self.files)
+
+
+def write_columnar_pages(filename: str, file_format: str, domain: category_label, domain_pages: category_pages, page_ids: dict[page_label, int]) -> None:
+    # One row per category membership. Page ids are null for pages whose id is not known.
+    pa = _import_pyarrow()
+    columns: dict[str, list] = {column: [] for column in PAGES_COLUMNS}
+    for category, pages in domain_pages.items():
+        for page in pages:
+            for column, value in zip(PAGES_COLUMNS, (domain, category, page, page_ids.get(page))):
+                columns[column].append(value)
+    table = pa.Table.from_pydict(columns, schema=pages_schema())
+    if file_format == "parquet":
+        pa.parquet.write_table(table, filename, compression=PARQUET_COMPRESSION)
+    elif file_format == "arrow":
+        with pa.ipc.new_file(filename, table.schema) as writer:
+            writer.write_table(table)
+    else:
+        raise ValueError(f"Unknown columnar format {file_format!r}, expected one of {list(COLUMNAR_EXTENSIONS)}")
@@ -0,0 +1,212 @@
+import json
+import logging
+import os
+import zlib
+
+
+from array import array
+from collections.abc import Iterable, Iterator, Mapping, MutableMapping
+from typing import TextIO
+
+
+from src.corpus_writer import CorpusIndex
+from src.utils.custom_types import category_label, page_label, page_text
+
+
+logger = logging.getLogger(__name__)
+
+
+# Line tags as produced by the extractors ("p: ...", "li: ..."). Code 0 stores a line verbatim.
+LINE_TAGS: list[str] = ["", "h1", "h2", "h3", "h4", "h5", "h6", "p", "li", "dt"]
+LINE_TAG_CODES: dict[str, int] = {tag: code for code, tag in enumerate(LINE_TAGS) if tag}
+COMPACTION_MIN_BYTES: int = 1 << 20
+COMPRESSION_LEVEL: int = 1
+
+
+# Stores every page as one block of UTF-8 text in a single shared buffer, zlib-compressed by default.
+# Each line costs a one-byte tag code and an end offset within its page block, and each page a block
+# offset and size, instead of a Python list of `str` objects that all repeat their tag prefix.
+# Reading a page materializes its `page_text` list. Overwritten pages leave dead bytes behind,
+# which are compacted away once they outweigh the live ones.
+class CorpusStore(MutableMapping):
+
+
+    def __init__(self, contents: Mapping[page_label, page_text] | None = None, compress: bool = True) -> None:
+        self.compress: bool = compress
+        self._text = bytearray()
+        self._line_tags = array('B')
+        self._line_ends = array('L')
+        self._page_offsets = array('Q')
+        self._page_sizes = array('L')
+        self._page_first_lines = array('Q')
+        self._page_line_counts = array('L')
+        self._slots: dict[page_label, int] = {}
+        self._free_slots: list[int] = []
+        self._dead_bytes: int = 0
+        if contents:
+            self.update(contents)
+
+
+    def __getitem__(self, page: page_label) -> page_text:
+        slot = self._slots[page]
+        offset = self._page_offsets[slot]
+        block = bytes(self._text[offset:offset + self._page_sizes[slot]])
+        if self.compress:
+            block = zlib.decompress(block)
+        first_line = self._page_first_lines[slot]
+        line_tags, line_ends = self._line_tags, self._line_ends
+        lines: page_text = []
+        start = 0
+        for line in range(first_line, first_line + self._page_line_counts[slot]):
+            end = line_ends[line]
+            code = line_tags[line]
+            line_text = block[start:end].decode("utf-8")
+            lines.append(f"{LINE_TAGS[code]}: {line_text}" if code else line_text)
+            start = end
+        return lines
+
+
+    def __setitem__(self, page: page_label, content: page_text) -> None:
+        if page in self._slots:
+            slot = self._slots[page]
+            self._dead_bytes += self._page_sizes[slot]
+        else:
+            slot = self._allocate()
+            self._slots[page] = slot
+        block = bytearray()
+        self._page_first_lines[slot] = len(self._line_ends)
+        self._page_line_counts[slot] = len(content)
+        for line in content:
+            tag, separator, line_text = line.partition(": ")
+            code = LINE_TAG_CODES.get(tag, 0) if separator else 0
+            block += (line_text if code else line).encode("utf-8")
+            self._line_tags.append(code)
+            self._line_ends.append(len(block))
+        if self.compress:
+            block = zlib.compress(block, COMPRESSION_LEVEL)
+        self._page_offsets[slot] = len(self._text)
+        self._page_sizes[slot] = len(block)
+        self._text += block
+        if self._dead_bytes > COMPACTION_MIN_BYTES and self._dead_bytes > len(self._text) - self._dead_bytes:
+            self.compact()
+
+
+    def __delitem__(self, page: page_label) -> None:
+        slot = self._slots.pop(page)
+        self._dead_bytes += self._page_sizes[slot]
+        self._free_slots.append(slot)
+
+
+    def __contains__(self, page: object) -> bool:
+        return page in self._slots
+
+
+    def __iter__(self) -> Iterator[page_label]:
+        return iter(self._slots)
+
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+
+    def __repr__(self) -> str:
+        return f"{type(self).__name__}({len(self)} pages, {self.nbytes()} bytes)"
+
+
+    def nbytes(self) -> int:
+        arrays = (self._line_tags, self._line_ends, self._page_offsets, self._page_sizes, self._page_first_lines, self._page_line_counts)
+        return len(self._text) + sum(values.itemsize * len(values) for values in arrays)
+
+
+    def compact(self) -> None:
+        compacted = CorpusStore(compress=self.compress)
+        for page in self._slots:
+            compacted[page] = self[page]
+        self.__dict__.update(compacted.__dict__)
+
+
+    def _allocate(self) -> int:
+        if self._free_slots:
+            return self._free_slots.pop()
+        for values in (self._page_offsets, self._page_sizes, self._page_first_lines, self._page_line_counts):
+            values.append(0)
+        return len(self._page_offsets) - 1
+
+
+# An ordered subset of the pages of a store, e.g. the pages retrieved for one domain. Only the
+# titles are kept here, the contents are read from the store.
+class CorpusView(Mapping):
+
+
+    def __init__(self, store: CorpusStore, pages: Iterable[page_label] = ()) -> None:
+        self.store: CorpusStore = store
+        self._pages: dict[page_label, None] = dict.fromkeys(pages)
+
+
+    def __getitem__(self, page: page_label) -> page_text:
+        if page not in self._pages:
+            raise KeyError(page)
+        return self.store[page]
+
+
+    def __setitem__(self, page: page_label, content: page_text) -> None:
+        self.store[page] = content
+        self._pages[page] = None
+
+
+    def __contains__(self, page: object) -> bool:
+        return page in self._pages
+
+
+    def __iter__(self) -> Iterator[page_label]:
+        return iter(self._pages)
+
+
+    def __len__(self) -> int:
+        return len(self._pages)
+
+
+    def add(self, page: page_label) -> None:
+        self._pages[page] = None
+
+
+def dump_corpus_json(domain: category_label, contents: Mapping[page_label, page_text], out_file: TextIO, index: CorpusIndex | None = None) -> None:
+    # Writes the same document as `json.dump({domain: dict(contents)}, out_file, indent=4, ensure_ascii=False)`,
+    # one page at a time, so the whole domain is never materialized as lists at once. The byte range
+    # of every page's content is added to `index`, when given.
+    def write(text: str) -> None:
+        out_file.write(text)
+        if index is not None:
+            index.stream_size += len(text.encode("utf-8"))
+
+    write(f"{{\n    {json.dumps(domain, ensure_ascii=False)}: {{")
+    separator = "\n"
+    for page, content in contents.items():
+        page_json = json.dumps(content, indent=4, ensure_ascii=False).replace("\n", "\n        ")
+        write(f"{separator}        {json.dumps(page, ensure_ascii=False)}: ")
+        if index is not None:
+            index.add(page, index.stream_size, len(page_json.encode("utf-8")))
+        write(page_json)
+        separator = ",\n"
+    write("\n    }\n}" if separator == ",\n" else "}\n}")
+
+
+def load_corpus_json_index(filename: str) -> CorpusIndex | None:
+    # The index of a json domain file, built on first use for files written without one. The file is
+    # parsed once and written again to a null device to measure the page ranges, which only match a
+    # file written by `dump_corpus_json` (or the equivalent `json.dump`).
+    index: CorpusIndex | None = CorpusIndex.load(filename)
+    if index is not None:
+        return index
+    with open(filename, "r", encoding="utf-8") as in_file:
+        document: dict = json.load(in_file)
+    domain, contents = next(iter(document.items()))
+    index = CorpusIndex(records=False)
+    with open(os.devnull, "w", encoding="utf-8") as null_file:
+        dump_corpus_json(domain, contents, null_file, index)
+    if index.stream_size != os.path.getsize(filename):
+        logger.warning(f"{filename} is not laid out as `dump_corpus_json` writes it and cannot be indexed")
+        return None
+    index.save(filename)
+    logger.info(f"Indexed {len(index.pages)} pages of {filename}")
+    return index
@@ -0,0 +1,301 @@
+import gzip
+import io
+import json
+import logging
+import os
+import zlib
+
+
+from collections.abc import Mapping
+from typing import BinaryIO, Iterator
+
+
+from src.utils.custom_types import page_label, page_text, page_revision
+
+
+logger = logging.getLogger(__name__)
+
+
+COMPRESSION_EXTENSIONS: dict[str | None, str] = {
+    None: "",
+    "gzip": ".gz",
+    "zstd": ".zst"
+}
+WRITE_BUFFER_SIZE: int = 1 << 20
+INDEX_EXTENSION: str = ".idx"
+
+
+def _import_zstandard():
+    try:
+        import zstandard
+    except ImportError as err:
+        raise ImportError("zstd compression requires the zstandard package: pip install zstandard") from err
+    return zstandard
+
+
+def _truncation_errors(compression: str | None) -> tuple[type[Exception], ...]:
+    if compression == "zstd":
+        return (EOFError, _import_zstandard().ZstdError)
+    return (EOFError, gzip.BadGzipFile, zlib.error)
+
+
+def get_compression(filename: str) -> str | None:
+    for compression, extension in COMPRESSION_EXTENSIONS.items():
+        if compression is not None and filename.endswith(extension):
+            return compression
+    return None
+
+
+def open_corpus_stream(filename: str, mode: str, compression: str | None = None) -> BinaryIO:
+    # `mode` is "r", "w" or "a". Appending to a gzip or zstd file adds a new member/frame, which
+    # readers decode as one continuous stream, so an interrupted file can be resumed in place.
+    if compression not in COMPRESSION_EXTENSIONS:
+        raise ValueError(f"Unknown compression {compression!r}, expected one of {list(COMPRESSION_EXTENSIONS)}")
+    if compression == "gzip":
+        return gzip.open(filename, f"{mode}b")
+    if compression == "zstd":
+        zstandard = _import_zstandard()
+        raw_file = open(filename, f"{mode}b")
+        if mode == "r":
+            return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(raw_file, read_across_frames=True, closefd=True))
+        return zstandard.ZstdCompressor().stream_writer(raw_file, closefd=True)
+    return open(filename, f"{mode}b")
+
+
+def get_index_filename(filename: str) -> str:
+    return f"{filename}{INDEX_EXTENSION}"
+
+
+def replace_corpus_file(source: str, destination: str) -> None:
+    # Moves a corpus file over another one, together with its index.
+    os.replace(source, destination)
+    if os.path.exists(get_index_filename(source)):
+        os.replace(get_index_filename(source), get_index_filename(destination))
+
+
+# Sidecar offset index of a corpus file (`<file>.idx`), saved whenever the file is written: every
+# page's byte range in the file's uncompressed stream, with its revision ids. A range holds a jsonl
+# record, or only the page's content in the json format (`records=False`). The index keeps the size
+# of the file it describes, so an index the file has outgrown (e.g. after a run was killed mid-write)
+# is known to be stale and rebuilt by scanning the file once.
+class CorpusIndex:
+
+
+    def __init__(self, records: bool = True) -> None:
+        self.records: bool = records
+        # page -> [offset, length, pageid, lastrevid]
+        self.pages: dict[page_label, list] = {}
+        self.stream_size: int = 0
+
+
+    def add(self, page: page_label, offset: int, length: int, revision: Mapping | None = None) -> None:
+        revision = revision or {}
+        self.pages[page] = [offset, length, revision.get("pageid"), revision.get("lastrevid")]
+
+
+    def get_revision(self, page: page_label) -> page_revision | None:
+        _, _, page_id, revision_id = self.pages[page]
+        if revision_id is None:
+            return None
+        return {"pageid": page_id, "lastrevid": revision_id}
+
+
+    def save(self, filename: str) -> None:
+        index_filename: str = get_index_filename(filename)
+        with open(f"{index_filename}.tmp", "w", encoding="utf-8") as out_file:
+            json.dump({"size": os.path.getsize(filename), "stream_size": self.stream_size, "records": self.records, "pages": self.pages}, out_file, ensure_ascii=False)
+        os.replace(f"{index_filename}.tmp", index_filename)
+
+
+    @classmethod
+    def load(cls, filename: str) -> "CorpusIndex | None":
+        index_filename: str = get_index_filename(filename)
+        if not os.path.exists(index_filename):
+            return None
+        try:
+            with open(index_filename, "r", encoding="utf-8") as in_file:
+                saved_index: dict = json.load(in_file)
+        except (OSError, json.JSONDecodeError) as err:
+            logger.warning(f"Ignoring unreadable index {index_filename}: {err}")
+            return None
+        if saved_index["size"] != os.path.getsize(filename):
+            logger.info(f"Index {index_filename} is out of date with its corpus file")
+            return None
+        index = cls(saved_index["records"])
+        index.pages = saved_index["pages"]
+        index.stream_size = saved_index["stream_size"]
+        return index
+
+
+    @classmethod
+    def build(cls, filename: str) -> "CorpusIndex":
+        # One scan of a jsonl corpus file written without an index, or changed since. Damaged records
+        # are left out, as `read_corpus_records` skips them.
+        index = cls()
+        compression: str | None = get_compression(filename)
+        with open_corpus_stream(filename, "r", compression) as in_file:
+            try:
+                for line in in_file:
+                    if line.strip():
+                        try:
+                            record = json.loads(line)
+                        except json.JSONDecodeError:
+                            record = None
+                        if record is not None:
+                            index.add(record["title"], index.stream_size, len(line), record)
+                    index.stream_size += len(line)
+            except _truncation_errors(compression) as err:
+                logger.warning(f"Indexed {filename} up to a truncated compressed block: {err}")
+        index.save(filename)
+        logger.info(f"Indexed {len(index.pages)} pages of {filename}")
+        return index
+
+
+# One JSON object per line and per page: {"title", "content", "pageid", "lastrevid"}. Records are
+# written through a buffer as soon as a page is extracted, so nothing but the buffer stays in memory.
+# Appending resumes a file left behind by an interrupted run: a truncated compressed tail is cut off
+# first, and a newline is written before the new records so a partial last line stays on its own.
+# With `index`, the file's `CorpusIndex` is kept up to date and saved when the writer is closed.
+class CorpusWriter:
+
+
+    def __init__(self,
+                 filename: str,
+                 compression: str | None = None,
+                 append: bool = False,
+                 buffer_size: int = WRITE_BUFFER_SIZE,
+                 index: bool = False
+                 ) -> None:
+        self.filename: str = filename
+        self.records_written: int = 0
+        resuming: bool = append and os.path.exists(filename) and os.path.getsize(filename) > 0
+        if resuming and compression is not None:
+            repair_corpus_file(filename, compression)
+        self.index: CorpusIndex | None = None
+        if index:
+            self.index = (CorpusIndex.load(filename) or CorpusIndex.build(filename)) if resuming else CorpusIndex()
+        self._stream: BinaryIO = open_corpus_stream(filename, "a" if append else "w", compression)
+        self._buffer = io.BufferedWriter(self._stream, buffer_size)
+        if resuming:
+            self._buffer.write(b"\n")
+            if self.index is not None:
+                self.index.stream_size += 1
+
+
+    def __enter__(self) -> "CorpusWriter":
+        return self
+
+
+    def __exit__(self, *exc_info) -> None:
+        self.close()
+
+
+    def write(self, page: page_label, content: page_text, revision: page_revision | None = None) -> None:
+        record: dict = {"title": page, "content": content}
+        if revision:
+            record.update(revision)
+        self.write_record(record)
+
+
+    def write_record(self, record: dict) -> None:
+        line: bytes = json.dumps(record, ensure_ascii=False).encode("utf-8") + b"\n"
+        self._buffer.write(line)
+        self.records_written += 1
+        if self.index is not None:
+            self.index.add(record["title"], self.index.stream_size, len(line), record)
+            self.index.stream_size += len(line)
+
+
+    def close(self) -> None:
+        if not self._buffer.closed:
+            self._buffer.close()
+            if self.index is not None:
+                self.index.save(self.filename)
+
+
+class TruncatedCorpusError(EOFError):
+    pass
+
+
+def read_corpus_records(filename: str, strict: bool = False) -> Iterator[dict]:
+    # A run killed mid-write can leave a partial last line or compressed block behind. Everything
+    # before it is still valid, so by default the damaged part is skipped with a warning.
+    compression: str | None = get_compression(filename)
+    with open_corpus_stream(filename, "r", compression) as in_file:
+        try:
+            for line in in_file:
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    logger.warning(f"Skipping a truncated record in {filename}")
+                    continue
+                yield record
+        except _truncation_errors(compression) as err:
+            if strict:
+                raise TruncatedCorpusError(f"{filename} ends with a truncated compressed block") from err
+            logger.warning(f"Stopped reading {filename} at a truncated compressed block: {err}")
+
+
+def repair_corpus_file(filename: str, compression: str | None) -> None:
+    try:
+        for _ in read_corpus_records(filename, strict=True):
+            pass
+        return
+    except TruncatedCorpusError:
+        logger.warning(f"Rewriting {filename} without its truncated tail")
+    temp_filename = f"{filename}.tmp"
+    with CorpusWriter(temp_filename, compression) as writer:
+        for record in read_corpus_records(filename):
+            writer.write_record(record)
+    os.replace(temp_filename, filename)
+
+
+# A read-only mapping from page titles to `page_text` over a corpus file and its `CorpusIndex`.
+# Membership and revisions come from the index alone, and reading a page parses only its own byte
+# range. Compressed files are decompressed up to the page, so random access is only fast on
+# uncompressed files, while `iter_records` streams any file.
+class IndexedCorpus(Mapping):
+
+
+    def __init__(self, filename: str, index: CorpusIndex | None = None) -> None:
+        self.filename: str = filename
+        self.compression: str | None = get_compression(filename)
+        self.index: CorpusIndex = index or CorpusIndex.load(filename) or CorpusIndex.build(filename)
+
+
+    def __getitem__(self, page: page_label) -> page_text:
+        offset, length, _, _ = self.index.pages[page]
+        with open_corpus_stream(self.filename, "r", self.compression) as in_file:
+            in_file.seek(offset)
+            value = json.loads(in_file.read(length))
+        return value["content"] if self.index.records else value
+
+
+    def __contains__(self, page: object) -> bool:
+        return page in self.index.pages
+
+
+    def __iter__(self) -> Iterator[page_label]:
+        return iter(self.index.pages)
+
+
+    def __len__(self) -> int:
+        return len(self.index.pages)
+
+
+    def get_revision(self, page: page_label) -> page_revision | None:
+        return self.index.get_revision(page)
+
+
+    def iter_records(self) -> Iterator[dict]:
+        if self.index.records:
+            yield from read_corpus_records(self.filename)
+            return
+        with open_corpus_stream(self.filename, "r", self.compression) as in_file:
+            for page, (offset, length, _, _) in self.index.pages.items():
+                in_file.seek(offset)
+                record: dict = {"title": page, "content": json.loads(in_file.read(length))}
+                record.update(self.get_revision(page) or {})
+                yield record
@@ -0,0 +1,166 @@
+import re
+
+
+from abc import ABC, abstractmethod
+from bs4 import BeautifulSoup
+
+
+from src.utils.custom_types import page_text
+
+
+HEADING_TAGS: list[str] = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+EDIT_LINK_PATTERN = re.compile(r'\[.*?\]$')
+# Start and end tags, skipping comments. Attribute values may hold '>'.
+TAG_PATTERN = re.compile(r'<!--.*?-->|<(/?)([a-zA-Z][\w:-]*)(?:"[^"]*"|\'[^\']*\'|[^\'">])*>', re.DOTALL)
+VOID_TAGS: frozenset[str] = frozenset(['area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'param', 'source', 'track', 'wbr'])
+
+
+class HtmlExtractor(ABC):
+
+
+    def __init__(self, header_id_blacklist: list[str], li_truncators: list[str]) -> None:
+        self.header_id_blacklist: list[str] = header_id_blacklist
+        self.li_truncators: list[str] = li_truncators
+
+
+    @abstractmethod
+    def extract(self, html_content: str) -> page_text:
+        pass
+
+
+class BeautifulSoupExtractor(HtmlExtractor):
+
+
+    def extract(self, html_content: str) -> page_text:
+        soup = BeautifulSoup(html_content, 'html.parser')
+
+        content: page_text = []
+        blacklisted_section: bool = False
+        for tag in soup.find('div', {'class': 'mw-parser-output'}).children:
+
+            if blacklisted_section:
+                if tag.name not in HEADING_TAGS:
+                    continue
+                else:
+                    blacklisted_section = False
+
+            tag_text = tag.get_text().strip()
+
+            if tag.name in HEADING_TAGS:
+                if any(child.get('id') in self.header_id_blacklist for child in tag.find_all('span')):
+                    blacklisted_section = True
+                    continue
+                tag_text = EDIT_LINK_PATTERN.sub('', tag_text)
+                content.append(f"{tag.name}: {tag_text}")
+
+            if tag.name in ['ul', 'ol']:
+                for li in tag.find_all('li'):
+                    li_text = li.get_text().strip()
+                    if li_text in self.li_truncators:
+                        break
+                    content.append(f"{li.name}: {li_text}")
+                continue
+
+            if tag.name == 'p':
+                content.append(f"{tag.name}: {tag_text}")
+
+            if tag.name == 'dl':
+                for dt in tag.find_all('dt'):
+                    dt_text = dt.get_text().strip()
+                    content.append(f"{dt.name}: {dt_text}")
+                continue
+
+        return content
+
+
+def has_balanced_tags(html_content: str) -> bool:
+    # Whether every element is closed by its own end tag. libxml2 closes elements implicitly (a <p>
+    # at the next <p> or <div>, an <li> at the next <li>), where html.parser keeps them open until
+    # their end tag, so the two trees only agree when no end tag is implied.
+    balance: dict[str, int] = {}
+    for match in TAG_PATTERN.finditer(html_content):
+        name = match.group(2)
+        if name is None:
+            continue
+        name = name.lower()
+        if name in VOID_TAGS:
+            continue
+        balance[name] = balance.get(name, 0) + (-1 if match.group(1) else 1)
+    return not any(balance.values())
+
+
+# Walks the libxml2 tree built by lxml. Only the direct children of the parser output are visited and
+# text is only materialized for the tags that are emitted, instead of for every top-level child.
+# Malformed pages, whose libxml2 tree would differ from the html.parser one, are extracted with
+# `BeautifulSoupExtractor` instead, so both backends always return the same lines.
+class LxmlExtractor(HtmlExtractor):
+
+
+    def __init__(self, header_id_blacklist: list[str], li_truncators: list[str]) -> None:
+        super().__init__(header_id_blacklist, li_truncators)
+        try:
+            import lxml.html
+        except ImportError as err:
+            raise ImportError("The lxml extraction backend requires the lxml package: pip install lxml") from err
+        self._header_ids: set[str] = set(header_id_blacklist)
+        self._li_truncators: set[str] = set(li_truncators)
+        self._fallback: BeautifulSoupExtractor = BeautifulSoupExtractor(header_id_blacklist, li_truncators)
+        self.fallback_pages: int = 0
+
+
+    def extract(self, html_content: str) -> page_text:
+        import lxml.html
+
+        if not has_balanced_tags(html_content):
+            self.fallback_pages += 1
+            return self._fallback.extract(html_content)
+        parser = lxml.html.HTMLParser()
+        root = lxml.html.fromstring(html_content, parser=parser)
+        # End tags closing elements in a different order than they were opened.
+        if any(error.type_name == 'ERR_TAG_NAME_MISMATCH' for error in parser.error_log):
+            self.fallback_pages += 1
+            return self._fallback.extract(html_content)
+        parser_outputs = root.xpath("descendant-or-self::div[contains(concat(' ', normalize-space(@class), ' '), ' mw-parser-output ')][1]")
+        if not parser_outputs:
+            raise ValueError("No mw-parser-output element found in the page HTML")
+
+        content: page_text = []
+        blacklisted_section: bool = False
+        for tag in parser_outputs[0]:
+            name = tag.tag
+            if not isinstance(name, str):
+                continue
+
+            if name in HEADING_TAGS:
+                blacklisted_section = any(span.get('id') in self._header_ids for span in tag.iter('span'))
+                if not blacklisted_section:
+                    content.append(f"{name}: {EDIT_LINK_PATTERN.sub('', tag.text_content().strip())}")
+                continue
+            if blacklisted_section:
+                continue
+
+            if name == 'ul' or name == 'ol':
+                for li in tag.iter('li'):
+                    li_text = li.text_content().strip()
+                    if li_text in self._li_truncators:
+                        break
+                    content.append(f"li: {li_text}")
+            elif name == 'p':
+                content.append(f"p: {tag.text_content().strip()}")
+            elif name == 'dl':
+                for dt in tag.iter('dt'):
+                    content.append(f"dt: {dt.text_content().strip()}")
+
+        return content
+
+
+EXTRACTION_BACKENDS: dict[str, type[HtmlExtractor]] = {
+    "beautifulsoup": BeautifulSoupExtractor,
+    "lxml": LxmlExtractor
+}
+
+
+def get_extractor(backend: str, header_id_blacklist: list[str], li_truncators: list[str]) -> HtmlExtractor:
+    if backend not in EXTRACTION_BACKENDS:
+        raise ValueError(f"Unknown extraction backend {backend!r}, expected one of {sorted(EXTRACTION_BACKENDS)}")
+    return EXTRACTION_BACKENDS[backend](header_id_blacklist, li_truncators)
@@ -0,0 +1,176 @@
+import json
+import logging
+import os
+
+
+from collections import Counter
+from typing import Any
+
+
+from src.corpus_store import CorpusStore
+from src.corpus_writer import CorpusWriter, get_compression, read_corpus_records
+from src.utils.custom_types import category_label, page_label, page_text, page_revision
+
+
+logger = logging.getLogger(__name__)
+
+
+# Global index of the pages seen by every corpus of a run. Pages are identified by page id when it
+# is known, so a title and its aliases share one entry. The index records which domains of which
+# corpora each page belongs to, and keeps the extracted content of each page once, so a page shared
+# by several corpora is fetched and extracted once.
+#
+# Only contents and their revisions are persisted. Memberships describe the taxonomies of the current
+# run, so they start empty. Contents loaded from an earlier run are not current until their revision
+# has been checked against the page's latest one (`verify_revision`) or the page is extracted again.
+class PageIndex:
+
+
+    def __init__(self, path: str | None = None) -> None:
+        self.path: str | None = path
+        self._page_ids: dict[page_label, int] = {}
+        self._titles: dict[int, page_label] = {}
+        self._memberships: dict[page_label, dict[str, set[category_label]]] = {}
+        self._revisions: dict[page_label, page_revision] = {}
+        self._unverified: set[page_label] = set()
+        self.contents: CorpusStore = CorpusStore()
+        self.reused_pages: int = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+
+    def __contains__(self, page: page_label) -> bool:
+        return self.canonical_title(page) in self._memberships
+
+
+    def __len__(self) -> int:
+        return len(self._memberships)
+
+
+    def canonical_title(self, page: page_label) -> page_label:
+        page_id = self._page_ids.get(page)
+        return page if page_id is None else self._titles[page_id]
+
+
+    def page_id(self, page: page_label) -> int | None:
+        return self._page_ids.get(page)
+
+
+    def register_page(self, page: page_label, page_id: int | None, corpus_name: str, domain: category_label) -> None:
+        if page_id is not None:
+            self._page_ids[page] = page_id
+            self._titles.setdefault(page_id, page)
+        corpora = self._memberships.setdefault(self.canonical_title(page), {})
+        corpora.setdefault(corpus_name, set()).add(domain)
+
+
+    def get_content(self, page: page_label) -> tuple[page_text, page_revision | None] | None:
+        # Only current contents, see `unverified_pages`.
+        title = self.canonical_title(page)
+        if title not in self.contents or title in self._unverified:
+            return None
+        self.reused_pages += 1
+        return self.contents[title], self._revisions.get(title)
+
+
+    def add_content(self, page: page_label, content: page_text, revision: page_revision | None = None) -> None:
+        title = self.canonical_title(page)
+        if title in self.contents and (revision is None or self._revisions.get(title) == revision):
+            if revision is not None:
+                self._unverified.discard(title)
+            return
+        if revision:
+            self._page_ids.setdefault(page, revision["pageid"])
+            self._titles.setdefault(revision["pageid"], title)
+            self._revisions[title] = revision
+        self.contents[title] = content
+        self._unverified.discard(title)
+
+
+    def has_current_content(self, page: page_label) -> bool:
+        title = self.canonical_title(page)
+        return title in self.contents and title not in self._unverified
+
+
+    def unverified_pages(self, pages: list[page_label]) -> list[page_label]:
+        # The pages whose content was loaded from an earlier run and may have been edited since.
+        return [page for page in pages if self.canonical_title(page) in self._unverified]
+
+
+    def verify_revision(self, page: page_label, revision: page_revision | None) -> bool:
+        # `revision` is the page's latest one, None when the page no longer exists. Stored content
+        # of another revision, or without one, stays unverified and is replaced once the page is
+        # extracted again.
+        title = self.canonical_title(page)
+        stored_revision: page_revision | None = self._revisions.get(title)
+        if revision is None or stored_revision is None or stored_revision["lastrevid"] != revision["lastrevid"]:
+            return False
+        self._unverified.discard(title)
+        return True
+
+
+    def corpus_pages(self, corpus_name: str) -> set[page_label]:
+        return {page for page, corpora in self._memberships.items() if corpus_name in corpora}
+
+
+    def overlap_report(self, corpus_a: str, corpus_b: str) -> dict[str, Any]:
+        # Pages in both corpora would carry both labels, so every shared page is potential label leakage.
+        pages_a: set[page_label] = self.corpus_pages(corpus_a)
+        pages_b: set[page_label] = self.corpus_pages(corpus_b)
+        shared_pages: list[page_label] = sorted(pages_a & pages_b)
+        domain_overlap: Counter = Counter()
+        for page in shared_pages:
+            corpora = self._memberships[page]
+            for domain_a in corpora[corpus_a]:
+                for domain_b in corpora[corpus_b]:
+                    domain_overlap[(domain_a, domain_b)] += 1
+        union_size: int = len(pages_a | pages_b)
+        return {
+            "corpora": {corpus_a: len(pages_a), corpus_b: len(pages_b)},
+            "shared_pages": len(shared_pages),
+            "jaccard": len(shared_pages) / union_size if union_size else 0.0,
+            "domain_overlap": [
+                {corpus_a: domain_a, corpus_b: domain_b, "shared_pages": count}
+                for (domain_a, domain_b), count in domain_overlap.most_common()
+            ],
+            "pages": {
+                page: {corpus: sorted(self._memberships[page][corpus]) for corpus in (corpus_a, corpus_b)}
+                for page in shared_pages
+            }
+        }
+
+
+    def save_overlap_report(self, filename: str, corpus_a: str, corpus_b: str) -> dict[str, Any]:
+        report: dict[str, Any] = self.overlap_report(corpus_a, corpus_b)
+        if report["shared_pages"]:
+            logger.warning(f"{report['shared_pages']} pages belong to both the {corpus_a.upper()} and the {corpus_b.upper()} corpus, see {filename}")
+        with open(filename, "w") as out_file:
+            json.dump(report, out_file, indent=4, ensure_ascii=False)
+        return report
+
+
+    def save(self, path: str | None = None) -> None:
+        path = path or self.path
+        if path is None:
+            raise ValueError("No path given to save the page index to.")
+        with CorpusWriter(path, get_compression(path)) as writer:
+            for page in self.contents:
+                record: dict[str, Any] = {"title": page, "content": self.contents[page]}
+                record.update(self._revisions.get(page, {}))
+                writer.write_record(record)
+        logger.info(f"Saved page index with the contents of {len(self.contents)} pages to {path}")
+
+
+    def load(self, path: str) -> None:
+        # Older indexes also stored the corpus memberships of their run, which are not restored.
+        for record in read_corpus_records(path):
+            if "content" not in record:
+                continue
+            page: page_label = record["title"]
+            revision = {"pageid": record["pageid"], "lastrevid": record["lastrevid"]} if "lastrevid" in record else None
+            if revision is not None:
+                self._page_ids[page] = revision["pageid"]
+                self._titles.setdefault(revision["pageid"], page)
+            self.add_content(page, record["content"], revision)
+            self._unverified.add(self.canonical_title(page))
+        logger.info(f"Loaded page index with the contents of {len(self.contents)} pages from {path}, to be checked against their current revisions")
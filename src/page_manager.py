@@ -1,8 +1,13 @@
-import requests
 import json
 import logging
 
 
+from src.api_client import WikipediaClient, get_default_client
+from src.category_info import CategoryInfo
+from src.checkpoint_journal import CheckpointJournal, CATEGORY_PAGES
+from src.corpus_columnar import COLUMNAR_EXTENSIONS, write_columnar_pages
+from src.page_index import PageIndex
+from src.sql_dump import CategoryLinksDump
 from src.utils.telemetry import time_category_iteration
 from src.utils.custom_types import category_pages, category_label, taxonomy, category_tree, page_label
 
@@ -10,13 +15,44 @@ from src.utils.custom_types import category_pages, category_label, taxonomy, cat
 logger = logging.getLogger(__name__)
 
 
+OUTPUT_FORMATS: list[str] = ["json", *COLUMNAR_EXTENSIONS]
+
+
 class PageManager:
 
 
-    def __init__(self, taxonomies: taxonomy, degree: int) -> None:
+    def __init__(self, 
+                 taxonomies: taxonomy, 
+                 degree: int, 
+                 client: WikipediaClient | None = None, 
+                 journal: CheckpointJournal | None = None,
+                 page_index: PageIndex | None = None,
+                 corpus_name: str = "",
+                 dump: CategoryLinksDump | None = None,
+                 output_format: str = "json",
+                 category_info: CategoryInfo | None = None
+                 ) -> None:
+        if output_format not in OUTPUT_FORMATS:
+            raise ValueError(f"Unknown output format {output_format!r}, expected one of {OUTPUT_FORMATS}")
         self.taxonomies: taxonomy = taxonomies
         self.degree: int = degree
+        self.client: WikipediaClient = client or get_default_client()
         self.pages: category_pages = {}
+        self.page_ids: dict[page_label, int] = {}
+        self.journal: CheckpointJournal | None = journal
+        self.page_index: PageIndex | None = page_index
+        self.corpus_name: str = corpus_name
+        self.dump: CategoryLinksDump | None = dump
+        self.output_format: str = output_format
+        self.category_info: CategoryInfo | None = category_info
+        if journal is not None:
+            for category, entry in journal.replay(CATEGORY_PAGES):
+                # Older journals recorded the titles only.
+                if isinstance(entry, list):
+                    entry = {"titles": entry, "pageids": []}
+                self.pages[category] = entry["titles"]
+                self.page_ids.update(zip(entry["titles"], entry["pageids"]))
+            logger.info(f"Restored pages of {len(self.pages)} categories from checkpoint journal {journal.path}")
 
 
     def retrieve_taxonomy_pages(self,
@@ -24,8 +60,14 @@ class PageManager:
                                 output_path: str = "outputs/",
                                 prefix: str = ""
                                 ) -> None:
+        if self.dump is not None:
+            self.retrieve_dump_pages()
+        elif self.category_info is not None:
+            self.plan_taxonomy_pages()
         for domain in self.taxonomies:
             self.retrieve_domain_pages(domain)
+        if self.page_index is not None:
+            self.register_pages()
         if save:
             self.save_pages(output_path, prefix)
 
@@ -51,46 +93,67 @@ class PageManager:
 
 
     def retrieve_category_pages(self, category: str) -> list[page_label]:
-        S = requests.Session()
-        URL = "https://es.wikipedia.org/w/api.php"
-        PARAMS = {
-            "action": "query",
-            "format": "json",
-            "list": "categorymembers",
-            "cmtitle": "Categoría:" + category,
-            "cmtype": "page",
-            "cmlimit": 500
-        }
+        members = self.client.list_category_members(category, "page")
+        return self.add_category_members(category, members)
 
+
+    def add_category_members(self, category: category_label, members: list[dict]) -> list[page_label]:
+        # Also called by a `CategoryManager` listing pages along with the subcategories.
         pages: list[page_label] = []
-        while True:
-            try:
-                R = S.get(url=URL, params=PARAMS)
-                R.raise_for_status()
-                DATA = R.json()
+        page_ids: list[int] = []
+        for page in members:
+            pages.append(page['title'])
+            page_ids.append(page['pageid'])
+        self.page_ids.update(zip(pages, page_ids))
+        if self.journal is not None:
+            self.journal.record(CATEGORY_PAGES, category, {"titles": pages, "pageids": page_ids})
+        self.pages[category] = pages
+        return pages
 
-                if 'query' in DATA:
-                    pages += [page['title'] for page in DATA['query']['categorymembers']]
 
-                if 'continue' in DATA:
-                    PARAMS['cmcontinue'] = DATA['continue']['cmcontinue']
-                else:
-                    break
-
-            except requests.exceptions.HTTPError as http_err:
-                logger.warning(f'HTTP error occurred: {http_err}')
-                break
-            except requests.exceptions.ConnectionError as conn_err:
-                logger.warning(f'Error connecting: {conn_err}')
-                break
-            except requests.exceptions.Timeout as timeout_err:
-                logger.warning(f'Timeout error: {timeout_err}')
-                break
-            except requests.exceptions.RequestException as err:
-                logger.warning(f'An unexpected error occurred: {err}')
-                break
+    def retrieve_dump_pages(self) -> None:
+        # A single pass over the dump fills the pages of every category of every taxonomy, so
+        # `retrieve_domain_pages` then finds them all already retrieved.
+        categories: set[category_label] = set()
+        for domain, domain_taxonomy in self.taxonomies.items():
+            categories.add(domain)
+            for category, subcategories in domain_taxonomy.items():
+                categories.add(category)
+                categories.update(subcategories)
+        pages, page_ids = self.dump.category_pages(category for category in categories if category not in self.pages)
+        self.pages.update(pages)
+        self.page_ids.update(page_ids)
+
+
+    def plan_taxonomy_pages(self) -> None:
+        # Member counts of every category of the taxonomies, so the number of pages to retrieve is
+        # known up front. Counts can be out of date, so every category is still listed.
+        categories: set[category_label] = set()
+        for domain, domain_taxonomy in self.taxonomies.items():
+            categories.add(domain)
+            for category, subcategories in domain_taxonomy.items():
+                categories.add(category)
+                categories.update(subcategories)
+        pending: list[category_label] = sorted(category for category in categories if category not in self.pages)
+        self.category_info.prefetch(pending)
+        logger.info(f"{len(pending)} categories to list. By their member counts, the taxonomies list {self.category_info.count_taxonomy_pages(self.taxonomies, self.pages)} pages")
+
+
+    def register_pages(self) -> None:
+        for domain in self.taxonomies:
+            for page in self.get_domain_pages(domain):
+                self.page_index.register_page(page, self.page_ids.get(page), self.corpus_name, domain)
+        logger.info(f"Registered the pages of corpus {self.corpus_name.upper()} in the page index, which now holds {len(self.page_index)} pages")
 
-        return pages
+
+    def get_domain_pages(self, domain: category_label) -> list[page_label]:
+        domain_pages: dict[page_label, None] = {}
+        domain_taxonomy: category_tree = self.taxonomies[domain]
+        for category in domain_taxonomy:
+            domain_pages.update(dict.fromkeys(self.pages[category]))
+            for subcategory in domain_taxonomy[category]:
+                domain_pages.update(dict.fromkeys(self.pages[subcategory]))
+        return list(domain_pages)
 
 
     def save_pages(self, output_path: str, prefix: str) -> None:
@@ -102,9 +165,18 @@ class PageManager:
                 for subcategory in subcategories:
                     domain_pages[subcategory] = self.pages[subcategory]
             domain_name = domain.replace(" ", "_").lower()
-            filename = f"{output_path}{prefix}{domain_name}_pages_degree_{self.degree}.json"
+            filename = f"{output_path}{prefix}{domain_name}_pages_degree_{self.degree}.{self.output_format}"
+            if self.output_format in COLUMNAR_EXTENSIONS:
+                # Rows carry both the title and the page id, with or without a page index.
+                write_columnar_pages(filename, self.output_format, domain, domain_pages, self.page_ids)
+                continue
             with open(filename, "w") as out_file:
                 json.dump({domain: domain_pages}, out_file, indent=4, ensure_ascii=False)
+            if self.page_index is not None:
+                # The page ids the index is keyed by, next to the page lists rather than in them.
+                domain_page_ids: dict[page_label, int] = {page: self.page_ids[page] for page in self.get_domain_pages(domain) if page in self.page_ids}
+                with open(f"{output_path}{prefix}{domain_name}_page_ids_degree_{self.degree}.json", "w") as out_file:
+                    json.dump({domain: domain_page_ids}, out_file, indent=4, ensure_ascii=False)
 
 
     def get_pages(self) -> category_pages:
@@ -0,0 +1,241 @@
+import logging
+import queue
+import threading
+import time
+
+
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+
+from src.api_client import WikipediaClient, get_default_client
+from src.category_manager import CategoryManager
+from src.content_manager import fetch_page_html
+from src.html_extractors import HtmlExtractor, get_extractor
+from src.page_index import PageIndex
+from src.page_manager import PageManager
+from src.utils.metrics import get_default_registry
+from src.utils.custom_types import category_label, page_label
+
+
+logger = logging.getLogger(__name__)
+
+
+# Marks the end of a queue's input, one per consumer thread.
+_DONE = None
+QUEUE_DEPTH_DESCRIPTION = "Items queued or in flight in a pipelined stage."
+# How often threads blocked on a queue check whether a worker has died.
+QUEUE_POLL_SECONDS: float = 0.1
+
+
+class PipelineAborted(Exception):
+    pass
+
+
+@dataclass
+class PipelineCorpus:
+    name: str
+    category_manager: CategoryManager
+    page_manager: PageManager
+    prefix: str = ""
+
+
+# Runs the category, page and content stages of one or more corpora at the same time instead of one
+# after the other. Every category is handed to the page listing workers as soon as the category
+# search reaches it (or lists it, when it lists pages too), and every newly listed page to the
+# content workers, through bounded queues: a stage that gets ahead blocks on the full queue instead
+# of piling up work. Corpora share the workers, and a page listed by several corpora is fetched once.
+#
+# Extracted contents go to the shared `PageIndex`. Taxonomies are saved as each category search ends,
+# and page lists once the stages have drained. A `ContentManager` given the same page index then
+# writes the domain outputs from it, fetching only the pages the pipeline could not.
+#
+# If a page or content worker dies, every other thread stops waiting on the queues and `run` raises
+# its error, instead of producers blocking forever on a queue nobody consumes.
+class StagePipeline:
+
+
+    def __init__(self,
+                 page_index: PageIndex,
+                 header_id_blacklist: list[str],
+                 li_truncators: list[str],
+                 client: WikipediaClient | None = None,
+                 page_workers: int = 8,
+                 content_workers: int = 16,
+                 extraction_workers: int | None = None,
+                 queue_size: int = 256,
+                 extraction_backend: str = "beautifulsoup"
+                 ) -> None:
+        self.page_index: PageIndex = page_index
+        self.extractor: HtmlExtractor = get_extractor(extraction_backend, header_id_blacklist, li_truncators)
+        self.client: WikipediaClient = client or get_default_client()
+        self.page_workers: int = page_workers
+        self.content_workers: int = content_workers
+        self.extraction_workers: int | None = extraction_workers
+        self.queue_size: int = queue_size
+        self.corpora: list[PipelineCorpus] = []
+        self.first_output_seconds: float | None = None
+        self.failed_categories: int = 0
+        self.failed_pages: int = 0
+        self._category_queue: queue.Queue = queue.Queue(queue_size)
+        self._page_queue: queue.Queue = queue.Queue(queue_size)
+        self._queued_pages: set[page_label] = set()
+        # Categories a page worker has taken, by corpus name, so no two workers list the same one.
+        self._claimed_categories: set[tuple[str, category_label]] = set()
+        self._lock = threading.Lock()
+        self._started_at: float = 0.0
+        self._errors: list[BaseException] = []
+        self._failed = threading.Event()
+        metrics = get_default_registry()
+        self._category_queue_depth = metrics.gauge("pipeline_queue_depth", QUEUE_DEPTH_DESCRIPTION, stage="pages")
+        self._page_queue_depth = metrics.gauge("pipeline_queue_depth", QUEUE_DEPTH_DESCRIPTION, stage="content")
+
+
+    def add_corpus(self, name: str, category_manager: CategoryManager, page_manager: PageManager, prefix: str = "") -> None:
+        self.corpora.append(PipelineCorpus(name, category_manager, page_manager, prefix))
+
+
+    def run(self, save: bool = True, output_path: str = "outputs/", concurrent: bool = True) -> None:
+        self._started_at = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=self.extraction_workers) as extractors:
+            category_threads = [
+                threading.Thread(target=self._search_categories, args=(corpus, save, output_path, concurrent), name=f"categories-{corpus.name}")
+                for corpus in self.corpora
+            ]
+            page_threads = [threading.Thread(target=self._guarded, args=(self._list_pages,), name=f"pages-{worker}") for worker in range(self.page_workers)]
+            content_threads = [
+                threading.Thread(target=self._guarded, args=(self._fetch_contents, extractors), name=f"content-{worker}")
+                for worker in range(self.content_workers)
+            ]
+            for thread in (*category_threads, *page_threads, *content_threads):
+                thread.start()
+            self._join(category_threads, self._category_queue, len(page_threads))
+            self._join(page_threads, self._page_queue, len(content_threads))
+            self._join(content_threads)
+        if self._errors:
+            raise self._errors[0]
+        logger.info(
+            f"Pipeline stages done in {time.perf_counter() - self._started_at:.2f} secs, first content after {self.first_output_seconds or 0.0:.2f} secs. "
+            f"{len(self._queued_pages)} pages queued, {self.failed_categories} page listings and {self.failed_pages} pages left to the managers after errors"
+        )
+
+        for corpus in self.corpora:
+            # Categories the pipeline listed are skipped, so this only registers and saves the pages.
+            corpus.page_manager.taxonomies = corpus.category_manager.get_taxonomies()
+            corpus.page_manager.retrieve_taxonomy_pages(save, output_path, corpus.prefix)
+
+
+    def _join(self, threads: list[threading.Thread], output_queue: queue.Queue | None = None, consumers: int = 0) -> None:
+        # Once every producer of a stage is done, each consumer of the next stage gets an end marker.
+        # After a failure the consumers stop on their own.
+        for thread in threads:
+            thread.join()
+        if output_queue is not None:
+            try:
+                for _ in range(consumers):
+                    self._put(output_queue, _DONE)
+            except PipelineAborted:
+                pass
+
+
+    def _put(self, output_queue: queue.Queue, item) -> None:
+        while True:
+            if self._failed.is_set():
+                raise PipelineAborted("A pipeline worker failed")
+            try:
+                output_queue.put(item, timeout=QUEUE_POLL_SECONDS)
+                return
+            except queue.Full:
+                continue
+
+
+    def _get(self, input_queue: queue.Queue):
+        while True:
+            if self._failed.is_set():
+                return _DONE
+            try:
+                return input_queue.get(timeout=QUEUE_POLL_SECONDS)
+            except queue.Empty:
+                continue
+
+
+    def _guarded(self, worker, *args) -> None:
+        # Errors the workers do not defer to the managers stop the whole pipeline.
+        try:
+            worker(*args)
+        except PipelineAborted:
+            pass
+        except BaseException as err:
+            with self._lock:
+                self._errors.append(err)
+            self._failed.set()
+            logger.error(f"Pipeline worker {threading.current_thread().name} failed, stopping the pipeline: {err!r}")
+
+
+    def _search_categories(self, corpus: PipelineCorpus, save: bool, output_path: str, concurrent: bool) -> None:
+        def on_category(domain: category_label, category: category_label) -> None:
+            self._put(self._category_queue, (corpus, category))
+            self._category_queue_depth.set(self._category_queue.qsize())
+
+        try:
+            corpus.category_manager.retrieve_taxonomies(save=save, output_path=output_path, prefix=corpus.prefix, concurrent=concurrent, on_category=on_category)
+        except PipelineAborted:
+            logger.warning(f"Category search of corpus {corpus.name.upper()} stopped after a pipeline worker failed")
+        except Exception as err:
+            # Re-raised by `run` once the other stages have drained.
+            with self._lock:
+                self._errors.append(err)
+            logger.warning(f"Category search of corpus {corpus.name.upper()} failed: {err}")
+
+
+    def _list_pages(self) -> None:
+        while True:
+            item = self._get(self._category_queue)
+            if item is _DONE:
+                return
+            corpus, category = item
+            page_manager: PageManager = corpus.page_manager
+            # A category reached from several domains is queued once per domain.
+            with self._lock:
+                if (corpus.name, category) in self._claimed_categories:
+                    continue
+                self._claimed_categories.add((corpus.name, category))
+            try:
+                if category not in page_manager.pages:
+                    page_manager.pages[category] = page_manager.retrieve_category_pages(category)
+            except Exception as err:
+                # Left to `retrieve_taxonomy_pages`, which lists every category still missing.
+                with self._lock:
+                    self.failed_categories += 1
+                logger.warning(f"Listing the pages of category {category.upper()} failed, deferred: {err}")
+                continue
+            for page in page_manager.pages[category]:
+                with self._lock:
+                    if page in self._queued_pages:
+                        continue
+                    self._queued_pages.add(page)
+                self._put(self._page_queue, page)
+                self._page_queue_depth.set(self._page_queue.qsize())
+
+
+    def _fetch_contents(self, extractors: ProcessPoolExecutor) -> None:
+        while True:
+            page = self._get(self._page_queue)
+            if page is _DONE:
+                return
+            with self._lock:
+                if self.page_index.has_current_content(page):
+                    continue
+            try:
+                html_content, revision = fetch_page_html(self.client, page)
+                content = extractors.submit(self.extractor.extract, html_content).result()
+            except Exception as err:
+                # Left to the `ContentManager`, which fetches every page missing from the index.
+                with self._lock:
+                    self.failed_pages += 1
+                logger.warning(f"Fetching the content of page {page.upper()} failed, deferred: {err}")
+                continue
+            with self._lock:
+                self.page_index.add_content(page, content, revision)
+                if self.first_output_seconds is None:
+                    self.first_output_seconds = time.perf_counter() - self._started_at
@@ -0,0 +1,195 @@
+import logging
+import threading
+import time
+
+
+from dataclasses import dataclass
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+OK = "ok"
+THROTTLED = "throttled"
+FAILED = "failed"
+
+
+@dataclass
+class EndpointLimits:
+    max_rate: float = 50.0
+    min_rate: float = 0.5
+    initial_rate: float = 5.0
+    burst: float = 5.0
+    max_concurrency: int = 16
+    min_concurrency: int = 1
+    initial_concurrency: int = 2
+    rate_increase: float = 1.0
+    latency_tolerance: float = 2.0
+    # Latency is compared per this many response bytes, so a large page is not taken for congestion.
+    latency_size_unit: int = 1 << 16
+    latency_decrease: float = 0.8
+    throttle_decrease: float = 0.7
+    failure_decrease: float = 0.5
+
+
+DEFAULT_ENDPOINT_LIMITS: dict[str, EndpointLimits] = {
+    "categorymembers": EndpointLimits(max_rate=50.0, max_concurrency=8),
+    "parse": EndpointLimits(max_rate=25.0, max_concurrency=16),
+    "query": EndpointLimits(max_rate=25.0, max_concurrency=8)
+}
+
+
+def get_endpoint(params: dict[str, Any]) -> str:
+    action: str = params.get("action", "query")
+    if action == "query" and "list" in params:
+        return params["list"]
+    if action == "query" and "prop" in params:
+        # Cheap `info`/`categoryinfo` lookups and heavy `revisions` batches are told apart.
+        return f"query:{params['prop']}"
+    return action
+
+
+class _EndpointState:
+
+
+    def __init__(self, limits: EndpointLimits) -> None:
+        self.limits: EndpointLimits = limits
+        self.rate: float = limits.initial_rate
+        self.tokens: float = limits.burst
+        self.window: float = float(limits.initial_concurrency)
+        self.in_flight: int = 0
+        self.refilled_at: float = time.monotonic()
+        self.paused_until: float = 0.0
+        self.decreased_at: float = 0.0
+        self.slow_start: bool = True
+        self.latency: float | None = None
+        self.base_latency: float | None = None
+        self.requests: int = 0
+        self.throttled: int = 0
+        self.failed: int = 0
+
+
+    def refill(self, now: float) -> None:
+        self.tokens = min(self.limits.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+
+    def wait_time(self, now: float) -> float | None:
+        # Seconds until a request may start, or None when it has to wait for a request to finish.
+        if now < self.paused_until:
+            return self.paused_until - now
+        if self.in_flight >= int(self.window):
+            return None
+        if self.tokens < 1.0:
+            return (1.0 - self.tokens) / self.rate
+        return 0.0
+
+
+    def increase(self) -> None:
+        # Until the first congestion signal both budgets double every round trip (slow start), then
+        # they grow additively: about one more concurrent request per window of successful responses,
+        # and `rate_increase` more requests/sec for every second's worth of successful responses.
+        limits = self.limits
+        if self.slow_start:
+            self.window = min(limits.max_concurrency, self.window + 1.0)
+            self.rate = min(limits.max_rate, self.rate + 1.0)
+            return
+        self.window = min(limits.max_concurrency, self.window + 1.0 / self.window)
+        self.rate = min(limits.max_rate, self.rate + limits.rate_increase / self.rate)
+
+
+    def decrease(self, factor: float, now: float) -> None:
+        # Multiplicative decrease, at most once per round trip: the responses of requests that were
+        # already in flight when the first signal arrived say nothing about the reduced window.
+        if now - self.decreased_at < (self.latency or 0.0):
+            return
+        limits = self.limits
+        self.window = max(limits.min_concurrency, self.window * factor)
+        self.rate = max(limits.min_rate, self.rate * factor)
+        self.tokens = min(self.tokens, 1.0)
+        self.decreased_at = now
+        self.slow_start = False
+
+
+# Schedules the API requests of every manager sharing a client. Each endpoint (categorymembers,
+# parse, query:revisions, ...) gets a token bucket that bounds its request rate and an AIMD window that
+# bounds its concurrent requests. Both grow while responses stay fast, and shrink multiplicatively on
+# 429s, maxlag/ratelimited errors, failures and latency per `latency_size_unit` response bytes rising
+# above `latency_tolerance` times the lowest seen. A Retry-After on a throttled response pauses the
+# endpoint for that long. `query:<prop>` endpoints use the limits of `query` unless given their own.
+class AdaptiveRateLimiter:
+
+
+    def __init__(self, endpoint_limits: dict[str, EndpointLimits] | None = None, default_limits: EndpointLimits | None = None) -> None:
+        self.endpoint_limits: dict[str, EndpointLimits] = dict(DEFAULT_ENDPOINT_LIMITS if endpoint_limits is None else endpoint_limits)
+        self.default_limits: EndpointLimits = default_limits or EndpointLimits()
+        self._states: dict[str, _EndpointState] = {}
+        self._condition = threading.Condition()
+
+
+    def acquire(self, endpoint: str) -> float:
+        with self._condition:
+            state: _EndpointState = self._state(endpoint)
+            while True:
+                now: float = time.monotonic()
+                state.refill(now)
+                wait: float | None = state.wait_time(now)
+                if wait == 0.0:
+                    state.tokens -= 1.0
+                    state.in_flight += 1
+                    state.requests += 1
+                    return now
+                self._condition.wait(wait)
+
+
+    def release(self, endpoint: str, started_at: float, outcome: str = OK, retry_after: float | None = None, response_bytes: int | None = None) -> None:
+        with self._condition:
+            state: _EndpointState = self._state(endpoint)
+            now: float = time.monotonic()
+            state.in_flight -= 1
+            if outcome == OK:
+                latency: float = (now - started_at) / max(1.0, (response_bytes or 0) / state.limits.latency_size_unit)
+                state.latency = latency if state.latency is None else 0.8 * state.latency + 0.2 * latency
+                if state.base_latency is None or state.latency < state.base_latency:
+                    state.base_latency = state.latency
+                else:
+                    # Let the baseline drift up slowly, so a permanently slower server is not mistaken for congestion.
+                    state.base_latency += 0.001 * (state.latency - state.base_latency)
+                if state.latency > state.limits.latency_tolerance * state.base_latency:
+                    state.decrease(state.limits.latency_decrease, now)
+                else:
+                    state.increase()
+            elif outcome == THROTTLED:
+                state.throttled += 1
+                state.decrease(state.limits.throttle_decrease, now)
+                if retry_after:
+                    state.paused_until = max(state.paused_until, now + retry_after)
+            else:
+                state.failed += 1
+                state.decrease(state.limits.failure_decrease, now)
+            self._condition.notify_all()
+
+
+    def snapshot(self) -> dict[str, dict[str, float]]:
+        with self._condition:
+            return {
+                endpoint: {
+                    "rate": round(state.rate, 2),
+                    "concurrency": round(state.window, 2),
+                    "latency": round(state.latency or 0.0, 4),
+                    "requests": state.requests,
+                    "throttled": state.throttled,
+                    "failed": state.failed
+                }
+                for endpoint, state in self._states.items()
+            }
+
+
+    def _state(self, endpoint: str) -> _EndpointState:
+        state = self._states.get(endpoint)
+        if state is None:
+            limits: EndpointLimits | None = self.endpoint_limits.get(endpoint) or self.endpoint_limits.get(endpoint.split(":")[0])
+            state = _EndpointState(limits or self.default_limits)
+            self._states[endpoint] = state
+        return state
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+VOLATILE_PARAMS: set[str] = {"maxlag"}
+EVICTION_WATERMARK = 0.9
+
+
+class CacheMissError(LookupError):
+    pass
+
+
+class ResponseCache:
+
+
+    def __init__(
+            self,
+            path: str = "cache/responses.sqlite",
+            ttl: float | None = None,
+            max_size_bytes: int | None = 2 * 1024 ** 3,
+            offline: bool = False
+            ) -> None:
+        self.path: str = path
+        self.ttl: float | None = ttl
+        self.max_size_bytes: int | None = max_size_bytes
+        self.offline: bool = offline
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                params TEXT NOT NULL,
+                body BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+            """
+        )
+        self._connection.execute("CREATE INDEX IF NOT EXISTS responses_accessed_at ON responses (accessed_at)")
+        self._connection.commit()
+        self._total_size: int = self._connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+
+
+    def get(self, url: str, params: dict[str, Any]) -> dict[str, Any] | None:
+        key, _ = self.make_key(url, params)
+        with self._lock:
+            row = self._connection.execute("SELECT body, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            body, created_at = row
+            if not self.offline and self.ttl is not None and time.time() - created_at > self.ttl:
+                return None
+            self._connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (time.time(), key))
+            self._connection.commit()
+        return json.loads(zlib.decompress(body))
+
+
+    def put(self, url: str, params: dict[str, Any], data: dict[str, Any]) -> None:
+        key, normalized_params = self.make_key(url, params)
+        body: bytes = zlib.compress(json.dumps(data, ensure_ascii=False).encode("utf-8"))
+        now: float = time.time()
+        with self._lock:
+            previous = self._connection.execute("SELECT size FROM responses WHERE key = ?", (key,)).fetchone()
+            if previous is not None:
+                self._total_size -= previous[0]
+            self._connection.execute(
+                "INSERT OR REPLACE INTO responses (key, params, body, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, normalized_params, body, len(body), now, now)
+            )
+            self._total_size += len(body)
+            self._evict()
+            self._connection.commit()
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._connection.execute("DELETE FROM responses")
+            self._connection.commit()
+            self._total_size = 0
+
+
+    def close(self) -> None:
+        with self._lock:
+            self._connection.close()
+
+
+    @staticmethod
+    def make_key(url: str, params: dict[str, Any]) -> tuple[str, str]:
+        normalized_params: str = json.dumps(
+            {name: str(value) for name, value in sorted(params.items()) if name not in VOLATILE_PARAMS},
+            ensure_ascii=False,
+            separators=(",", ":")
+        )
+        key: str = hashlib.sha256(f"{url}?{normalized_params}".encode("utf-8")).hexdigest()
+        return key, normalized_params
+
+
+    def _evict(self) -> None:
+        if self.max_size_bytes is None or self._total_size <= self.max_size_bytes:
+            return
+        # Evict down to a low watermark so a full cache does not pay for eviction on every insert.
+        target_size: float = self.max_size_bytes * EVICTION_WATERMARK
+        evicted: int = 0
+        while self._total_size > target_size:
+            rows = self._connection.execute("SELECT key, size FROM responses ORDER BY accessed_at LIMIT 256").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if self._total_size <= target_size:
+                    break
+                self._connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._total_size -= size
+                evicted += 1
+        logger.info(f"Evicted {evicted} least recently used responses from cache {self.path}")
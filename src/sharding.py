@@ -0,0 +1,236 @@
+import argparse
+import glob
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import sys
+
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass, field
+from typing import Any
+
+
+from src.api_client import API_URL, WikipediaClient
+from src.content_manager import ContentManager, fetch_page_html
+from src.corpus_writer import CorpusWriter, read_corpus_records
+from src.html_extractors import HtmlExtractor, get_extractor
+from src.page_index import PageIndex
+from src.rate_limiter import AdaptiveRateLimiter, EndpointLimits
+from src.utils.custom_types import category_pages, page_label, page_text, page_revision, taxonomy
+
+
+logger = logging.getLogger(__name__)
+
+
+SHARD_FILENAME = "shard_{shard:04d}_of_{num_shards:04d}.jsonl.gz"
+
+
+class ShardMergeError(ValueError):
+    pass
+
+
+def shard_of(page: page_label, num_shards: int) -> int:
+    # Stable across processes, hosts and Python versions, unlike the salted built-in `hash`.
+    digest: bytes = hashlib.blake2b(page.encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big") % num_shards
+
+
+# Everything a shard worker needs, written once by the coordinator and read by every worker, so
+# workers on other hosts only need the manifest file and access to the API.
+@dataclass
+class ShardManifest:
+    pages: category_pages
+    taxonomies: taxonomy
+    degree: int
+    num_shards: int
+    header_id_blacklist: list[str] = field(default_factory=list)
+    li_truncators: list[str] = field(default_factory=list)
+    extraction_backend: str = "beautifulsoup"
+    api_url: str = API_URL
+    max_rate: float | None = None
+
+
+    def save(self, filename: str) -> None:
+        directory = os.path.dirname(filename)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(filename, "w") as out_file:
+            json.dump(asdict(self), out_file, ensure_ascii=False)
+
+
+    @classmethod
+    def load(cls, filename: str) -> "ShardManifest":
+        with open(filename, "r") as in_file:
+            return cls(**json.load(in_file))
+
+
+    def all_pages(self) -> list[page_label]:
+        # Every page of every domain, in the order `ContentManager` retrieves them.
+        pages: dict[page_label, None] = {}
+        for domain_taxonomy in self.taxonomies.values():
+            for category, subcategories in domain_taxonomy.items():
+                pages.update(dict.fromkeys(self.pages[category]))
+                for subcategory in subcategories:
+                    pages.update(dict.fromkeys(self.pages[subcategory]))
+        return list(pages)
+
+
+    def shard_pages(self, shard: int) -> list[page_label]:
+        return [page for page in self.all_pages() if shard_of(page, self.num_shards) == shard]
+
+
+def get_shard_filename(shard_dir: str, shard: int, num_shards: int) -> str:
+    return os.path.join(shard_dir, SHARD_FILENAME.format(shard=shard, num_shards=num_shards))
+
+
+# Fetches and extracts the pages of one shard into its own jsonl file. Workers share nothing but the
+# manifest, so they can run as local processes or on separate hosts writing to a shared directory
+# (or one whose files are collected for the merge). A restarted worker appends to its file and
+# skips the pages already in it.
+class ShardWorker:
+
+
+    def __init__(self, manifest: ShardManifest, shard: int, shard_dir: str, client: WikipediaClient | None = None, fetch_workers: int = 8) -> None:
+        if not 0 <= shard < manifest.num_shards:
+            raise ValueError(f"Shard {shard} is out of range for {manifest.num_shards} shards")
+        self.manifest: ShardManifest = manifest
+        self.shard: int = shard
+        self.filename: str = get_shard_filename(shard_dir, shard, manifest.num_shards)
+        self.client: WikipediaClient = client or WikipediaClient(url=manifest.api_url, rate_limiter=self.get_rate_limiter())
+        self.fetch_workers: int = fetch_workers
+        self.extractor: HtmlExtractor = get_extractor(manifest.extraction_backend, manifest.header_id_blacklist, manifest.li_truncators)
+        self.failed_pages: list[page_label] = []
+        os.makedirs(shard_dir, exist_ok=True)
+
+
+    def get_rate_limiter(self) -> AdaptiveRateLimiter | None:
+        # `max_rate` is the request budget of all shards together, so the API sees the same load
+        # however many shards there are.
+        if self.manifest.max_rate is None:
+            return None
+        shard_rate: float = self.manifest.max_rate / self.manifest.num_shards
+        limits = EndpointLimits(max_rate=shard_rate, min_rate=min(0.5, shard_rate), initial_rate=min(5.0, shard_rate))
+        return AdaptiveRateLimiter({}, default_limits=limits)
+
+
+    def run(self) -> int:
+        done_pages: set[page_label] = set()
+        if os.path.exists(self.filename):
+            done_pages = {record["title"] for record in read_corpus_records(self.filename)}
+        pending_pages: list[page_label] = [page for page in self.manifest.shard_pages(self.shard) if page not in done_pages]
+        logger.info(f"Shard {self.shard}/{self.manifest.num_shards}: {len(pending_pages)} pages to fetch, {len(done_pages)} already fetched")
+        with CorpusWriter(self.filename, "gzip", append=True) as writer, ThreadPoolExecutor(max_workers=self.fetch_workers) as fetchers:
+            for page, result in zip(pending_pages, fetchers.map(self.fetch_page, pending_pages)):
+                if result is None:
+                    self.failed_pages.append(page)
+                    continue
+                content, revision = result
+                writer.write(page, content, revision)
+        if self.failed_pages:
+            logger.warning(f"Shard {self.shard}/{self.manifest.num_shards}: {len(self.failed_pages)} pages failed, run the shard again to retry them")
+        return len(pending_pages) - len(self.failed_pages)
+
+
+    def fetch_page(self, page: page_label) -> tuple[page_text, page_revision] | None:
+        try:
+            html_content, revision = fetch_page_html(self.client, page)
+        except Exception as err:
+            logger.warning(f"Fetching the content of page {page.upper()} failed: {err}")
+            return None
+        return self.extractor.extract(html_content), revision
+
+
+def run_shard(manifest_filename: str, shard: int, shard_dir: str) -> None:
+    # Process entry point: exits with status 1 when pages failed, so the shard is known to need a rerun.
+    worker = ShardWorker(ShardManifest.load(manifest_filename), shard, shard_dir)
+    worker.run()
+    if worker.failed_pages:
+        sys.exit(1)
+
+
+def run_local_shards(manifest_filename: str, shard_dir: str, shards: list[int] | None = None) -> list[int]:
+    # One process per shard on this host, e.g. to use several cores and connections at once.
+    # Returns the shards that did not complete.
+    manifest: ShardManifest = ShardManifest.load(manifest_filename)
+    processes: dict[int, multiprocessing.Process] = {}
+    for shard in range(manifest.num_shards) if shards is None else shards:
+        processes[shard] = multiprocessing.Process(target=run_shard, args=(manifest_filename, shard, shard_dir), name=f"shard-{shard}")
+        processes[shard].start()
+    for process in processes.values():
+        process.join()
+    failed_shards: list[int] = [shard for shard, process in processes.items() if process.exitcode != 0]
+    if failed_shards:
+        logger.warning(f"Shards {failed_shards} did not complete, run them again before merging")
+    return failed_shards
+
+
+def load_shards(manifest: ShardManifest, shard_dir: str) -> PageIndex:
+    # Reads every shard file into a page index and checks that each page of the manifest is in
+    # exactly one record of exactly its own shard.
+    expected_pages: set[page_label] = set(manifest.all_pages())
+    page_index = PageIndex()
+    duplicated: list[page_label] = []
+    misplaced: list[page_label] = []
+    unexpected: list[page_label] = []
+    pattern: str = SHARD_FILENAME.replace("{shard:04d}", "*").format(num_shards=manifest.num_shards)
+    shard_filenames: list[str] = sorted(glob.glob(os.path.join(shard_dir, pattern)))
+    for shard_filename in shard_filenames:
+        shard: int = int(os.path.basename(shard_filename).split("_")[1])
+        for record in read_corpus_records(shard_filename):
+            page: page_label = record["title"]
+            if page not in expected_pages:
+                unexpected.append(page)
+            elif shard_of(page, manifest.num_shards) != shard:
+                misplaced.append(page)
+            elif page in page_index.contents:
+                duplicated.append(page)
+            else:
+                revision: page_revision | None = {"pageid": record["pageid"], "lastrevid": record["lastrevid"]} if "lastrevid" in record else None
+                page_index.add_content(page, record["content"], revision)
+    missing: list[page_label] = sorted(expected_pages - set(page_index.contents))
+    problems: list[str] = [
+        f"{len(pages)} {problem} pages (e.g. {', '.join(sorted(pages)[:5])})"
+        for problem, pages in (("missing", missing), ("duplicated", duplicated), ("misplaced", misplaced), ("unexpected", unexpected))
+        if pages
+    ]
+    if problems:
+        raise ShardMergeError(f"Shards in {shard_dir} do not cover the manifest exactly: {'; '.join(problems)}")
+    logger.info(f"Verified {len(page_index.contents)} pages in {len(shard_filenames)} shard files of {shard_dir}")
+    return page_index
+
+
+def merge_shards(manifest: ShardManifest, shard_dir: str, output_path: str = "outputs/", prefix: str = "", **content_manager_args: Any) -> ContentManager:
+    # The domain outputs are written by a `ContentManager` that takes every page from the verified
+    # shards, so they come out exactly as an unsharded run writes them, in taxonomy order whatever
+    # order the shards finished in.
+    page_index: PageIndex = load_shards(manifest, shard_dir)
+    content_manager = ContentManager(
+        manifest.pages, manifest.taxonomies, manifest.header_id_blacklist, manifest.li_truncators, manifest.degree,
+        output_path=output_path, prefix=prefix, page_index=page_index, **content_manager_args
+    )
+    content_manager.retrieve_taxonomy_content()
+    return content_manager
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Harvest page contents in shards and merge them into the domain outputs.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    worker_parser = subparsers.add_parser("worker", help="fetch one or more shards in local processes")
+    worker_parser.add_argument("manifest")
+    worker_parser.add_argument("--shard-dir", default="shards/")
+    worker_parser.add_argument("--shards", type=int, nargs="+", help="shards to run here, all of them by default")
+    merge_parser = subparsers.add_parser("merge", help="verify the shards and write the domain outputs")
+    merge_parser.add_argument("manifest")
+    merge_parser.add_argument("--shard-dir", default="shards/")
+    merge_parser.add_argument("--output-path", default="outputs/")
+    merge_parser.add_argument("--prefix", default="")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "worker":
+        sys.exit(1 if run_local_shards(args.manifest, args.shard_dir, args.shards) else 0)
+    else:
+        merge_shards(ShardManifest.load(args.manifest), args.shard_dir, args.output_path, args.prefix)
@@ -0,0 +1,235 @@
+import gzip
+import logging
+import re
+import time
+
+
+from typing import BinaryIO, Iterable, Iterator
+
+
+from src.utils.custom_types import category_label, category_pages, category_tree, page_label
+
+
+logger = logging.getLogger(__name__)
+
+
+CATEGORY_NAMESPACE = 14
+# Namespaces whose members `list=categorymembers&cmtype=page` would return, with their title prefix.
+DEFAULT_PAGE_NAMESPACES: dict[int, str] = {0: ""}
+LOG_EVERY_ROWS = 1_000_000
+
+COLUMN_PATTERN = re.compile(rb"^\s*`(\w+)`")
+# A quoted string is matched as runs of plain characters between escapes, so the regular expression
+# engine does not branch on every character. Numbers and NULL contain no comma, quote or parenthesis.
+QUOTED_VALUE = rb"'([^'\\]*(?:\\.[^'\\]*)*)'"
+LITERAL_VALUE = rb"([^,')]+)"
+ESCAPE_PATTERN = re.compile(rb"\\(.)", re.DOTALL)
+ESCAPES: dict[bytes, bytes] = {b"0": b"\x00", b"n": b"\n", b"r": b"\r", b"t": b"\t", b"b": b"\b", b"Z": b"\x1a"}
+
+
+sql_value = bytes | None
+
+
+def open_dump(filename: str) -> BinaryIO:
+    if filename.endswith(".gz"):
+        return gzip.open(filename, "rb")
+    return open(filename, "rb")
+
+
+def unescape(value: bytes) -> bytes:
+    if b"\\" not in value:
+        return value
+    return ESCAPE_PATTERN.sub(lambda match: ESCAPES.get(match.group(1), match.group(1)), value)
+
+
+def compile_row_pattern(num_columns: int, positions: list[int]) -> re.Pattern:
+    # One pattern per table matching a whole `(v1,v2,...)` row and capturing only the wanted columns,
+    # quoted and literal alternatives in separate groups. `findall` then splits a multi-row INSERT
+    # into rows and values without running Python code per value.
+    wanted: set[int] = set(positions)
+    values: list[bytes] = []
+    for column in range(num_columns):
+        value: bytes = rb"(?:" + QUOTED_VALUE + rb"|" + LITERAL_VALUE + rb")"
+        if column not in wanted:
+            value = value.replace(b"(", b"(?:").replace(b"(?:?:", b"(?:")
+        values.append(value)
+    return re.compile(rb"\(" + b",".join(values) + rb"\)")
+
+
+def parse_values(groups: tuple[bytes, ...]) -> list[sql_value]:
+    # Literals are never empty, so an empty literal group means the value was quoted.
+    values: list[sql_value] = []
+    for index in range(0, len(groups), 2):
+        quoted, literal = groups[index], groups[index + 1]
+        if literal:
+            values.append(None if literal == b"NULL" else literal)
+        else:
+            values.append(unescape(quoted))
+    return values
+
+
+def iter_sql_rows(filename: str, table: str, columns: list[str]) -> Iterator[tuple[sql_value, ...]]:
+    # Streams the rows of a mysqldump file (`CREATE TABLE` followed by multi-row `INSERT` lines) one
+    # statement at a time. Column positions are read from the `CREATE TABLE`, so the dump's column
+    # order does not matter. Yields the requested columns as raw bytes: strings unescaped, numbers as
+    # their digits, NULL as None.
+    create_prefix: bytes = f"CREATE TABLE `{table}` (".encode()
+    insert_prefix: bytes = f"INSERT INTO `{table}` VALUES ".encode()
+    table_columns: list[str] = []
+    in_create_table: bool = False
+    row_pattern: re.Pattern | None = None
+    order: list[int] = []
+    with open_dump(filename) as dump_file:
+        for line in dump_file:
+            if line.startswith(insert_prefix):
+                if row_pattern is None:
+                    missing: list[str] = [column for column in columns if column not in table_columns]
+                    if missing:
+                        raise ValueError(f"Table {table} in {filename} has no column(s) {', '.join(missing)}")
+                    positions: list[int] = [table_columns.index(column) for column in columns]
+                    row_pattern = compile_row_pattern(len(table_columns), positions)
+                    # Captured values come in table order; map them back to the requested order.
+                    captured: list[int] = sorted(set(positions))
+                    order = [captured.index(position) for position in positions]
+                for groups in row_pattern.findall(line, len(insert_prefix)):
+                    values: list[sql_value] = parse_values(groups)
+                    yield tuple(values[index] for index in order)
+            elif line.startswith(create_prefix):
+                in_create_table = True
+            elif in_create_table:
+                column = COLUMN_PATTERN.match(line)
+                if column is not None:
+                    table_columns.append(column.group(1).decode())
+                elif line.startswith(b")"):
+                    in_create_table = False
+
+
+def decode_title(title: bytes) -> str:
+    return title.decode("utf-8", errors="replace").replace("_", " ")
+
+
+# Offline alternative to `list=categorymembers` built from the `page` and `categorylinks` SQL dumps
+# (https://dumps.wikimedia.org/<wiki>/latest/<wiki>-latest-{page,categorylinks}.sql.gz). Both files
+# are streamed, never loaded whole. `load` reads the page titles of categories and articles and the
+# complete subcategory graph, which is small. Page memberships are far more numerous, so
+# `category_pages` re-reads `categorylinks` for just the categories a taxonomy kept. Dumps from
+# after the `linktarget` migration name categories by `cl_target_id`, which needs the `linktarget`
+# dump too. Members are ordered by sort key and then page id, like the API returns them by
+# (cl_sortkey, cl_from).
+class CategoryLinksDump:
+
+
+    def __init__(self,
+                 page_dump: str,
+                 categorylinks_dump: str,
+                 linktarget_dump: str | None = None,
+                 page_namespaces: dict[int, str] | None = None
+                 ) -> None:
+        self.page_dump: str = page_dump
+        self.categorylinks_dump: str = categorylinks_dump
+        self.linktarget_dump: str | None = linktarget_dump
+        self.page_namespaces: dict[int, str] = DEFAULT_PAGE_NAMESPACES if page_namespaces is None else page_namespaces
+        self.page_titles: dict[int, page_label] = {}
+        self.category_titles: dict[int, category_label] = {}
+        self.subcategory_lists: category_tree = {}
+        self._target_titles: dict[int, category_label] | None = None
+        self._loaded: bool = False
+
+
+    def load(self) -> None:
+        if self._loaded:
+            return
+        self.load_pages()
+        if self.linktarget_dump is not None:
+            self.load_link_targets()
+        self.load_subcategories()
+        self._loaded = True
+
+
+    def load_pages(self) -> None:
+        start = time.perf_counter()
+        rows: int = 0
+        for rows, (page_id, namespace, title) in enumerate(iter_sql_rows(self.page_dump, "page", ["page_id", "page_namespace", "page_title"]), 1):
+            namespace = int(namespace)
+            if namespace == CATEGORY_NAMESPACE:
+                self.category_titles[int(page_id)] = decode_title(title)
+            elif namespace in self.page_namespaces:
+                self.page_titles[int(page_id)] = self.page_namespaces[namespace] + decode_title(title)
+            if rows % LOG_EVERY_ROWS == 0:
+                logger.info(f"Read {rows} rows of {self.page_dump}")
+        logger.info(f"Read {len(self.category_titles)} categories and {len(self.page_titles)} pages from {rows} rows of {self.page_dump} in {time.perf_counter() - start:.1f} secs")
+
+
+    def load_link_targets(self) -> None:
+        self._target_titles = {}
+        for target_id, namespace, title in iter_sql_rows(self.linktarget_dump, "linktarget", ["lt_id", "lt_namespace", "lt_title"]):
+            if int(namespace) == CATEGORY_NAMESPACE:
+                self._target_titles[int(target_id)] = decode_title(title)
+        logger.info(f"Read {len(self._target_titles)} category link targets from {self.linktarget_dump}")
+
+
+    def load_subcategories(self) -> None:
+        start = time.perf_counter()
+        # Parent titles repeat across millions of rows, so each is decoded once and shared.
+        parent_titles: dict[bytes | int, category_label] = {}
+        sortkeys: dict[category_label, list[tuple[bytes, int, category_label]]] = {}
+        rows: int = 0
+        for rows, (page_id, parent, sortkey) in enumerate(self._iter_links("subcat"), 1):
+            subcategory: category_label | None = self.category_titles.get(int(page_id))
+            parent_title: category_label | None = self._parent_title(parent, parent_titles)
+            if subcategory is not None and parent_title is not None:
+                sortkeys.setdefault(parent_title, []).append((sortkey or b"", int(page_id), subcategory))
+            if rows % LOG_EVERY_ROWS == 0:
+                logger.info(f"Read {rows} rows of {self.categorylinks_dump}")
+        for parent_title, members in sortkeys.items():
+            members.sort()
+            self.subcategory_lists[parent_title] = [subcategory for _, _, subcategory in members]
+        edges: int = sum(len(subcategories) for subcategories in self.subcategory_lists.values())
+        logger.info(f"Read {edges} subcategory links from {rows} rows of {self.categorylinks_dump} in {time.perf_counter() - start:.1f} secs")
+
+
+    def subcategories(self, category: category_label) -> list[category_label]:
+        self.load()
+        return self.subcategory_lists.get(category, [])
+
+
+    def category_pages(self, categories: Iterable[category_label]) -> tuple[category_pages, dict[page_label, int]]:
+        # One pass over `categorylinks` collecting the page members of `categories`. Returns the
+        # pages of every requested category (empty when it has none) and the page ids of their titles.
+        self.load()
+        start = time.perf_counter()
+        wanted: set[category_label] = set(categories)
+        parent_titles: dict[bytes | int, category_label] = {}
+        sortkeys: dict[category_label, list[tuple[bytes, int, page_label]]] = {category: [] for category in wanted}
+        page_ids: dict[page_label, int] = {}
+        for page_id, parent, sortkey in self._iter_links("page"):
+            parent_title: category_label | None = self._parent_title(parent, parent_titles)
+            if parent_title not in wanted:
+                continue
+            title: page_label | None = self.page_titles.get(int(page_id))
+            if title is not None:
+                sortkeys[parent_title].append((sortkey or b"", int(page_id), title))
+                page_ids[title] = int(page_id)
+        pages: category_pages = {}
+        for category, members in sortkeys.items():
+            members.sort()
+            pages[category] = [title for _, _, title in members]
+        logger.info(f"Read {len(page_ids)} pages of {len(wanted)} categories from {self.categorylinks_dump} in {time.perf_counter() - start:.1f} secs")
+        return pages, page_ids
+
+
+    def _iter_links(self, link_type: str) -> Iterator[tuple[sql_value, sql_value, sql_value]]:
+        parent_column: str = "cl_to" if self._target_titles is None else "cl_target_id"
+        link_type_bytes: bytes = link_type.encode()
+        for page_id, parent, sortkey, row_type in iter_sql_rows(self.categorylinks_dump, "categorylinks", ["cl_from", parent_column, "cl_sortkey", "cl_type"]):
+            if row_type == link_type_bytes:
+                yield page_id, parent, sortkey
+
+
+    def _parent_title(self, parent: sql_value, parent_titles: dict[bytes | int, category_label]) -> category_label | None:
+        if self._target_titles is not None:
+            return self._target_titles.get(int(parent))
+        title = parent_titles.get(parent)
+        if title is None:
+            title = parent_titles[parent] = decode_title(parent)
+        return title
@@ -0,0 +1,79 @@
+import unicodedata
+
+
+from collections import deque
+
+
+# Full matches are answered with a hash lookup. Partial matches use an Aho-Corasick automaton built
+# once from all partial patterns, so a lookup costs one pass over the title, however many patterns.
+class BlacklistMatcher:
+
+
+    def __init__(self, full_match_items: list[str], partial_match_items: list[str], normalize: bool = False) -> None:
+        self.normalize: bool = normalize
+        self.full_match_items: set[str] = {self._normalize(item) for item in full_match_items}
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._output: list[str | None] = [None]
+        for item in partial_match_items:
+            self._add_pattern(self._normalize(item))
+        self._build_failure_links()
+
+
+    def is_blacklisted(self, title: str) -> bool:
+        return self.match(title) is not None
+
+
+    def match(self, title: str) -> str | None:
+        text: str = self._normalize(title)
+        if text in self.full_match_items:
+            return text
+
+        goto, fail, output = self._goto, self._fail, self._output
+        state: int = 0
+        if output[state] is not None:
+            return output[state]
+        for char in text:
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            if output[state] is not None:
+                return output[state]
+        return None
+
+
+    def _normalize(self, text: str) -> str:
+        if not self.normalize:
+            return text
+        decomposed: str = unicodedata.normalize("NFKD", text.casefold())
+        return "".join(char for char in decomposed if not unicodedata.combining(char))
+
+
+    def _add_pattern(self, pattern: str) -> None:
+        state: int = 0
+        for char in pattern:
+            next_state: int | None = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(None)
+                self._goto[state][char] = next_state
+            state = next_state
+        self._output[state] = pattern
+
+
+    def _build_failure_links(self) -> None:
+        # Breadth-first over the trie. Each state's output is inherited from its failure state, so a
+        # single check per character detects any pattern ending at that position.
+        queue: deque[int] = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                fail_state: int = self._fail[state]
+                while fail_state and char not in self._goto[fail_state]:
+                    fail_state = self._fail[fail_state]
+                self._fail[next_state] = self._goto[fail_state].get(char, 0)
+                if self._output[next_state] is None:
+                    self._output[next_state] = self._output[self._fail[next_state]]
+                queue.append(next_state)
@@ -9,4 +9,8 @@ taxonomy = dict[category_label, category_tree]
 page_label = str
 category_pages = dict[category_label, list[page_label]]
 page_text = list[str]
-corpus = dict[page_label, page_text]
\ No newline at end of file
+corpus = dict[page_label, page_text]
+
+# Revisions:
+page_revision = dict[str, int]
+page_revisions = dict[page_label, page_revision]
@@ -0,0 +1,267 @@
+import bisect
+import json
+import logging
+import math
+import threading
+
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+logger = logging.getLogger(__name__)
+
+
+# Upper bounds in seconds, roughly logarithmic from 1 ms to 2 min. Requests and pages fall in the
+# 10 ms - 10 s range, whole domains and stages in the upper buckets.
+LATENCY_BUCKETS: tuple[float, ...] = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0
+)
+SUMMARY_QUANTILES: tuple[float, ...] = (0.5, 0.9, 0.99)
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+labels_key = tuple[tuple[str, str], ...]
+
+
+def escape_label_value(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Counter:
+
+
+    def __init__(self) -> None:
+        self.value: float = 0.0
+        self._lock = threading.Lock()
+
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._lock:
+            self.value += amount
+
+
+    def summary(self) -> float:
+        return self.value
+
+
+class Gauge:
+
+
+    def __init__(self) -> None:
+        self.value: float = 0.0
+        self.max_value: float = 0.0
+        self._lock = threading.Lock()
+
+
+    def set(self, value: float) -> None:
+        with self._lock:
+            self.value = value
+            self.max_value = max(self.max_value, value)
+
+
+    def summary(self) -> dict[str, float]:
+        return {"value": self.value, "max": self.max_value}
+
+
+# Counts observations into fixed buckets, so recording costs a binary search and an increment
+# whatever the number of observations. Quantiles are estimated by interpolating within a bucket.
+class Histogram:
+
+
+    def __init__(self, buckets: tuple[float, ...] = LATENCY_BUCKETS) -> None:
+        self.buckets: tuple[float, ...] = buckets
+        self.counts: list[int] = [0] * (len(buckets) + 1)
+        self.count: int = 0
+        self.sum: float = 0.0
+        self.min: float = math.inf
+        self.max: float = -math.inf
+        self._lock = threading.Lock()
+
+
+    def observe(self, value: float) -> None:
+        bucket: int = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[bucket] += 1
+            self.count += 1
+            self.sum += value
+            self.min = min(self.min, value)
+            self.max = max(self.max, value)
+
+
+    def quantile(self, quantile: float) -> float:
+        if not self.count:
+            return 0.0
+        rank: float = quantile * self.count
+        cumulative: int = 0
+        for bucket, count in enumerate(self.counts):
+            if count and cumulative + count >= rank:
+                lower: float = self.buckets[bucket - 1] if bucket > 0 else self.min
+                upper: float = self.buckets[bucket] if bucket < len(self.buckets) else self.max
+                lower, upper = max(lower, self.min), min(upper, self.max)
+                return lower + (upper - lower) * (rank - cumulative) / count
+            cumulative += count
+        return self.max
+
+
+    def summary(self) -> dict[str, float]:
+        if not self.count:
+            return {"count": 0, "sum": 0.0}
+        summary: dict[str, float] = {
+            "count": self.count,
+            "sum": round(self.sum, 6),
+            "mean": round(self.sum / self.count, 6),
+            "min": round(self.min, 6),
+            "max": round(self.max, 6)
+        }
+        for quantile in SUMMARY_QUANTILES:
+            summary[f"p{round(quantile * 100)}"] = round(self.quantile(quantile), 6)
+        return summary
+
+
+METRIC_TYPES: dict[str, type] = {"counter": Counter, "gauge": Gauge, "histogram": Histogram}
+
+
+# Process-wide store of named metrics, each split into series by labels (stage, endpoint, ...).
+# Looking a series up costs a dictionary access, so callers can fetch it on every observation.
+# At the end of a run the registry is written as a JSON summary, and `serve` exposes a live
+# snapshot in the Prometheus text format.
+class MetricsRegistry:
+
+
+    def __init__(self) -> None:
+        self._metrics: dict[str, tuple[str, str, dict[labels_key, Any]]] = {}
+        self._lock = threading.Lock()
+        self._server: ThreadingHTTPServer | None = None
+
+
+    def counter(self, name: str, description: str = "", **labels: str) -> Counter:
+        return self._series("counter", name, description, labels)
+
+
+    def gauge(self, name: str, description: str = "", **labels: str) -> Gauge:
+        return self._series("gauge", name, description, labels)
+
+
+    def histogram(self, name: str, description: str = "", **labels: str) -> Histogram:
+        return self._series("histogram", name, description, labels)
+
+
+    def clear(self) -> None:
+        with self._lock:
+            self._metrics.clear()
+
+
+    def summary(self) -> dict[str, Any]:
+        with self._lock:
+            metrics = list(self._metrics.items())
+        return {
+            name: {
+                "type": metric_type,
+                "description": description,
+                "series": [{"labels": dict(labels), **self._as_dict(metric.summary())} for labels, metric in list(series.items())]
+            }
+            for name, (metric_type, description, series) in metrics
+        }
+
+
+    def save_summary(self, filename: str) -> dict[str, Any]:
+        summary: dict[str, Any] = self.summary()
+        with open(filename, "w") as out_file:
+            json.dump(summary, out_file, indent=4, ensure_ascii=False)
+        logger.info(f"Saved summary of {len(summary)} metrics to {filename}")
+        return summary
+
+
+    def prometheus_text(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.items())
+        lines: list[str] = []
+        for name, (metric_type, description, series) in metrics:
+            if description:
+                lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, metric in list(series.items()):
+                if metric_type == "histogram":
+                    cumulative: int = 0
+                    for bound, count in zip((*metric.buckets, math.inf), metric.counts):
+                        cumulative += count
+                        le: str = "+Inf" if bound == math.inf else repr(bound)
+                        lines.append(f"{name}_bucket{self._format_labels((*labels, ('le', le)))} {cumulative}")
+                    lines.append(f"{name}_sum{self._format_labels(labels)} {metric.sum!r}")
+                    lines.append(f"{name}_count{self._format_labels(labels)} {metric.count}")
+                else:
+                    lines.append(f"{name}{self._format_labels(labels)} {metric.value!r}")
+        return "\n".join(lines) + "\n"
+
+
+    def serve(self, port: int = 9100, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+        registry = self
+
+        class MetricsHandler(BaseHTTPRequestHandler):
+
+            def do_GET(self) -> None:
+                body: bytes = registry.prometheus_text().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", PROMETHEUS_CONTENT_TYPE)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format: str, *args: Any) -> None:
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        logger.info(f"Serving metrics at http://{host}:{self._server.server_address[1]}/metrics")
+        return self._server
+
+
+    def stop(self) -> None:
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+
+    def _series(self, metric_type: str, name: str, description: str, labels: dict[str, str]) -> Any:
+        key: labels_key = tuple(sorted(labels.items()))
+        metric = self._metrics.get(name)
+        if metric is not None:
+            series = metric[2].get(key)
+            if series is not None:
+                return series
+        with self._lock:
+            if name not in self._metrics:
+                self._metrics[name] = (metric_type, description, {})
+            registered_type, _, series_by_labels = self._metrics[name]
+            if registered_type != metric_type:
+                raise ValueError(f"Metric {name} is a {registered_type}, not a {metric_type}")
+            if key not in series_by_labels:
+                series_by_labels[key] = METRIC_TYPES[metric_type]()
+            return series_by_labels[key]
+
+
+    @staticmethod
+    def _as_dict(summary: float | dict[str, float]) -> dict[str, float]:
+        return summary if isinstance(summary, dict) else {"value": summary}
+
+
+    @staticmethod
+    def _format_labels(labels: labels_key) -> str:
+        if not labels:
+            return ""
+        return "{" + ",".join(f'{key}="{escape_label_value(value)}"' for key, value in labels) + "}"
+
+
+_default_registry: MetricsRegistry = MetricsRegistry()
+
+
+def set_default_registry(registry: MetricsRegistry) -> None:
+    global _default_registry
+    _default_registry = registry
+
+
+def get_default_registry() -> MetricsRegistry:
+    return _default_registry
@@ -1,37 +1,40 @@
+import functools
 import time
 import logging
 
 
+from src.utils.metrics import get_default_registry
+
+
 logger = logging.getLogger(__name__)
 
 
+STAGE_SECONDS = "stage_duration_seconds"
+STAGE_SECONDS_DESCRIPTION = "Wall time of a stage call, by stage (the decorated method)."
+
+
 def timeit(method):
+    @functools.wraps(method)
     def timed(*args, **kw):
-        ts = time.time()
+        ts = time.perf_counter()
         result = method(*args, **kw)
-        te = time.time()
-
-        if 'log_time' in kw:
-            name = kw.get('log_name', method.__name__.upper())
-            kw['log_time'][name] = int((te - ts) * 1000)
-        else:
-            logger.info('%r  %2.2f secs' % (method.__name__, (te - ts)))
+        elapsed = time.perf_counter() - ts
+        get_default_registry().histogram(STAGE_SECONDS, STAGE_SECONDS_DESCRIPTION, stage=method.__name__).observe(elapsed)
+        logger.debug('%r  %2.2f secs' % (method.__name__, elapsed))
         return result
     return timed
 
 
 def time_category_iteration(method):
+    @functools.wraps(method)
     def timed(*args, **kw):
-        ts = time.time()
+        ts = time.perf_counter()
         result = method(*args, **kw)
-        te = time.time()
-
-        if 'log_time' in kw:
-            name = kw.get('log_name', method.__name__.upper())
-            kw['log_time'][name] = int((te - ts) * 1000)
-        else:
-            # assumes that the first argument to the method is 'category'
-            category = args[1] if len(args) > 1 else 'no category provided'
-            logger.info('%r (%r)  %2.2f secs' % (method.__name__, category, (te - ts)))
+        elapsed = time.perf_counter() - ts
+        # Labelled by stage only: one series per category would not aggregate.
+        get_default_registry().histogram(STAGE_SECONDS, STAGE_SECONDS_DESCRIPTION, stage=method.__name__).observe(elapsed)
+        # assumes that the first argument to the method is 'category'
+        category = args[1] if len(args) > 1 else 'no category provided'
+        logger.debug('%r (%r)  %2.2f secs' % (method.__name__, category, elapsed))
         return result
     return timed
@@ -0,0 +1,217 @@
+import re
+import html
+
+
+from src.utils.custom_types import page_text
+
+
+HEADING_PATTERN = re.compile(r'^(={1,6})\s*(.+?)\s*\1\s*$')
+LIST_ITEM_PATTERN = re.compile(r'^([*#]+)[:;]?\s*(.*)$')
+DEFINITION_TERM_PATTERN = re.compile(r'^;\s*([^:]*)(?::.*)?$')
+EXTERNAL_LINK_PATTERN = re.compile(r'\[(?:https?:)?//[^\s\]]+(?:\s+([^\]]*))?\]')
+DISCARDED_ELEMENTS_PATTERN = re.compile(
+    r'<(ref|references|gallery|div|table|timeline|imagemap|score|graph|mapframe)\b[^>]*?(?:/>|>(?:(?!<\1\b).)*?</\1\s*>)',
+    flags=re.DOTALL | re.IGNORECASE
+)
+SELF_CLOSING_REF_PATTERN = re.compile(r'<ref\b[^>]*/>', flags=re.IGNORECASE)
+COMMENT_PATTERN = re.compile(r'<!--.*?-->', flags=re.DOTALL)
+HTML_TAG_PATTERN = re.compile(r'</?[a-zA-Z][^>]*>')
+MAGIC_WORD_PATTERN = re.compile(r'__[A-ZÁÉÍÓÚ]+__')
+EMPHASIS_PATTERN = re.compile(r"'{2,5}")
+LINK_TRAIL_PATTERN = re.compile(r'[a-záéíóúñü]+')
+LINK_BRACKET_PATTERN = re.compile(r'\[\[|\]\]')
+INTERWIKI_PATTERN = re.compile(r'^[a-z]{2,3}(?:-[a-z]+)*:')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+DISCARDED_NAMESPACES: tuple[str, ...] = ("archivo:", "file:", "imagen:", "image:", "categoría:", "category:")
+HEADING_TAGS: list[str] = ['h1', 'h2', 'h3', 'h4', 'h5', 'h6']
+# Inline templates that render their last positional argument as plain text, e.g. `{{lang|la|ius civile}}`.
+# Every other template is dropped with its arguments.
+INLINE_TEXT_TEMPLATES: set[str] = {"lang", "nowrap", "nobr", "small", "big", "versalita", "smallcaps"}
+
+
+def extract_wikitext_content(wikitext: str, header_id_blacklist: list[str], li_truncators: list[str]) -> page_text:
+    content: page_text = []
+    blacklisted_section: bool = False
+    truncated_list: bool = False
+    paragraph: list[str] = []
+
+    # Indices in `content` of the list items enclosing the current one, by depth. A nested item's text
+    # is also part of every enclosing item, as in the parser's HTML.
+    open_items: list[tuple[int, int]] = []
+
+    def flush_paragraph() -> None:
+        text = _collapse_whitespace(" ".join(paragraph))
+        if text and not blacklisted_section:
+            content.append(f"p: {text}")
+        paragraph.clear()
+
+    for line in clean_wikitext(wikitext).split("\n"):
+        stripped_line = line.strip()
+        heading = HEADING_PATTERN.match(stripped_line)
+
+        if heading:
+            flush_paragraph()
+            truncated_list = False
+            tag_name = HEADING_TAGS[len(heading.group(1)) - 1]
+            heading_text = _collapse_whitespace(heading.group(2))
+            blacklisted_section = heading_text.replace(" ", "_") in header_id_blacklist
+            if not blacklisted_section:
+                content.append(f"{tag_name}: {heading_text}")
+            continue
+
+        if not stripped_line or stripped_line.startswith(("*", "#", ";", ":")):
+            flush_paragraph()
+        if blacklisted_section:
+            continue
+
+        if stripped_line.startswith(("*", "#")):
+            if truncated_list:
+                continue
+            list_item = LIST_ITEM_PATTERN.match(stripped_line)
+            li_text = _collapse_whitespace(list_item.group(2))
+            if li_text in li_truncators:
+                truncated_list = True
+                continue
+            depth: int = len(list_item.group(1))
+            while open_items and open_items[-1][0] >= depth:
+                open_items.pop()
+            for _, item_index in open_items:
+                content[item_index] += f" {li_text}"
+            open_items.append((depth, len(content)))
+            content.append(f"li: {li_text}")
+            continue
+        truncated_list = False
+        open_items.clear()
+
+        if stripped_line.startswith(";"):
+            dt_text = _collapse_whitespace(DEFINITION_TERM_PATTERN.match(stripped_line).group(1))
+            content.append(f"dt: {dt_text}")
+        elif stripped_line and not stripped_line.startswith(":"):
+            paragraph.append(stripped_line)
+
+    flush_paragraph()
+    return content
+
+
+def clean_wikitext(wikitext: str) -> str:
+    text = COMMENT_PATTERN.sub('', wikitext)
+    text = SELF_CLOSING_REF_PATTERN.sub('', text)
+    previous_text = None
+    while previous_text != text:
+        previous_text = text
+        text = DISCARDED_ELEMENTS_PATTERN.sub('', text)
+    text = _replace_templates(text)
+    text = _strip_tables(text)
+    text = _replace_links(text)
+    text = EXTERNAL_LINK_PATTERN.sub(lambda match: match.group(1) or '', text)
+    text = MAGIC_WORD_PATTERN.sub('', text)
+    text = EMPHASIS_PATTERN.sub('', text)
+    text = HTML_TAG_PATTERN.sub('', text)
+    return html.unescape(text).replace('\xa0', ' ')
+
+
+def _collapse_whitespace(text: str) -> str:
+    # Soft line breaks and the gaps left by removed markup become single spaces.
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def _replace_templates(text: str) -> str:
+    output: list[str] = []
+    depth: int = 0
+    segment_start: int = 0
+    template_start: int = 0
+    for token in re.finditer(r"\{\{|\}\}", text):
+        if token.group(0) == "{{":
+            if depth == 0:
+                output.append(text[segment_start:token.start()])
+                template_start = token.end()
+            depth += 1
+        elif depth:
+            depth -= 1
+            if depth == 0:
+                output.append(_render_template(text[template_start:token.start()]))
+                segment_start = token.end()
+    if depth == 0:
+        output.append(text[segment_start:])
+    return "".join(output)
+
+
+def _render_template(template: str) -> str:
+    arguments: list[str] = _split_arguments(template)
+    name: str = arguments[0].strip().replace("_", " ").lower()
+    positional: list[str] = [argument for argument in arguments[1:] if "=" not in argument.split("{{", 1)[0].split("[[", 1)[0]]
+    if name not in INLINE_TEXT_TEMPLATES or not positional:
+        return ''
+    return _replace_templates(positional[-1].strip())
+
+
+def _split_arguments(template: str) -> list[str]:
+    # Splits on the pipes outside nested templates and links.
+    arguments: list[str] = []
+    depth: int = 0
+    argument_start: int = 0
+    for token in re.finditer(r"\{\{|\[\[|\}\}|\]\]|\|", template):
+        if token.group(0) in ("{{", "[["):
+            depth += 1
+        elif token.group(0) in ("}}", "]]"):
+            depth = max(depth - 1, 0)
+        elif depth == 0:
+            arguments.append(template[argument_start:token.start()])
+            argument_start = token.end()
+    arguments.append(template[argument_start:])
+    return arguments
+
+
+def _strip_tables(text: str) -> str:
+    lines: list[str] = []
+    depth: int = 0
+    for line in text.split("\n"):
+        stripped_line = line.strip()
+        if stripped_line.startswith("{|"):
+            depth += 1
+            continue
+        if depth:
+            if stripped_line.startswith("|}"):
+                depth -= 1
+            continue
+        lines.append(line)
+    return "\n".join(lines)
+
+
+def _replace_links(text: str) -> str:
+    output: list[str] = []
+    position: int = 0
+    while True:
+        start = text.find("[[", position)
+        if start == -1:
+            output.append(text[position:])
+            break
+        end = _find_link_end(text, start)
+        if end == -1:
+            output.append(text[position:])
+            break
+        output.append(text[position:start])
+        link = text[start + 2:end]
+        position = end + 2
+
+        target = link.split("|", 1)[0].strip().lower()
+        if target.startswith(DISCARDED_NAMESPACES) or INTERWIKI_PATTERN.match(target):
+            # Language and category links are not part of the running text, nor is the space before them.
+            output[-1] = output[-1].rstrip(" \t")
+            continue
+        label = link.split("|", 1)[1] if "|" in link else link.lstrip(":")
+        trail = LINK_TRAIL_PATTERN.match(text, position)
+        if trail:
+            label += trail.group(0)
+            position = trail.end()
+        output.append(_replace_links(label))
+    return "".join(output)
+
+
+def _find_link_end(text: str, start: int) -> int:
+    depth: int = 0
+    for token in LINK_BRACKET_PATTERN.finditer(text, start):
+        depth += 1 if token.group(0) == "[[" else -1
+        if depth == 0:
+            return token.start()
+    return -1
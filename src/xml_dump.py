@@ -0,0 +1,144 @@
+import bz2
+import logging
+
+
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from itertools import chain
+from typing import Iterable, Iterator
+from xml.etree.ElementTree import XMLPullParser
+
+
+from src.wikitext_extractor import extract_wikitext_content
+from src.utils.custom_types import page_label, page_text, page_revision
+
+
+logger = logging.getLogger(__name__)
+
+
+STREAM_READ_SIZE = 1 << 18
+
+
+# A page as extracted from the dump: title, content and revision ids.
+dump_page = tuple[page_label, page_text, page_revision]
+
+
+def open_index(filename: str):
+    if filename.endswith(".bz2"):
+        return bz2.open(filename, "rt", encoding="utf-8")
+    return open(filename, "r", encoding="utf-8")
+
+
+def read_stream(dump_path: str, offset: int) -> Iterator[bytes]:
+    # Decompresses the single bz2 stream starting at `offset` chunk by chunk, reading only as far as
+    # it extends.
+    decompressor = bz2.BZ2Decompressor()
+    with open(dump_path, "rb") as dump_file:
+        dump_file.seek(offset)
+        while not decompressor.eof:
+            compressed: bytes = dump_file.read(STREAM_READ_SIZE)
+            if not compressed:
+                raise EOFError(f"Truncated bz2 stream at offset {offset} of {dump_path}")
+            yield decompressor.decompress(compressed)
+
+
+def iter_stream_pages(chunks: Iterable[bytes]) -> Iterator[tuple[page_label, int, int, str]]:
+    # A stream holds a run of `<page>` elements without their `<mediawiki>` root (and without its
+    # namespace), so it is wrapped in a root of its own. Pages are parsed as the chunks arrive and
+    # discarded once read.
+    parser = XMLPullParser(events=("end",))
+    parser.feed(b"<pages>")
+    for chunk in chain(chunks, [b"</pages>"]):
+        parser.feed(chunk)
+        for _, element in parser.read_events():
+            if element.tag != "page":
+                continue
+            revision = element.find("revision")
+            if revision is not None:
+                yield (
+                    element.findtext("title"),
+                    int(element.findtext("id")),
+                    int(revision.findtext("id")),
+                    revision.findtext("text") or ""
+                )
+            element.clear()
+    parser.close()
+
+
+def extract_stream(
+        dump_path: str,
+        offset: int,
+        titles: set[page_label],
+        header_id_blacklist: list[str],
+        li_truncators: list[str]
+        ) -> list[dump_page]:
+    # Runs in a worker process: decompresses one stream and extracts the wanted pages in it.
+    pages: list[dump_page] = []
+    for title, page_id, revision_id, wikitext in iter_stream_pages(read_stream(dump_path, offset)):
+        if title in titles:
+            content: page_text = extract_wikitext_content(wikitext, header_id_blacklist, li_truncators)
+            pages.append((title, content, {"pageid": page_id, "lastrevid": revision_id}))
+    return pages
+
+
+# Content source reading a `pages-articles-multistream.xml.bz2` dump. The dump is a concatenation of
+# independent bz2 streams of 100 pages each, and its index (`...-multistream-index.txt.bz2`) lists
+# `offset:pageid:title` for every page. Only the streams holding the requested titles are read, by
+# seeking to their offsets, and they are decompressed, parsed and extracted in a process pool. The
+# offsets of every title looked up are kept, so the index is only scanned again for new titles.
+class MultistreamDump:
+
+
+    def __init__(self, dump_path: str, index_path: str, workers: int | None = None, max_pending_streams: int = 64) -> None:
+        self.dump_path: str = dump_path
+        self.index_path: str = index_path
+        self.workers: int | None = workers
+        self.max_pending_streams: int = max_pending_streams
+        self._offsets: dict[page_label, int] = {}
+        self._looked_up_titles: set[page_label] = set()
+
+
+    def locate(self, titles: Iterable[page_label]) -> dict[int, set[page_label]]:
+        # Maps the offset of every stream holding some of `titles` to the titles in it, in dump order.
+        wanted: set[page_label] = set(titles)
+        new_titles: set[page_label] = wanted - self._looked_up_titles
+        if new_titles:
+            with open_index(self.index_path) as index_file:
+                for line in index_file:
+                    offset, _, title = line.rstrip("\n").split(":", 2)
+                    if title in new_titles:
+                        self._offsets[title] = int(offset)
+            self._looked_up_titles.update(new_titles)
+        streams: dict[int, set[page_label]] = {}
+        for title in wanted:
+            if title in self._offsets:
+                streams.setdefault(self._offsets[title], set()).add(title)
+        found_titles: int = sum(len(stream_titles) for stream_titles in streams.values())
+        logger.info(f"Located {found_titles} of {len(wanted)} pages in {len(streams)} streams of {self.dump_path}")
+        return dict(sorted(streams.items()))
+
+
+    def iter_pages(self, titles: Iterable[page_label], header_id_blacklist: list[str], li_truncators: list[str]) -> Iterator[dump_page]:
+        # Pages are yielded in dump order. At most `max_pending_streams` streams are in flight, so
+        # memory stays bounded however many pages are requested.
+        located = self.locate(titles)
+        if not located:
+            return
+        streams = iter(located.items())
+        with ProcessPoolExecutor(max_workers=self.workers) as executor:
+            pending: deque[Future] = deque()
+
+            def submit_next() -> None:
+                stream = next(streams, None)
+                if stream is not None:
+                    offset, stream_titles = stream
+                    pending.append(executor.submit(
+                        extract_stream, self.dump_path, offset, stream_titles, header_id_blacklist, li_truncators
+                    ))
+
+            for _ in range(self.max_pending_streams):
+                submit_next()
+            while pending:
+                pages: list[dump_page] = pending.popleft().result()
+                submit_next()
+                yield from pages
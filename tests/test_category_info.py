@@ -0,0 +1,34 @@
+from benchmarks.fake_mediawiki import FakeMediaWikiServer, SyntheticWiki
+from src.api_client import WikipediaClient
+from src.category_info import EMPTY_COUNTS, CategoryInfo
+from src.category_manager import CategoryManager
+from src.page_manager import PageManager
+
+
+class StaleCategoryInfo(CategoryInfo):
+    # Every category reports no members, as a stale `categoryinfo` count would.
+
+
+    def prefetch(self, categories):
+        for category in categories:
+            self.counts.setdefault(category, dict(EMPTY_COUNTS))
+
+
+def retrieve(client, category_info=None, combined=False):
+    page_manager = PageManager({}, 3, client=client, category_info=category_info)
+    category_manager = CategoryManager(
+        ["Sintética 0"], [], [], 3, client=client, category_info=category_info, page_manager=page_manager if combined else None
+    )
+    category_manager.retrieve_taxonomies(save=False, concurrent=True)
+    page_manager.taxonomies = category_manager.get_taxonomies()
+    page_manager.retrieve_taxonomy_pages(save=False)
+    return category_manager.get_taxonomies(), page_manager.get_pages()
+
+
+def test_stale_counts_do_not_skip_listings():
+    with FakeMediaWikiServer(SyntheticWiki(120, 3, pages_per_category=3, seed=3)) as server:
+        client = WikipediaClient(url=server.url, max_retries=2, backoff_factor=0.01)
+        expected = retrieve(client)
+        assert retrieve(client, StaleCategoryInfo(client)) == expected
+        assert retrieve(client, StaleCategoryInfo(client), combined=True) == expected
+        assert retrieve(client, CategoryInfo(client), combined=True) == expected
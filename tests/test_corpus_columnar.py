@@ -0,0 +1,33 @@
+import pytest
+
+
+from src.content_manager import ContentManager
+from src.corpus_columnar import ColumnarCorpus, ColumnarCorpusWriter, read_columnar_records
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_read_records_of_empty_domain_file(tmp_path, file_format):
+    filename = str(tmp_path / f"empty.{file_format}")
+    with ColumnarCorpusWriter(filename, file_format, "Empty", {}):
+        pass
+    assert list(read_columnar_records(filename)) == []
+    assert list(read_columnar_records(filename, content=False)) == []
+    assert len(ColumnarCorpus([filename])) == 0
+
+
+@pytest.mark.parametrize("file_format", ["parquet", "arrow"])
+def test_reopen_output_with_empty_domain(tmp_path, file_format):
+    # The second domain's pages were all listed by the first one, so its file has no rows.
+    pages = {"Uno": ["A", "B"], "Dos": ["A"]}
+    taxonomies = {"Uno": {"Uno": []}, "Dos": {"Dos": []}}
+    output_path = f"{tmp_path}/"
+    for domain, contents in {"Uno": {"A": ["p: a"], "B": ["p: b"]}, "Dos": {}}.items():
+        filename = f"{output_path}{domain.lower()}_content_degree_1.{file_format}"
+        with ColumnarCorpusWriter(filename, file_format, domain, {}) as writer:
+            for page, content in contents.items():
+                writer.write(page, content, {"pageid": ord(page), "lastrevid": 1})
+
+    content_manager = ContentManager(pages, taxonomies, [], [], 1, output_path=output_path, output_format=file_format)
+    assert content_manager.stored_domain_pages == {"Uno": {"A", "B"}, "Dos": set()}
+    assert content_manager.retrieved_pages == {"A", "B"}
+    assert dict(content_manager.get_corpus()) == {"A": ["p: a"], "B": ["p: b"]}
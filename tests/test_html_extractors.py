@@ -0,0 +1,49 @@
+import glob
+import json
+import os
+
+import pytest
+
+
+from benchmarks.html_extraction_benchmark import HEADER_ID_BLACKLIST, LI_TRUNCATORS
+from src.html_extractors import EXTRACTION_BACKENDS, get_extractor
+
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), os.pardir, "benchmarks", "fixtures", "html")
+FIXTURES: list[str] = sorted(os.path.splitext(os.path.basename(filename))[0] for filename in glob.glob(os.path.join(FIXTURES_DIR, "*.html")))
+
+
+def test_fixtures_have_golden_outputs():
+    assert FIXTURES
+    for name in FIXTURES:
+        assert os.path.exists(os.path.join(FIXTURES_DIR, "golden", f"{name}.json")), name
+
+
+@pytest.mark.parametrize("backend", list(EXTRACTION_BACKENDS))
+@pytest.mark.parametrize("name", FIXTURES)
+def test_backend_matches_golden_output(backend, name):
+    with open(os.path.join(FIXTURES_DIR, f"{name}.html"), encoding="utf-8") as html_file:
+        html_content = html_file.read()
+    with open(os.path.join(FIXTURES_DIR, "golden", f"{name}.json"), encoding="utf-8") as golden_file:
+        expected = json.load(golden_file)
+    assert get_extractor(backend, HEADER_ID_BLACKLIST, LI_TRUNCATORS).extract(html_content) == expected
+
+
+@pytest.mark.parametrize("fragment", [
+    "<p>a<div>b</div>c</p>",
+    "<p>uno<p>dos",
+    "<p><span>a</span><li>stray</li></p>",
+    "<ul><li>a<li>b</ul>",
+    "<p><b>a</p></b>",
+    "<p><span/>a</p><p>b</p>"
+])
+def test_lxml_matches_beautifulsoup_on_malformed_html(fragment):
+    html_content = f'<div class="mw-parser-output">{fragment}</div>'
+    expected = get_extractor("beautifulsoup", [], []).extract(html_content)
+    assert get_extractor("lxml", [], []).extract(html_content) == expected
+
+
+def test_lxml_keeps_well_formed_pages_on_its_own_tree():
+    extractor = get_extractor("lxml", [], [])
+    extractor.extract('<div class="mw-parser-output"><p>a<br>b</p><ul><li>c</li></ul><!-- <p> --></div>')
+    assert extractor.fallback_pages == 0
@@ -0,0 +1,71 @@
+import threading
+from collections import Counter
+
+import pytest
+
+
+from benchmarks.fake_mediawiki import FakeMediaWikiServer, SyntheticWiki
+from src.api_client import WikipediaClient
+from src.category_manager import CategoryManager
+from src.page_index import PageIndex
+from src.page_manager import PageManager
+from src.pipeline import StagePipeline
+
+
+class CountingPageManager(PageManager):
+
+
+    def __init__(self, *args, **kwargs) -> None:
+        super().__init__(*args, **kwargs)
+        self.listings: Counter = Counter()
+        self._listings_lock = threading.Lock()
+
+
+    def retrieve_category_pages(self, category):
+        with self._listings_lock:
+            self.listings[category] += 1
+        return super().retrieve_category_pages(category)
+
+
+class FailingPageIndex(PageIndex):
+
+
+    def add_content(self, page, content, revision=None):
+        raise RuntimeError("disk full")
+
+
+def build_pipeline(server, tmp_path, page_index_type=PageIndex, queue_size=256):
+    client = WikipediaClient(url=server.url, max_retries=2, backoff_factor=0.01)
+    page_index = page_index_type(str(tmp_path / "page_index.jsonl.gz"))
+    # Both domains reach the same subcategories, so they are queued twice.
+    category_manager = CategoryManager(["Sintética 0", "Sintética 1"], [], [], 3, client=client)
+    page_manager = CountingPageManager({}, 3, client=client)
+    pipeline = StagePipeline(page_index, [], [], client=client, page_workers=8, content_workers=4, extraction_workers=1, queue_size=queue_size)
+    pipeline.add_corpus("test", category_manager, page_manager)
+    return pipeline, page_manager
+
+
+def test_categories_are_listed_once(tmp_path):
+    with FakeMediaWikiServer(SyntheticWiki(60, 3, pages_per_category=3), latency=0.002) as server:
+        pipeline, page_manager = build_pipeline(server, tmp_path)
+        pipeline.run(save=False)
+    assert page_manager.listings
+    assert max(page_manager.listings.values()) == 1
+
+
+def test_content_worker_failure_stops_the_pipeline(tmp_path):
+    errors = []
+
+    def run():
+        try:
+            pipeline.run(save=False)
+        except BaseException as err:
+            errors.append(err)
+
+    with FakeMediaWikiServer(SyntheticWiki(60, 3, pages_per_category=3)) as server:
+        pipeline, _ = build_pipeline(server, tmp_path, FailingPageIndex, queue_size=2)
+        thread = threading.Thread(target=run, daemon=True)
+        thread.start()
+        thread.join(timeout=60)
+    assert not thread.is_alive()
+    assert len(errors) == 1 and str(errors[0]) == "disk full"
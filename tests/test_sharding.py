@@ -0,0 +1,40 @@
+import filecmp
+import os
+
+
+from benchmarks.fake_mediawiki import FakeMediaWikiServer, SyntheticWiki
+from src.api_client import WikipediaClient
+from src.category_manager import CategoryManager
+from src.content_manager import ContentManager
+from src.page_manager import PageManager
+from src.sharding import ShardManifest, merge_shards, run_local_shards
+
+
+def test_sharded_output_matches_unsharded(tmp_path):
+    with FakeMediaWikiServer(SyntheticWiki(40, 3, pages_per_category=4, seed=2)) as server:
+        client = WikipediaClient(url=server.url, max_retries=2, backoff_factor=0.01)
+        category_manager = CategoryManager(["Sintética 0", "Sintética 2"], [], [], 2, client=client)
+        category_manager.retrieve_taxonomies(save=False)
+        taxonomies = category_manager.get_taxonomies()
+        page_manager = PageManager(taxonomies, 2, client=client)
+        page_manager.retrieve_taxonomy_pages(save=False)
+        pages = page_manager.get_pages()
+
+        unsharded_path = tmp_path / "unsharded"
+        unsharded_path.mkdir()
+        ContentManager(pages, taxonomies, ["Referencias"], [], 2, output_path=f"{unsharded_path}/", client=client).retrieve_taxonomy_content()
+
+        manifest = ShardManifest(pages, taxonomies, 2, 3, ["Referencias"], [], api_url=server.url)
+        manifest_filename = str(tmp_path / "manifest.json")
+        manifest.save(manifest_filename)
+        assert run_local_shards(manifest_filename, str(tmp_path / "shards")) == []
+
+    sharded_path = tmp_path / "sharded"
+    sharded_path.mkdir()
+    merge_shards(ShardManifest.load(manifest_filename), str(tmp_path / "shards"), output_path=f"{sharded_path}/")
+
+    filenames = sorted(os.listdir(unsharded_path))
+    assert len(filenames) == 6
+    assert sorted(os.listdir(sharded_path)) == filenames
+    _, mismatches, errors = filecmp.cmpfiles(unsharded_path, sharded_path, filenames, shallow=False)
+    assert mismatches == [] and errors == []
@@ -0,0 +1,46 @@
+import glob
+import os
+
+
+from benchmarks.fake_mediawiki import FakeMediaWikiServer, SyntheticWiki
+from benchmarks.multistream_fixture import synthetic_pages, write_multistream_dump
+from src.api_client import WikipediaClient
+from src.category_manager import CategoryManager
+from src.content_manager import ContentManager
+from src.corpus_writer import read_corpus_records
+from src.page_manager import PageManager
+from src.xml_dump import MultistreamDump
+
+
+def read_outputs(output_path):
+    return {
+        os.path.basename(filename): list(read_corpus_records(filename))
+        for filename in sorted(glob.glob(os.path.join(output_path, "*_content_degree_*.jsonl")))
+    }
+
+
+def test_dump_mode_matches_parse_mode(tmp_path):
+    wiki = SyntheticWiki(40, 3, pages_per_category=4, seed=1)
+    dump = MultistreamDump(str(tmp_path / "pages-articles-multistream.xml.bz2"), str(tmp_path / "pages-articles-multistream-index.txt.bz2"))
+    write_multistream_dump(dump.dump_path, dump.index_path, synthetic_pages(wiki), pages_per_stream=7)
+    with FakeMediaWikiServer(wiki) as server:
+        client = WikipediaClient(url=server.url, max_retries=2, backoff_factor=0.01)
+        category_manager = CategoryManager(["Sintética 0", "Sintética 2"], [], [], 2, client=client)
+        category_manager.retrieve_taxonomies(save=False)
+        page_manager = PageManager(category_manager.get_taxonomies(), 2, client=client)
+        page_manager.retrieve_taxonomy_pages(save=False)
+
+        outputs = {}
+        for mode, xml_dump in (("parse", None), ("dump", dump)):
+            output_path = tmp_path / mode
+            output_path.mkdir()
+            content_manager = ContentManager(
+                page_manager.get_pages(), category_manager.get_taxonomies(), ["Referencias"], [], 2,
+                output_path=f"{output_path}/", client=client, output_format="jsonl", xml_dump=xml_dump
+            )
+            content_manager.retrieve_taxonomy_content()
+            outputs[mode] = read_outputs(output_path)
+
+    assert len(outputs["parse"]) == 2
+    assert sum(len(records) for records in outputs["parse"].values()) > 0
+    assert outputs["dump"] == outputs["parse"]